@@ -4,132 +4,65 @@
 Дешевые модели с хорошим результатом
 """
 
-import requests
 import json
 import sys
 from warehouse_system import app, db, Product
+from semantic_search import find_candidates, catalog_sample, format_local_answer, DEFAULT_TOP_K
+from prompt_builder import build_prompt, CANDIDATE_POOL
+from ai_search_cache import get_cache, cache_key
+from llm_client import get_client, LLMError, MODELS, DEFAULT_MODEL
 
-# OpenRouter API ключ
-OPENROUTER_API_KEY = "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"
-
-# Дешевые и эффективные модели (цена за 1M токенов)
-MODELS = {
-    # Очень дешевые
-    "llama-3.1-8b": "meta-llama/llama-3.1-8b-instruct",  # ~$0.18/M токенов
-    "gemma-2-9b": "google/gemma-2-9b-it",  # ~$0.20/M токенов
-    # Средний ценник - лучшее качество
-    "llama-3.1-70b": "meta-llama/llama-3.1-70b-instruct",  # ~$0.88/M токенов
-}
+INSTRUCTIONS = """Найди подходящие товары из списка выше. Ответь в формате:
+1. Назови артикул и название найденного товара
+2. Объясни почему он подходит
+3. Укажи количество на складе
+4. **Укажи местоположение на складе** (зона-стеллаж-полка-ячейка)
 
-# Используем дешевую но хорошую модель
-DEFAULT_MODEL = MODELS["llama-3.1-8b"]
+Если местоположение не указано - напиши "местоположение не задано".
+Если ничего не найдено - скажи об этом."""
 
 class AISearch:
     def __init__(self):
-        self.api_key = OPENROUTER_API_KEY
+        self.client = get_client()
         self.model = DEFAULT_MODEL
-        self.base_url = "https://openrouter.ai/api/v1"
-        
+    
     def search(self, query):
         """ИИ-поиск по описанию"""
         
-        # Получаем все товары из базы
         with app.app_context():
-            products = Product.query.all()
-            
-            if not products:
+            if not db.session.query(Product.id).first():
                 return "❌ База данных пуста. Сначала импортируйте товары."
             
-            # Формируем контекст для AI
-            context = self._format_products(products)
+            # Тот же вопрос при той же версии каталога — ответ из кэша
+            key = cache_key(f"cli:{self.model}", query)
+            cached = get_cache().get(key)
+            if cached:
+                return f"{cached['text']}\n\n♻️ Ответ из кэша, сэкономлено: ${cached['cost']:.6f}"
             
-            # Отправляем запрос к AI
-            response = self._ask_ai(query, context)
+            # Сначала локально отбираем подходящие товары — в ИИ уходят только они
+            products = find_candidates(query, limit=CANDIDATE_POOL)
+            if not self.client.available:
+                return format_local_answer(query, products[:DEFAULT_TOP_K])
             
-            return response
-    
-    def _format_products(self, products):
-        """Форматирует товары для контекста AI с местоположением"""
-        items = []
-        for p in products[:50]:  # Берем первые 50 для экономии токенов
-            stock_qty = p.stock.quantity_actual if p.stock else 0
-            # Формируем местоположение
-            location = "не указано"
-            if p.stock and any([p.stock.zone, p.stock.rack, p.stock.shelf, p.stock.cell]):
-                location = f"{p.stock.zone or '-'}-{p.stock.rack or '-'}-{p.stock.shelf or '-'}-{p.stock.cell or '-'}"
+            # Промпт в пределах бюджета токенов; размер и цену показываем до отправки.
+            # Локально ничего не нашлось — ИИ выбирает из начала каталога
+            prompt = build_prompt(query, products or catalog_sample(), INSTRUCTIONS, model=self.model, max_tokens=500)
+            print(prompt.report())
             
-            item = f"Артикул: {p.article}, Название: {p.title}, Производитель: {p.manufacturer or 'не указан'}, Количество: {stock_qty}, Место: {location}"
-            items.append(item)
-        return "\n".join(items)
-    
-    def _ask_ai(self, query, context):
-        """Отправляет запрос к OpenRouter"""
-        
-        prompt = f"""Ты - помощник для поиска товаров на складе лифтовых запчастей.
-
-Доступные товары:
-{context}
-
-Запрос пользователя: "{query}"
-
-Найди подходящие товары из списка выше. Ответь в формате:
-1. Назови артикул и название найденного товара
-2. Объясни почему он подходит
-3. Укажи количество на складе
-4. **Укажи местоположение на складе** (зона-стеллаж-полка-ячейка)
-
-Если местоположение не указано - напиши "местоположение не задано".
-Если ничего не найдено - скажи об этом."""
-
-        try:
-            response = requests.post(
-                url=f"{self.base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://localhost",  # Required by OpenRouter
-                    "X-Title": "Warehouse AI Search"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,  # Низкая температура для точных ответов
-                    "max_tokens": 500
-                },
-                timeout=30
-            )
+            # Отправляем запрос к AI; если он недоступен — отвечаем локально
+            try:
+                response, cost = self._ask_ai(prompt)
+            except LLMError as e:
+                return f"⚠️ ИИ недоступен ({e})\n\n{format_local_answer(query, prompt.products if products else [])}"
+            get_cache().put(key, {'text': response, 'cost': cost}, cost)
             
-            if response.status_code == 200:
-                result = response.json()
-                answer = result['choices'][0]['message']['content']
-                
-                # Добавляем информацию о цене
-                cost = self._estimate_cost(result)
-                
-                return f"🤖 ИИ-ассистент:\n\n{answer}\n\n💰 Стоимость запроса: ${cost:.6f}"
-            else:
-                return f"❌ Ошибка API: {response.status_code}\n{response.text}"
-                
-        except Exception as e:
-            return f"❌ Ошибка: {str(e)}"
+            return response
     
-    def _estimate_cost(self, response):
-        """Оценивает стоимость запроса"""
-        usage = response.get('usage', {})
-        prompt_tokens = usage.get('prompt_tokens', 0)
-        completion_tokens = usage.get('completion_tokens', 0)
-        
- # Цены для llama-3.1-8b (вход/выход за 1M токенов)
-        input_price = 0.18 / 1000000
-        output_price = 0.18 / 1000000
+    def _ask_ai(self, prompt):
+        """Отправляет промпт к OpenRouter: (текст ответа, стоимость). Бросает LLMError."""
+        result = self.client.chat(prompt.text, model=self.model, max_tokens=prompt.max_tokens)
         
-        cost = (prompt_tokens * input_price) + (completion_tokens * output_price)
-        return cost
+        return f"🤖 ИИ-ассистент:\n\n{result.text}\n\n💰 Стоимость запроса: ${result.cost:.6f}", result.cost
 
 def main():
     if len(sys.argv) < 2:
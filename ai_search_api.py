@@ -3,14 +3,73 @@
 API endpoint для ИИ-поиска
 """
 
-from flask import Blueprint, request, jsonify
-import requests
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from warehouse_system import app, db, Product
+from semantic_search import find_candidates, find_candidates_many, catalog_sample, format_local_answer, DEFAULT_TOP_K
+from prompt_builder import build_prompt, build_batch_prompts, CANDIDATE_POOL
+from ai_search_cache import get_cache, cache_key
+from llm_client import get_client, LLMError, DEFAULT_MODEL, MAX_CONCURRENCY
 
 ai_search_bp = Blueprint('ai_search', __name__)
 
-OPENROUTER_API_KEY = "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"
-MODEL = "meta-llama/llama-3.1-8b-instruct"
+MODEL = DEFAULT_MODEL
+
+# Пакетный поиск: максимум вопросов в одном запросе и параллельных обращений к ИИ
+BATCH_MAX_QUERIES = 50
+BATCH_CONCURRENCY = MAX_CONCURRENCY
+
+def _prepare_search(query):
+    """Готовит ИИ-поиск (внутри app_context).
+
+    Возвращает (готовый ответ, None), если ответ есть без ИИ — пустая база,
+    кэш или локальный поиск, иначе (None, (ключ кэша, промпт)).
+    """
+    if not db.session.query(Product.id).first():
+        return {
+            'answer': '❌ База данных пуста. Сначала импортируйте товары.',
+            'cost': 0
+        }, None
+    
+    # Повторный запрос при той же версии каталога — ответ из кэша
+    key = cache_key(f"api:{MODEL}", query)
+    cached = get_cache().get(key)
+    if cached:
+        return dict(cached, cost=0, cached=True, cost_saved=cached['cost']), None
+    
+    # Локально отбираем подходящие товары — в ИИ уходят только они
+    products = find_candidates(query, limit=CANDIDATE_POOL)
+    client = get_client()
+    if not client.configured:
+        return _local_answer(query, products), None
+    if not client.available:
+        return _local_answer(query, products, 'ИИ временно недоступен (circuit breaker)'), None
+    
+    # Промпт в пределах бюджета токенов; размер и цена известны до отправки.
+    # Локально ничего не нашлось — ИИ выбирает из начала каталога, как до локального отбора
+    prompt = build_prompt(query, products or catalog_sample(), model=MODEL)
+    prompt.matched = bool(products)
+    print(f"{prompt.report()} — '{query}'")
+    return None, (key, prompt)
+
+def _found(prompt):
+    """Товары промпта, найденные локальным поиском (образец каталога не в счет)"""
+    return prompt.products if prompt.matched else []
+
+def _local_answer(query, products, error=None):
+    """Ответ локального поиска; error — почему не удалось спросить ИИ"""
+    products = products[:DEFAULT_TOP_K]
+    result = {
+        'answer': format_local_answer(query, products),
+        'cost': 0,
+        'articles': [p.article for p in products]
+    }
+    if error is not None:
+        result['fallback'] = True
+        result['error'] = str(error)
+    return result
 
 @ai_search_bp.route('/api/ai-search', methods=['POST'])
 def ai_search():
@@ -22,86 +81,281 @@ def ai_search():
         if not query:
             return jsonify({'success': False, 'error': 'Пустой запрос'}), 400
         
-        # Получаем товары
         with app.app_context():
-            products = Product.query.limit(50).all()
+            ready, pending = _prepare_search(query)
+            if ready:
+                return jsonify(dict(ready, success=True))
+            key, prompt = pending
+            
+            try:
+                llm = get_client().chat(prompt.text, model=MODEL, max_tokens=prompt.max_tokens)
+            except LLMError as e:
+                # ИИ недоступен — отвечаем локальным поиском, в кэш не кладем
+                return jsonify(dict(_local_answer(query, _found(prompt), e), success=True))
+            
+            result = {
+                'answer': llm.text,
+                'cost': round(llm.cost, 6),
+                'tokens': llm.tokens,
+                'articles': prompt.articles,
+                'prompt': prompt.summary()
+            }
+            get_cache().put(key, result, llm.cost)
+            
+            return jsonify(dict(result, success=True, cached=False))
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ========== ПАКЕТНЫЙ ПОИСК ==========
+
+@ai_search_bp.route('/api/ai-search/batch', methods=['POST'])
+def ai_search_batch():
+    """Несколько вопросов за один запрос: {"queries": [...], "concurrency": 4}.
+
+    Кандидаты всех вопросов загружаются из базы одним запросом, таблица
+    товаров для промптов собирается один раз, вопросы уходят в ИИ параллельно
+    (не больше BATCH_CONCURRENCY). Одинаковые вопросы задаются один раз.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries:
+            return jsonify({'success': False, 'error': 'Нужен список queries'}), 400
+        if len(queries) > BATCH_MAX_QUERIES:
+            return jsonify({'success': False, 'error': f'Не больше {BATCH_MAX_QUERIES} запросов за раз'}), 400
+        queries = [str(q or '').strip() for q in queries]
+        if not all(queries):
+            return jsonify({'success': False, 'error': 'Пустой запрос в списке'}), 400
+        concurrency = max(1, min(int(data.get('concurrency', BATCH_CONCURRENCY)), BATCH_CONCURRENCY))
+        
+        started = time.perf_counter()
+        with app.app_context():
+            results = [None] * len(queries)
+            if not db.session.query(Product.id).first():
+                for i, query in enumerate(queries):
+                    results[i] = {'query': query, 'answer': '❌ База данных пуста. Сначала импортируйте товары.', 'cost': 0}
+                return jsonify({'success': True, 'results': results, 'summary': _batch_summary(results, 0, started)})
             
-            if not products:
-                return jsonify({
-                    'success': True,
-                    'answer': '❌ База данных пуста. Сначала импортируйте товары.',
-                    'cost': 0
-                })
+            # Кэш и дубликаты: ключ — нормализованный вопрос и версия каталога
+            cache = get_cache()
+            groups = {}  # ключ кэша -> индексы вопросов
+            for i, query in enumerate(queries):
+                key = cache_key(f"api:{MODEL}", query)
+                if key in groups:
+                    groups[key].append(i)
+                    continue
+                groups[key] = [i]
+                cached = cache.get(key)
+                if cached:
+                    results[i] = dict(cached, query=query, cost=0, cached=True, cost_saved=cached['cost'])
             
-            # Формируем контекст с местоположением
-            context = []
-            for p in products:
-                stock = p.stock.quantity_actual if p.stock else 0
-                # Местоположение
-                location = "не указано"
-                if p.stock and any([p.stock.zone, p.stock.rack, p.stock.shelf, p.stock.cell]):
-                    location = f"{p.stock.zone or '-'}-{p.stock.rack or '-'}-{p.stock.shelf or '-'}-{p.stock.cell or '-'}"
-                context.append(f"{p.article}: {p.title} ({p.manufacturer or '?'}) - {stock} шт., место: {location}")
+            pending = [(key, indexes) for key, indexes in groups.items() if results[indexes[0]] is None]
+            pending_queries = [queries[indexes[0]] for _, indexes in pending]
+            candidates = find_candidates_many(pending_queries, limit=CANDIDATE_POOL)
             
-            # Запрос к AI
-            prompt = f"""Ты - помощник склада лифтовых запчастей.
-
-Товары:
-{chr(10).join(context)}
-
-Запрос: "{query}"
-
-Найди подходящие товары. Ответь кратко:
-- Артикул и название
-- Почему подходит
-- Количество на складе
-- **Местоположение** (зона-стеллаж-полка-ячейка)
-
-Если местоположение не задано - укажи это."""
-
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://localhost",
-                    "X-Title": "Warehouse AI"
-                },
-                json={
-                    "model": MODEL,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3,
-                    "max_tokens": 400
-                },
-                timeout=30
-            )
+            client = get_client()
+            asked = []
+            for (key, indexes), query, products in zip(pending, pending_queries, candidates):
+                if not client.configured:
+                    results[indexes[0]] = dict(_local_answer(query, products), query=query)
+                elif not client.available:
+                    results[indexes[0]] = dict(_local_answer(query, products, 'ИИ временно недоступен (circuit breaker)'), query=query)
+                else:
+                    asked.append((key, indexes, query, products))
             
-            if response.status_code == 200:
-                result = response.json()
-                answer = result['choices'][0]['message']['content']
-                
-                # Считаем стоимость
-                usage = result.get('usage', {})
-                tokens = usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0)
-                cost = tokens * (0.18 / 1000000)  # $0.18 за 1M токенов
-                
-                return jsonify({
-                    'success': True,
-                    'answer': answer,
-                    'cost': round(cost, 6),
-                    'tokens': tokens
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': f'API Error: {response.status_code}'
-                }), 500
+            estimated = 0
+            if asked:
+                # Вопросам без локальных кандидатов — начало каталога, как в одиночном поиске
+                sample = catalog_sample() if not all(a[3] for a in asked) else []
+                prompts = build_batch_prompts([a[2] for a in asked], [a[3] or sample for a in asked], model=MODEL)
+                estimated = sum(p.estimated_cost for p in prompts)
+                print(f"📦 Пакет ИИ-поиска: {len(asked)} вопросов к ИИ, общий контекст "
+                      f"{prompts[0].context_tokens} токенов, до ${estimated:.6f}")
                 
+                with ThreadPoolExecutor(max_workers=min(concurrency, len(asked))) as pool:
+                    futures = {
+                        pool.submit(client.chat, prompt.text, MODEL, prompt.max_tokens): (item, prompt)
+                        for item, prompt in zip(asked, prompts)
+                    }
+                    for future in as_completed(futures):
+                        (key, indexes, query, products), prompt = futures[future]
+                        try:
+                            llm = future.result()
+                        except LLMError as e:
+                            results[indexes[0]] = dict(_local_answer(query, products, e), query=query)
+                            continue
+                        result = {
+                            'answer': llm.text,
+                            'cost': round(llm.cost, 6),
+                            'tokens': llm.tokens,
+                            'articles': prompt.articles,
+                            'prompt': prompt.summary()
+                        }
+                        cache.put(key, result, llm.cost)
+                        results[indexes[0]] = dict(result, query=query, cached=False)
+            
+            # Повторы вопроса получают тот же ответ без затрат
+            for key, indexes in groups.items():
+                first = results[indexes[0]]
+                for i in indexes[1:]:
+                    results[i] = dict(first, query=queries[i], cost=0, duplicate_of=indexes[0])
+                    results[i].pop('cost_saved', None)
+            
+            return jsonify({'success': True, 'results': results, 'summary': _batch_summary(results, estimated, started)})
+    
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Некорректные параметры: {e}'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _batch_summary(results, estimated, started):
+    """Итог пакета: число вопросов, обращений к ИИ, попаданий в кэш и общая стоимость"""
+    llm = [r for r in results if 'tokens' in r and not r.get('cached') and 'duplicate_of' not in r]
+    return {
+        'queries': len(results),
+        'llm_calls': len(llm),
+        'cached': sum(1 for r in results if r.get('cached') and 'duplicate_of' not in r),
+        'fallback': sum(1 for r in results if r.get('fallback')),
+        'duplicates': sum(1 for r in results if 'duplicate_of' in r),
+        'tokens': sum(r['tokens'] for r in llm),
+        'cost': round(sum(r['cost'] for r in results), 6),
+        'estimated_cost': round(estimated, 6),
+        'cost_saved': round(sum(r.get('cost_saved', 0) for r in results), 6),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000)
+    }
+
+# ========== ПОТОКОВЫЙ ОТВЕТ (SSE) ==========
+
+def _sse(event):
+    """Одно событие Server-Sent Events"""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+def _stream_answer(query, key, prompt):
+    """Пересылает токены ИИ клиенту по мере генерации.
+
+    Если клиент закрыл соединение, генератор закрывается и
+    соединение с OpenRouter обрывается — генерация не оплачивается дальше.
+    """
+    started = time.perf_counter()
+    logged_first_token = False
+    upstream = None
+    
+    try:
+        yield _sse({'type': 'start', 'articles': prompt.articles, 'prompt': prompt.summary()})
+        
+        try:
+            upstream = get_client().stream_chat(prompt.text, model=MODEL, max_tokens=prompt.max_tokens)
+        except LLMError as e:
+            # ИИ недоступен — отдаем ответ локального поиска
+            local = _local_answer(query, _found(prompt), e)
+            yield _sse({'type': 'token', 'text': local['answer']})
+            yield _sse({'type': 'done', 'cost': 0, 'tokens': 0, 'cached': False,
+                        'fallback': True, 'error': local['error']})
+            return
+        
+        for text in upstream:
+            if not logged_first_token:
+                logged_first_token = True
+                print(f"⏱️ ИИ-поиск '{query}': первый токен через {upstream.first_token_latency * 1000:.0f} мс")
+            yield _sse({'type': 'token', 'text': text})
+        
+        llm = upstream.result
+        result = {
+            'answer': llm.text,
+            'cost': round(llm.cost, 6),
+            'tokens': llm.tokens,
+            'articles': prompt.articles,
+            'prompt': prompt.summary()
+        }
+        get_cache().put(key, result, llm.cost)
+        
+        total = time.perf_counter() - started
+        first_token = llm.first_token_latency
+        print(f"✅ ИИ-поиск '{query}': {llm.tokens} токенов за {total:.1f} с")
+        yield _sse({
+            'type': 'done',
+            'cost': result['cost'],
+            'tokens': llm.tokens,
+            'cached': False,
+            'first_token_ms': round(first_token * 1000) if first_token is not None else None
+        })
+    
+    except GeneratorExit:
+        print(f"🛑 ИИ-поиск '{query}': клиент отключился, генерация отменена")
+        raise
+    except Exception as e:
+        yield _sse({'type': 'error', 'error': str(e)})
+    finally:
+        # Закрываем соединение с OpenRouter и при отмене, и при ошибке
+        if upstream is not None:
+            upstream.close()
+
+@ai_search_bp.route('/api/ai-search/stream', methods=['GET', 'POST'])
+def ai_search_stream():
+    """ИИ-поиск с потоковой выдачей ответа (text/event-stream).
+
+    События: start (артикулы кандидатов и оценка промпта), token (кусок текста),
+    done (стоимость, токены, задержка первого токена), error.
+    """
+    if request.method == 'POST':
+        query = ((request.get_json(silent=True) or {}).get('query') or '').strip()
+    else:
+        query = request.args.get('query', '').strip()
+    
+    if not query:
+        return jsonify({'success': False, 'error': 'Пустой запрос'}), 400
+    
+    try:
+        ready, pending = _prepare_search(query)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if ready:
+        # Ответ без ИИ отдаем одним куском в том же формате событий
+        events = [
+            _sse({'type': 'start', 'articles': ready.get('articles', [])}),
+            _sse({'type': 'token', 'text': ready['answer']}),
+            _sse({
+                'type': 'done',
+                'cost': 0,
+                'tokens': ready.get('tokens', 0),
+                'cached': ready.get('cached', False),
+                'cost_saved': ready.get('cost_saved', 0)
+            })
+        ]
+        body = iter(events)
+    else:
+        body = stream_with_context(_stream_answer(query, *pending))
+    
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@ai_search_bp.route('/api/ai-search/cache', methods=['GET'])
+def ai_search_cache_stats():
+    """Статистика кэша ИИ-поиска: попадания, промахи, сэкономлено"""
+    try:
+        return jsonify({'success': True, 'cache': get_cache().stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ai_search_bp.route('/api/ai-search/cache', methods=['DELETE'])
+def ai_search_cache_clear():
+    """Очистить кэш ИИ-поиска"""
+    try:
+        get_cache().clear()
+        return jsonify({'success': True, 'message': 'Кэш очищен'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@ai_search_bp.route('/api/ai-search/metrics', methods=['GET'])
+def ai_search_metrics():
+    """Метрики клиента ИИ: вызовы, ошибки, повторы, задержка, токены, стоимость, состояние breaker"""
+    try:
+        return jsonify({'success': True, 'metrics': get_client().metrics()})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-# Добавляем blueprint в основное приложение
-if __name__ != '__main__':
-    from warehouse_system import app
-    app.register_blueprint(ai_search_bp)
-    print("✅ ИИ-поиск подключен к API")
+# Blueprint регистрирует warehouse_system (раздел "ИИ-ПОИСК")
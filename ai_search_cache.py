@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Кэш ответов ИИ-поиска
+LRU в памяти + SQLite на диске, ключ — нормализованный запрос и отпечаток каталога.
+Отпечаток (число строк и последнее updated_at товаров и остатков, общий с фасетами —
+warehouse_system.catalog_fingerprint) видит и записи других процессов
+"""
+
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Время жизни ответа и размеры кэша
+CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 24 * 3600))
+MEMORY_SIZE = 512
+DISK_SIZE = 10000
+# Как часто счетчики и last_used из памяти записываются в SQLite
+FLUSH_SECONDS = int(os.environ.get('AI_CACHE_FLUSH', 30))
+
+def normalize_query(query):
+    """Нормализует запрос: регистр и пробелы; порядок слов сохраняется"""
+    return ' '.join(query.casefold().split())
+
+class AISearchCache:
+    """LRU+TTL кэш ответов с хранением в SQLite и счетчиками попаданий"""
+
+    def __init__(self, path, ttl=CACHE_TTL, memory_size=MEMORY_SIZE, disk_size=DISK_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        # Чтения не пишут в базу: счетчики и last_used копятся здесь до _flush
+        self._pending = {}
+        self._used = {}
+        self._flushed_at = time.monotonic()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                cost REAL NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ai_cache_stats (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.commit()
+
+    def _bump(self, **counters):
+        for name, value in counters.items():
+            self._conn.execute(
+                "INSERT INTO ai_cache_stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, value)
+            )
+
+    def _count(self, **counters):
+        for name, value in counters.items():
+            self._pending[name] = self._pending.get(name, 0) + value
+
+    def _flush(self):
+        """Записывает накопленные счетчики и last_used; commit — на вызывающем"""
+        if self._pending:
+            self._bump(**self._pending)
+            self._pending.clear()
+        if self._used:
+            self._conn.executemany("UPDATE ai_cache SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._used.items()])
+            self._used.clear()
+        self._flushed_at = time.monotonic()
+
+    def get(self, key):
+        """Значение из кэша или None; учитывает попадание/промах"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                value, cost = entry[1], entry[2]
+            else:
+                self._memory.pop(key, None)
+                row = self._conn.execute(
+                    "SELECT value, cost, expires_at FROM ai_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+                if not row:
+                    value = None
+                else:
+                    value, cost = json.loads(row[0]), row[1]
+                    self._remember(key, row[2], value, cost)
+
+            if value is None:
+                self._count(misses=1)
+            else:
+                self._used[key] = now
+                self._count(hits=1, cost_saved=cost)
+            if time.monotonic() - self._flushed_at >= FLUSH_SECONDS:
+                self._flush()
+                self._conn.commit()
+            return value
+
+    def put(self, key, value, cost=0.0):
+        """Сохраняет ответ; cost — сколько стоил запрос к ИИ"""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value, cost)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, cost, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), cost, expires_at, now)
+            )
+            self._count(spent=cost)
+            self._flush()
+            self._evict(now)
+            self._conn.commit()
+
+    def _remember(self, key, expires_at, value, cost):
+        self._memory[key] = (expires_at, value, cost)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM ai_cache WHERE key NOT IN "
+            "(SELECT key FROM ai_cache ORDER BY last_used DESC LIMIT ?)",
+            (self.disk_size,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._pending.clear()
+            self._used.clear()
+            self._conn.execute("DELETE FROM ai_cache")
+            self._conn.execute("DELETE FROM ai_cache_stats")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            self._flush()
+            self._conn.commit()
+            counters = dict(self._conn.execute("SELECT name, value FROM ai_cache_stats").fetchall())
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM ai_cache WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        hits = int(counters.get('hits', 0))
+        misses = int(counters.get('misses', 0))
+        return {
+            'entries': entries,
+            'memory_entries': len(self._memory),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0,
+            'cost_saved': round(counters.get('cost_saved', 0), 6),
+            'cost_spent': round(counters.get('spent', 0), 6),
+            'ttl': self.ttl,
+        }
+
+    def close(self):
+        """Записывает накопленные счетчики и закрывает базу"""
+        with self._lock:
+            self._flush()
+            self._conn.commit()
+            self._conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Общий кэш приложения (файл ai_cache.db рядом с warehouse.db)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from warehouse_system import app
+            os.makedirs(app.instance_path, exist_ok=True)
+            _cache = AISearchCache(os.path.join(app.instance_path, 'ai_cache.db'))
+            atexit.register(_cache.close)
+        return _cache
+
+def cache_key(namespace, query):
+    """Ключ: пространство (модель/формат), нормализованный запрос и отпечаток каталога.
+
+    Вызывается внутри app_context.
+    """
+    from warehouse_system import catalog_fingerprint
+    return f"{namespace}|{catalog_fingerprint()}|{normalize_query(query)}"
+
+def main():
+    from warehouse_system import app
+
+    with app.app_context():
+        cache = get_cache()
+        if '--clear' in sys.argv:
+            cache.clear()
+            print("🧹 Кэш ИИ-поиска очищен")
+        for name, value in cache.stats().items():
+            print(f"  {name}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -3,34 +3,33 @@
 ИИ-поиск с fallback на обычный поиск если API не работает
 """
 
-import requests
 import json
 import sys
 from warehouse_system import app, db, Product
+from semantic_search import find_candidates, catalog_sample, format_local_answer
+from prompt_builder import build_prompt, CANDIDATE_POOL
+from llm_client import get_client, LLMError, DEFAULT_MODEL
 
-# Попробуем получить ключ из переменной окружения или использовать тестовый
-OPENROUTER_API_KEY = "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"
-MODEL = "meta-llama/llama-3.1-8b-instruct"
+MODEL = DEFAULT_MODEL
 
 class AISearchWithFallback:
     def __init__(self):
-        self.api_key = OPENROUTER_API_KEY
+        self.client = get_client()
         self.model = MODEL
-        self.api_working = True  # Флаг работоспособности API
-        
+    
     def search(self, query, speak=False):
         """ИИ-поиск с fallback"""
         
         with app.app_context():
-            # Сначала пробуем ИИ-поиск
-            if self.api_working:
+            # Сначала пробуем ИИ-поиск; после серии ошибок circuit breaker
+            # на время отключает ИИ, и запросы сразу идут в обычный поиск
+            if self.client.available:
                 try:
                     result = self._ai_search(query)
                     if result:
                         return result
-                except Exception as e:
+                except LLMError as e:
                     print(f"⚠️ API недоступен, переключаюсь на обычный поиск: {e}")
-                    self.api_working = False
             
             # Fallback: обычный поиск по базе
             return self._fallback_search(query)
@@ -38,96 +37,29 @@ class AISearchWithFallback:
     def _ai_search(self, query):
         """ИИ-поиск через OpenRouter"""
         
-        products = Product.query.limit(50).all()
-        if not products:
+        if not db.session.query(Product.id).first():
             return "❌ База данных пуста. Сначала импортируйте товары."
         
-        # Формируем контекст с местоположением
-        context = []
-        for p in products:
-            stock = p.stock.quantity_actual if p.stock else 0
-            # Местоположение
-            location = "не указано"
-            if p.stock and any([p.stock.zone, p.stock.rack, p.stock.shelf, p.stock.cell]):
-                location = f"{p.stock.zone or '-'}-{p.stock.rack or '-'}-{p.stock.shelf or '-'}-{p.stock.cell or '-'}"
-            context.append(f"{p.article}: {p.title}, {p.manufacturer or 'не указан'}, {stock} шт., место: {location}")
+        # Локально отбираем подходящие товары — в ИИ уходят только они
+        products = find_candidates(query, limit=CANDIDATE_POOL)
         
-        # Запрос к AI
-        prompt = f"""Ты - помощник склада лифтовых запчастей.
-
-Товары:
-{chr(10).join(context)}
-
-Запрос: "{query}"
-
-Найди подходящие товары. Ответь кратко:
-- Артикул и название
-- Почему подходит
-- Количество на складе
-- **Местоположение** (зона-стеллаж-полка-ячейка)
-
-Если местоположение не задано - напиши об этом."""
-
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://localhost",
-                "X-Title": "Warehouse AI"
-            },
-            json={
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3,
-                "max_tokens": 400
-            },
-            timeout=10
-        )
+        # Промпт в пределах бюджета токенов; размер и цену показываем до отправки.
+        # Локально ничего не нашлось — ИИ выбирает из начала каталога
+        prompt = build_prompt(query, products or catalog_sample(), model=self.model)
+        print(prompt.report())
         
-        if response.status_code == 200:
-            result = response.json()
-            answer = result['choices'][0]['message']['content']
-            usage = result.get('usage', {})
-            tokens = usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0)
-            cost = tokens * (0.18 / 1000000)
-            
-            return f"🤖 ИИ-ассистент:\n\n{answer}\n\n💰 Стоимость: ${cost:.6f}"
-        elif response.status_code == 401:
-            raise Exception("API ключ недействителен (401)")
-        else:
-            raise Exception(f"API ошибка: {response.status_code}")
+        result = self.client.chat(prompt.text, model=self.model, max_tokens=prompt.max_tokens, timeout=10)
+        
+        return f"🤖 ИИ-ассистент:\n\n{result.text}\n\n💰 Стоимость: ${result.cost:.6f}"
     
     def _fallback_search(self, query):
         """Обычный поиск если API не работает"""
         
-        query_lower = query.lower()
-        products = Product.query.filter(
-            db.or_(
-                Product.article.ilike(f'%{query_lower}%'),
-                Product.title.ilike(f'%{query_lower}%'),
-                Product.manufacturer.ilike(f'%{query_lower}%')
-            )
-        ).limit(10).all()
-        
-        if not products:
-            return f"❌ По запросу '{query}' ничего не найдено"
-        
-        result = f"📋 Результаты поиска (обычный режим):\n\n"
-        for p in products:
-            stock = p.stock.quantity_actual if p.stock else 0
-            # Местоположение
-            location = "не указано"
-            if p.stock and any([p.stock.zone, p.stock.rack, p.stock.shelf, p.stock.cell]):
-                location = f"{p.stock.zone or '-'}-{p.stock.rack or '-'}-{p.stock.shelf or '-'}-{p.stock.cell or '-'}"
-            
-            result += f"🏷️  Артикул: {p.article}\n"
-            result += f"   Название: {p.title}\n"
-            result += f"   Производитель: {p.manufacturer or 'не указан'}\n"
-            result += f"   Количество: {stock} шт.\n"
-            result += f"   📍 Местоположение: {location}\n\n"
+        products = find_candidates(query, limit=10)
         
-        result += "💡 Для ИИ-поиска обновите API ключ в ai_search_voice.py"
+        result = format_local_answer(query, products)
+        if products:
+            result += "\n\n💡 Для ИИ-поиска обновите API ключ (переменная OPENROUTER_API_KEY)"
         return result
 
 def main():
@@ -3,40 +3,55 @@
 ИИ-поиск с озвучкой ответа (macOS say)
 """
 
-import requests
 import json
 import sys
 import subprocess
 import threading
 from warehouse_system import app, db, Product
+from semantic_search import find_candidates, catalog_sample, format_local_answer, DEFAULT_TOP_K
+from prompt_builder import build_prompt, CANDIDATE_POOL
+from llm_client import get_client, LLMError, DEFAULT_MODEL
 
-# OpenRouter API ключ
-OPENROUTER_API_KEY = "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"
-MODEL = "meta-llama/llama-3.1-8b-instruct"
+MODEL = DEFAULT_MODEL
+
+INSTRUCTIONS = """Найди подходящие товары. Ответь кратко и понятно:
+1. Назови артикул и название
+2. Почему подходит
+3. Сколько на складе
+4. **Укажи местоположение** (зона-стеллаж-полка-ячейка)
+
+Если местоположение не задано - напиши об этом.
+Если не нашел - скажи прямо."""
 
 class AISearchWithVoice:
     def __init__(self):
-        self.api_key = OPENROUTER_API_KEY
+        self.client = get_client()
         self.model = MODEL
-        self.base_url = "https://openrouter.ai/api/v1"
-        
+    
     def search(self, query, speak=False):
         """ИИ-поиск с опциональной озвучкой"""
         
         with app.app_context():
-            products = Product.query.all()
-            
-            if not products:
+            if not db.session.query(Product.id).first():
                 result = "❌ База данных пуста. Сначала импортируйте товары."
                 if speak:
                     self.speak("База данных пуста. Сначала импортируйте товары.")
                 return result
             
-            # Формируем контекст
-            context = self._format_products(products)
-            
-            # Запрос к AI
-            response = self._ask_ai(query, context)
+            # Локально отбираем подходящие товары — в ИИ уходят только они
+            products = find_candidates(query, limit=CANDIDATE_POOL)
+            if not self.client.available:
+                response = format_local_answer(query, products[:DEFAULT_TOP_K])
+            else:
+                # Промпт в пределах бюджета токенов; если ИИ недоступен — отвечаем локально.
+                # Локально ничего не нашлось — ИИ выбирает из начала каталога
+                prompt = build_prompt(query, products or catalog_sample(), INSTRUCTIONS, model=self.model, max_tokens=500)
+                print(prompt.report())
+                try:
+                    response = self._ask_ai(prompt)
+                except LLMError as e:
+                    print(f"⚠️ ИИ недоступен: {e}")
+                    response = format_local_answer(query, prompt.products if products else [])
             
             # Озвучиваем если нужно
             if speak and response:
@@ -49,72 +64,11 @@ class AISearchWithVoice:
             
             return response
     
-    def _format_products(self, products):
-        """Форматирует товары для контекста AI"""
-        items = []
-        for p in products[:50]:
-            stock_qty = p.stock.quantity_actual if p.stock else 0
-            # Формируем местоположение
-            location = "не указано"
-            if p.stock and any([p.stock.zone, p.stock.rack, p.stock.shelf, p.stock.cell]):
-                location = f"{p.stock.zone or '-'}-{p.stock.rack or '-'}-{p.stock.shelf or '-'}-{p.stock.cell or '-'}"
-            
-            item = f"Артикул {p.article}: {p.title}, {p.manufacturer or 'не указан'}, {stock_qty} штук, место: {location}"
-            items.append(item)
-        return "\n".join(items)
-    
-    def _ask_ai(self, query, context):
-        """Отправляет запрос к OpenRouter"""
+    def _ask_ai(self, prompt):
+        """Отправляет промпт к OpenRouter. Бросает LLMError."""
+        result = self.client.chat(prompt.text, model=self.model, max_tokens=prompt.max_tokens)
         
-        prompt = f"""Ты - помощник для поиска товаров на складе лифтовых запчастей.
-
-Товары на складе:
-{context}
-
-Запрос пользователя: "{query}"
-
-Найди подходящие товары. Ответь кратко и понятно:
-1. Назови артикул и название
-2. Почему подходит
-3. Сколько на складе
-4. **Укажи местоположение** (зона-стеллаж-полка-ячейка)
-
-Если местоположение не задано - напиши об этом.
-Если не нашел - скажи прямо."""
-
-        try:
-            response = requests.post(
-                url=f"{self.base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://localhost",
-                    "X-Title": "Warehouse AI"
-                },
-                json={
-                    "model": self.model,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3,
-                    "max_tokens": 500
-                },
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                answer = result['choices'][0]['message']['content']
-                
-                # Считаем стоимость
-                usage = result.get('usage', {})
-                tokens = usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0)
-                cost = tokens * (0.18 / 1000000)
-                
-                return f"{answer}\n\n💰 Стоимость: ${cost:.6f} | Токенов: {tokens}"
-            else:
-                return f"❌ Ошибка API: {response.status_code}"
-                
-        except Exception as e:
-            return f"❌ Ошибка: {str(e)}"
+        return f"{result.text}\n\n💰 Стоимость: ${result.cost:.6f} | Токенов: {result.tokens}"
     
     def speak(self, text):
         """Озвучивает текст через macOS say"""
@@ -140,7 +94,7 @@ class AISearchWithVoice:
                 capture_output=True,
                 timeout=15  # Таймаут 15 секунд
             )
-            
+        
         except subprocess.TimeoutExpired:
             print("⚠️ Озвучка: превышен таймаут")
         except subprocess.CalledProcessError as e:
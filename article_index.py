@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Нечеткий поиск товаров по артикулу и названию
+Индекс в памяти: опечатки, перестановки цифр, кириллица вместо латиницы
+"""
+
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Кириллические буквы, которые на этикетке выглядят как латинские
+HOMOGLYPHS = str.maketrans('АВЕКМНОРСТХУЗ', 'ABEKMHOPCTXY3')
+
+# Разделители, которые печатаются в артикулах по-разному
+ARTICLE_SEPARATORS = re.compile(r'[\s\-_./\\]+')
+
+# Артикулы от этой длины индексируются и с двумя удалениями (поиск на расстоянии 2);
+# у более коротких два отличия — это уже почти любой другой артикул
+DEEP_DELETES_MIN_LENGTH = 4
+
+def normalize_article(value):
+    """Приводит артикул к каноническому виду: верхний регистр, латиница, без разделителей"""
+    value = str(value or '').upper().replace('Ё', 'Е')
+    return ARTICLE_SEPARATORS.sub('', value.translate(HOMOGLYPHS))
+
+def normalize_title(value):
+    """Приводит название к нижнему регистру с единообразными пробелами"""
+    value = str(value or '').lower().replace('ё', 'е')
+    return ' '.join(re.findall(r'\w+', value))
+
+def title_trigrams(value):
+    """Множество триграмм названия (с границами слов)"""
+    text = f"  {normalize_title(value)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def edit_distance(a, b, max_distance=2):
+    """Расстояние Дамерау-Левенштейна (перестановка соседних символов = 1).
+
+    Возвращает max_distance + 1, если строки отличаются сильнее.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = None
+    current = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+    return current[len(b)]
+
+def _deletes(value, depth):
+    """Все варианты строки с удалением до depth символов"""
+    variants = {value}
+    frontier = {value}
+    for _ in range(depth):
+        frontier = {v[:i] + v[i + 1:] for v in frontier for i in range(len(v))}
+        variants |= frontier
+    return variants
+
+def _deep_variants(norm):
+    """Варианты ровно с двумя удалениями (только для достаточно длинных артикулов)"""
+    if len(norm) < DEEP_DELETES_MIN_LENGTH:
+        return set()
+    n = len(norm)
+    return {norm[:i] + norm[i + 1:j] + norm[j + 1:] for i in range(n) for j in range(i + 1, n)}
+
+class ArticleIndex:
+    """Индекс артикулов и названий для подсказок с опечатками.
+
+    Артикулы хранятся в индексе удалений (symmetric delete): для каждого
+    артикула запоминаются варианты с одним удаленным символом, а для
+    артикулов от DEEP_DELETES_MIN_LENGTH символов отдельно — с двумя
+    (они нужны только для расстояния 2). Запрос порождает свои варианты
+    удалений, кандидаты сверяются по расстоянию редактирования. Названия
+    ищутся по общим триграммам.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._products = {}                 # product_id -> (article, title, norm_article)
+        self._by_article = defaultdict(set)  # норм. артикул -> product_id
+        self._deletes = defaultdict(set)     # вариант удаления -> норм. артикулы
+        self._deep_deletes = defaultdict(set)  # вариант с двумя удалениями -> норм. артикулы
+        self._trigrams = defaultdict(set)    # триграмма -> product_id
+        self._pending = set()
+        self._built = False
+
+    # ----- наполнение -----
+
+    def build(self, rows):
+        """Строит индекс заново из строк (product_id, article, title)"""
+        with self._lock:
+            self._products.clear()
+            self._by_article.clear()
+            self._deletes.clear()
+            self._deep_deletes.clear()
+            self._trigrams.clear()
+            self._pending.clear()
+            for product_id, article, title in rows:
+                self._add(product_id, article, title)
+            self._built = True
+
+    def _add(self, product_id, article, title):
+        norm = normalize_article(article)
+        self._products[product_id] = (article, title, norm)
+        if not self._by_article[norm]:
+            for variant in _deletes(norm, 1):
+                self._deletes[variant].add(norm)
+            for variant in _deep_variants(norm):
+                self._deep_deletes[variant].add(norm)
+        self._by_article[norm].add(product_id)
+        for trigram in title_trigrams(title):
+            self._trigrams[trigram].add(product_id)
+
+    def _remove(self, product_id):
+        entry = self._products.pop(product_id, None)
+        if not entry:
+            return
+        article, title, norm = entry
+        self._by_article[norm].discard(product_id)
+        if not self._by_article[norm]:
+            del self._by_article[norm]
+            for variant in _deletes(norm, 1):
+                self._deletes[variant].discard(norm)
+                if not self._deletes[variant]:
+                    del self._deletes[variant]
+            for variant in _deep_variants(norm):
+                self._deep_deletes[variant].discard(norm)
+                if not self._deep_deletes[variant]:
+                    del self._deep_deletes[variant]
+        for trigram in title_trigrams(title):
+            self._trigrams[trigram].discard(product_id)
+            if not self._trigrams[trigram]:
+                del self._trigrams[trigram]
+
+    def upsert(self, product_id, article, title):
+        """Добавляет или обновляет товар в индексе"""
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, article, title)
+
+    def remove(self, product_id):
+        """Удаляет товар из индекса"""
+        with self._lock:
+            self._remove(product_id)
+
+    def invalidate(self, product_ids):
+        """Помечает товары для перечитывания из базы при следующем поиске"""
+        with self._lock:
+            self._pending.update(pid for pid in product_ids if pid is not None)
+
+    @property
+    def built(self):
+        return self._built
+
+    def __len__(self):
+        return len(self._products)
+
+    # ----- поиск -----
+
+    def suggest_articles(self, query, limit=10, max_distance=2, expand=False):
+        """Ближайшие артикулы: список (distance, article, title, product_id).
+
+        Расстояние 2 ищется, только если на расстоянии 1 ничего нет
+        (или expand=True — нужны и более далекие варианты).
+        """
+        norm = normalize_article(query)
+        if not norm:
+            return []
+
+        matches = []
+        seen = set()
+        with self._lock:
+            # Вариант запроса с одним удалением совпадает с вариантом артикула
+            # при замене, вставке, удалении или перестановке символа; для двух
+            # отличий сверяются варианты с двумя удалениями с обеих сторон.
+            # Второй проход дороже первого в несколько раз — только если первый пуст.
+            for depth in range(1, min(max_distance, 2) + 1):
+                tables = (self._deletes,) if depth == 1 else (self._deletes, self._deep_deletes)
+                candidates = set()
+                for variant in _deletes(norm, depth):
+                    for table in tables:
+                        candidates |= table.get(variant, set())
+                candidates -= seen
+                seen |= candidates
+
+                for candidate in candidates:
+                    distance = edit_distance(norm, candidate, max_distance)
+                    if distance <= max_distance:
+                        for product_id in self._by_article[candidate]:
+                            article, title, _ = self._products[product_id]
+                            matches.append((distance, article, title, product_id))
+                if matches and not expand:
+                    break
+
+        matches.sort(key=lambda m: (m[0], len(m[1]), m[1]))
+        return matches[:limit]
+
+    def suggest_titles(self, query, limit=10, min_score=0.3):
+        """Товары с похожим названием: список (score, article, title, product_id)"""
+        trigrams = title_trigrams(query)
+        if not normalize_title(query):
+            return []
+
+        with self._lock:
+            counts = Counter()
+            for trigram in trigrams:
+                counts.update(self._trigrams.get(trigram, ()))
+
+            matches = []
+            for product_id, shared in counts.most_common(limit * 5):
+                score = shared / len(trigrams)
+                if score < min_score:
+                    break
+                article, title, _ = self._products[product_id]
+                matches.append((round(score, 3), article, title, product_id))
+
+        matches.sort(key=lambda m: (-m[0], m[1]))
+        return matches[:limit]
+
+    def suggest(self, query, limit=10, max_distance=2, expand=False):
+        """Подсказки по артикулу и названию, лучшие первыми"""
+        results = []
+        seen = set()
+        for distance, article, title, product_id in self.suggest_articles(query, limit, max_distance, expand):
+            seen.add(product_id)
+            results.append({
+                'article': article,
+                'title': title,
+                'match': 'article',
+                'distance': distance,
+            })
+        for score, article, title, product_id in self.suggest_titles(query, limit):
+            if product_id not in seen:
+                results.append({
+                    'article': article,
+                    'title': title,
+                    'match': 'title',
+                    'score': score,
+                })
+        return results[:limit]
+
+# Общий индекс приложения; первое построение — под замком, чтобы параллельные
+# первые запросы не строили его дважды и не подписывались на изменения дважды
+article_index = ArticleIndex()
+_build_lock = threading.Lock()
+
+def ensure_index():
+    """Строит индекс из базы при первом обращении и применяет отложенные изменения.
+
+    Вызывается внутри app_context.
+    """
+    from warehouse_system import db, Product, on_catalog_change
+
+    if not article_index.built:
+        with _build_lock:
+            if not article_index.built:
+                on_catalog_change(_on_catalog_change)
+                rows = db.session.query(Product.id, Product.article, Product.title).all()
+                article_index.build(rows)
+                return article_index
+
+    with article_index._lock:
+        pending = set(article_index._pending)
+        article_index._pending.clear()
+    if pending:
+        rows = db.session.query(Product.id, Product.article, Product.title) \
+            .filter(Product.id.in_(pending)).all()
+        for product_id, article, title in rows:
+            article_index.upsert(product_id, article, title)
+        for product_id in pending - {row[0] for row in rows}:
+            article_index.remove(product_id)
+    return article_index
+
+def suggest(query, limit=10, max_distance=2, expand=False):
+    """Подсказки по артикулу/названию из общего индекса (внутри app_context)"""
+    return ensure_index().suggest(query, limit=limit, max_distance=max_distance, expand=expand)
+
+def _on_catalog_change(changes):
+    article_index.invalidate(changes['product_ids'])
+
+def main():
+    """Замер скорости подсказок на синтетическом каталоге"""
+    import random
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    random.seed(42)
+    letters = 'ABCEKMPTX'
+    rows = []
+    for i in range(count):
+        if i % 3:
+            article = str(random.randint(100, 999999))
+        else:
+            article = f"{random.choice(letters)}{random.choice(letters)}{random.randint(1, 99)}-{random.randint(1, 99):02d}"
+        rows.append((i, article, f"Деталь лифта {i} {random.choice(['двигатель', 'кнопка', 'ролик', 'датчик'])}"))
+
+    index = ArticleIndex()
+    started = time.perf_counter()
+    index.build(rows)
+    print(f"📦 Индекс: {len(index)} артикулов за {time.perf_counter() - started:.2f} с")
+
+    queries = [row[1] for row in random.sample(rows, 1000)]
+    # Портим запросы: перестановка соседних символов
+    queries = [q[:1] + q[2:3] + q[1:2] + q[3:] if len(q) > 3 else q for q in queries]
+
+    started = time.perf_counter()
+    for q in queries:
+        index.suggest_articles(q, limit=5)
+    elapsed = (time.perf_counter() - started) / len(queries)
+    print(f"⚡ Подсказка по артикулу: {elapsed * 1000:.3f} мс на запрос")
+
+if __name__ == "__main__":
+    main()
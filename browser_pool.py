@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Пул headless Chrome для импорта с snab-lift.ru
+Браузеры создаются по требованию и переиспользуются между импортами
+"""
+
+import sys
+import threading
+from contextlib import contextmanager
+
+# Одновременно открытых браузеров в процессе
+POOL_SIZE = 2
+
+class BrowserPool:
+    """Не больше size драйверов; занятый драйвер возвращается в пул после импорта"""
+    
+    def __init__(self, size=POOL_SIZE, factory=None):
+        self.size = size
+        self._factory = factory
+        self._idle = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+    
+    def _create(self):
+        if self._factory is None:
+            # Selenium загружается только при первом импорте
+            from warehouse_card import create_driver
+            self._factory = create_driver
+        return self._factory()
+    
+    def _acquire(self, timeout):
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Пул браузеров закрыт")
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("Нет свободного браузера")
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+    
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"⚠️ Ошибка закрытия браузера: {e}", file=sys.stderr)
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+    
+    @contextmanager
+    def driver(self, timeout=None):
+        """Драйвер из пула; после ошибки браузер закрывается, а не возвращается"""
+        driver = self._acquire(timeout)
+        try:
+            yield driver
+        except BaseException:
+            self._discard(driver)
+            raise
+        with self._cond:
+            if not self._closed:
+                self._idle.append(driver)
+                self._cond.notify()
+                return
+        self._discard(driver)
+    
+    def close(self):
+        """Закрывает свободные браузеры; занятые закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for driver in idle:
+            self._discard(driver)
+    
+    def stats(self):
+        with self._cond:
+            return {'size': self.size, 'created': self._created, 'idle': len(self._idle)}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Общий пул браузеров процесса"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Массовый импорт товаров из файла с журналом и продолжением
+articles.txt / urls.txt — по строке на товар, CSV — колонка article / url / query
+(или первая). Выполненные позиции дописываются в журнал <файл>.journal.jsonl сразу
+после записи в базу; повторный запуск продолжает с места остановки. Страницы
+разбираются в нескольких браузерах параллельно, запись в базу — пачками (ingest.py).
+"""
+
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from ingest import ingest_parsed
+
+DEFAULT_WORKERS = 2
+# Разобранных товаров в одной транзакции записи
+INGEST_BATCH = 20
+# Статусы, после которых позиция не повторяется; failed — повторяется при продолжении
+DONE_STATUSES = {'created', 'updated', 'unchanged', 'skipped', 'missing', 'not_found'}
+# Колонки CSV с артикулом или адресом, по порядку предпочтения
+QUERY_COLUMNS = ('query', 'article', 'артикул', 'url', 'ссылка')
+PRECHECK_CHUNK = 500
+
+STATUS_ICONS = {'created': '✅', 'updated': '🔄', 'unchanged': '✔️', 'skipped': '⏭️',
+                'missing': '⏭️', 'not_found': '❓', 'failed': '❌'}
+
+def read_queries(path):
+    """Артикулы/адреса из .txt (по строке, # — комментарий) или .csv; без повторов"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            rows = csv.reader(f, dialect)
+            header = [h.strip().lower() for h in next(rows, [])]
+            column = next((header.index(name) for name in QUERY_COLUMNS if name in header), None)
+            if column is None:
+                # Без заголовка — первая колонка, и первая строка тоже данные
+                values = [header[0]] if header else []
+                column = 0
+            else:
+                values = []
+            values.extend(row[column] for row in rows if len(row) > column)
+        else:
+            values = [line for line in f if not line.lstrip().startswith('#')]
+    return list(dict.fromkeys(v.strip() for v in values if v.strip()))
+
+def journal_path(path):
+    return f"{path}.journal.jsonl"
+
+class Journal:
+    """Журнал выполненных позиций: строка JSON на позицию, последняя запись главная"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка после сбоя
+                        continue
+                    self.entries[entry['query']] = entry
+    
+    def done(self, query):
+        entry = self.entries.get(query)
+        return entry is not None and entry['status'] in DONE_STATUSES
+    
+    def record(self, entries):
+        """Дописывает записи и сбрасывает на диск — после сбоя они не потеряются"""
+        now = datetime.now().isoformat(timespec='seconds')
+        lines = []
+        for entry in entries:
+            entry = {k: v for k, v in entry.items() if v not in (None, {}, '')}
+            entry['at'] = now
+            self.entries[entry['query']] = entry
+            lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        if self.path and lines:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+def _existing(queries):
+    """Какие запросы уже есть в базе (по артикулу или адресу страницы)"""
+    from warehouse_system import db, Product
+    
+    found = set()
+    for i in range(0, len(queries), PRECHECK_CHUNK):
+        chunk = queries[i:i + PRECHECK_CHUNK]
+        for article, url in db.session.query(Product.article, Product.url) \
+                .filter(db.or_(Product.article.in_(chunk), Product.url.in_(chunk))):
+            found.add(article)
+            found.add(url)
+    return found
+
+def _fetch(pool, query):
+    """Разбор страницы товара в браузере из пула: данные товара или None, если не найден"""
+    from warehouse_card import parse_product_page, find_product_by_article, is_url
+    
+    with pool.driver() as driver:
+        product_url = query if is_url(query) else find_product_by_article(driver, query)
+        if not product_url:
+            return None
+        return parse_product_page(driver, product_url)
+
+def import_queries(queries, mode='skip', fields=None, workers=DEFAULT_WORKERS, journal=None,
+                   verbose=True, pool=None):
+    """Импортирует список артикулов/адресов; возвращает отчет.
+
+    journal — путь журнала (позиции из него пропускаются, новые дописываются);
+    pool — пул браузеров (по умолчанию свой, на workers браузеров). Внутри app_context.
+    """
+    from browser_pool import BrowserPool
+    
+    journal = Journal(journal)
+    start = time.perf_counter()
+    todo = [q for q in queries if not journal.done(q)]
+    resumed = len(queries) - len(todo)
+    if verbose and resumed:
+        print(f"↩️ Продолжение: {resumed} из {len(queries)} уже выполнено по журналу")
+    
+    counter = {'n': resumed}
+    
+    def record(entries):
+        journal.record(entries)
+        if verbose:
+            for entry in entries:
+                counter['n'] += 1
+                detail = entry.get('reason') or entry.get('article') or ''
+                print(f"[{counter['n']}/{len(queries)}] {STATUS_ICONS[entry['status']]} {entry['query']} "
+                      f"— {entry['status']}{f' ({detail})' if detail else ''}")
+    
+    # Не открываем страницу зря: skip — товар уже есть, refresh_fields — его нет
+    if mode in ('skip', 'refresh_fields'):
+        existing = _existing(todo)
+        if mode == 'skip':
+            record([{'query': q, 'status': 'skipped'} for q in todo if q in existing])
+            todo = [q for q in todo if q not in existing]
+        else:
+            record([{'query': q, 'status': 'missing'} for q in todo if q not in existing])
+            todo = [q for q in todo if q in existing]
+    
+    parsed = []
+    
+    def save_parsed():
+        if not parsed:
+            return
+        report = ingest_parsed(parsed, mode=mode, fields=fields)
+        parsed.clear()
+        entries = [{'query': r['query'], 'status': r['status'], 'article': r['article'],
+                    'changes': r.get('changes')} for r in report['success'] + report['skipped']]
+        entries += [{'query': r['query'], 'status': 'failed', 'reason': r['reason']} for r in report['failed']]
+        record(entries)
+    
+    own_pool = pool is None
+    pool = pool or BrowserPool(size=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') as executor:
+            queue = iter(todo)
+            inflight = {}
+            try:
+                while True:
+                    # В работе не больше двух страниц на браузер
+                    while len(inflight) < workers * 2:
+                        query = next(queue, None)
+                        if query is None:
+                            break
+                        inflight[executor.submit(_fetch, pool, query)] = query
+                    if not inflight:
+                        break
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        query = inflight.pop(future)
+                        try:
+                            product_data = future.result()
+                        except Exception as e:
+                            record([{'query': query, 'status': 'failed', 'reason': str(e)}])
+                            continue
+                        if product_data is None:
+                            record([{'query': query, 'status': 'not_found', 'reason': 'Не найден на сайте'}])
+                            continue
+                        parsed.append((query, product_data))
+                        if len(parsed) >= INGEST_BATCH:
+                            save_parsed()
+            finally:
+                # Прерывание (Ctrl+C) — уже разобранное все равно попадает в базу и журнал
+                for future in inflight:
+                    future.cancel()
+                save_parsed()
+    finally:
+        if own_pool:
+            pool.close()
+    
+    return build_report(queries, journal, mode, time.perf_counter() - start, resumed)
+
+def build_report(queries, journal, mode, elapsed, resumed=0):
+    """Отчет по всем позициям (с учетом прошлых запусков из журнала)"""
+    items = [journal.entries.get(q, {'query': q, 'status': 'pending'}) for q in queries]
+    summary = {'total': len(queries), 'resumed': resumed}
+    for item in items:
+        summary[item['status']] = summary.get(item['status'], 0) + 1
+    return {
+        'mode': mode,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'elapsed_s': round(elapsed, 1),
+        'journal': journal.path,
+        'summary': summary,
+        'items': items,
+    }
+
+def import_file(path, mode='skip', fields=None, workers=DEFAULT_WORKERS, restart=False, verbose=True):
+    """Импорт из файла с журналом рядом с ним; restart=True — начать заново"""
+    queries = read_queries(path)
+    journal = journal_path(path)
+    if restart and os.path.exists(journal):
+        os.remove(journal)
+    report = import_queries(queries, mode=mode, fields=fields, workers=workers, journal=journal,
+                            verbose=verbose)
+    report['file'] = path
+    return report
+
+def write_report(report, path):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Кэш готового HTML карточек для /card/<article>
+Запись сбрасывается хуком изменений каталога; раз в REVALIDATE_SECONDS отметка
+товара сверяется с базой — так видны и записи других процессов (импорт из CLI)
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from card_render import card_context, render_context, stamp_query, template_fingerprint
+
+CACHE_SIZE = 2048
+REVALIDATE_SECONDS = float(os.environ.get('CARD_CACHE_REVALIDATE', 30))
+
+class CardCache:
+    """LRU готовых карточек: артикул -> (HTML, ETag, отметка изменений)"""
+    
+    def __init__(self, size=CACHE_SIZE, revalidate=REVALIDATE_SECONDS):
+        self.size = size
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # article -> entry
+        self._articles = {}  # product_id -> article
+        self._template = template_fingerprint()
+        self.hits = self.misses = self.renders = 0
+    
+    def _etag(self, stamp):
+        """ETag без кавычек — их добавляет response.set_etag"""
+        return hashlib.sha1(f"{self._template}|{stamp}".encode('utf-8')).hexdigest()[:20]
+    
+    def get(self, article):
+        """Карточка (html, etag) или None, если товара нет. Внутри app_context."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(article)
+            if entry is not None and now - entry['checked'] < self.revalidate:
+                self._entries.move_to_end(article)
+                self.hits += 1
+                return entry['html'], entry['etag']
+        
+        # Нет в кэше или пора сверить отметку с базой
+        from warehouse_system import Product
+        row = stamp_query().filter(Product.article == article).first()
+        if row is None:
+            self.invalidate(articles=[article])
+            return None
+        product_id, _, stamp = row
+        
+        if entry is not None and entry['stamp'] == stamp:
+            with self._lock:
+                entry['checked'] = now
+                self.hits += 1
+            return entry['html'], entry['etag']
+        
+        with self._lock:
+            self.misses += 1
+        return self._render(product_id, article, stamp, now)
+    
+    def _render(self, product_id, article, stamp, now):
+        from warehouse_system import db, Product
+        product = Product.query.options(db.joinedload(Product.stock), db.selectinload(Product.images)) \
+            .filter(Product.id == product_id).first()
+        if product is None:
+            return None
+        html = render_context(card_context(product, local_images=True))
+        entry = {'html': html, 'etag': self._etag(stamp), 'stamp': stamp, 'checked': now,
+                 'product_id': product_id}
+        with self._lock:
+            self.renders += 1
+            self._entries[article] = entry
+            self._entries.move_to_end(article)
+            self._articles[product_id] = article
+            while len(self._entries) > self.size:
+                _, old = self._entries.popitem(last=False)
+                self._articles.pop(old['product_id'], None)
+        return html, entry['etag']
+    
+    def invalidate(self, product_ids=(), articles=()):
+        """Сбрасывает карточки товаров; без аргументов — весь кэш"""
+        with self._lock:
+            if not product_ids and not articles:
+                self._entries.clear()
+                self._articles.clear()
+                return
+            targets = set(articles)
+            targets.update(self._articles[pid] for pid in product_ids if pid in self._articles)
+            for article in targets:
+                entry = self._entries.pop(article, None)
+                if entry is not None:
+                    self._articles.pop(entry['product_id'], None)
+    
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'renders': self.renders}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_card_cache():
+    """Общий кэш карточек приложения; подписывается на изменения каталога"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from warehouse_system import on_catalog_change
+            _cache = CardCache()
+            on_catalog_change(_on_catalog_change)
+        return _cache
+
+def _on_catalog_change(changes):
+    ids = changes['product_ids']
+    articles = changes['articles'] | changes['deleted_articles']
+    if ids or articles:
+        _cache.invalidate(product_ids=ids, articles=articles)
+    else:
+        # touch_catalog() без подробностей (массовая запись мимо ORM) — сбрасываем все
+        _cache.invalidate()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Рендер складских карточек товаров
+Один шаблон templates/product_card.html для /card/<article>, create_all_cards.py,
+MCP create_product_card и warehouse_card.py; компилируется один раз, с автоэкранированием
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+CARD_TEMPLATE = 'product_card.html'
+
+# Ограничения, общие для всех карточек
+GALLERY_SIZE = 6
+DESCRIPTION_MAX_CHARS = 1000
+# Размер локальной миниатюры для галереи карточки (image_mirror.THUMB_SIZES)
+CARD_IMAGE_SIZE = 480
+
+_env = None
+_template = None
+_template_lock = threading.Lock()
+
+def get_environment():
+    """Окружение Jinja карточек: templates/, автоэкранирование, без перепроверки файлов"""
+    global _env
+    if _env is None:
+        with _template_lock:
+            if _env is None:
+                _env = Environment(
+                    loader=FileSystemLoader(TEMPLATES_DIR),
+                    autoescape=select_autoescape(['html']),
+                    auto_reload=False
+                )
+    return _env
+
+def get_template():
+    """Скомпилированный шаблон карточки (один на процесс)"""
+    global _template
+    if _template is None:
+        _template = get_environment().get_template(CARD_TEMPLATE)
+    return _template
+
+def _specifications(value):
+    """Характеристики: dict или JSON-строка из базы"""
+    if isinstance(value, dict):
+        return value
+    try:
+        specs = json.loads(value) if value else {}
+    except (TypeError, ValueError):
+        return {}
+    return specs if isinstance(specs, dict) else {}
+
+def _dimensions(value):
+    """Размеры: строка из базы или dict со страницы сайта"""
+    if isinstance(value, dict):
+        return " | ".join(f"{k}: {v}" for k, v in value.items())
+    return value or ''
+
+def _format_time(value):
+    """Дата для подвала: datetime или ISO-строка из to_dict()"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value.strftime('%d.%m.%Y %H:%M') if value else None
+
+def _stock(zone, rack, shelf, cell, actual, reserved, minimum=0):
+    actual = actual or 0
+    reserved = reserved or 0
+    return {
+        'zone': zone or '',
+        'rack': rack or '',
+        'shelf': shelf or '',
+        'cell': cell or '',
+        'quantity_actual': actual,
+        'quantity_reserved': reserved,
+        'quantity_min': minimum or 0,
+        'available': actual - reserved,
+    }
+
+def _stock_from_dict(product):
+    """Складские данные из словаря: to_dict() товара или старый формат warehouse_card"""
+    stock = product.get('stock')
+    if isinstance(stock, dict):
+        return _stock(stock.get('zone'), stock.get('rack'), stock.get('shelf'), stock.get('cell'),
+                      stock.get('quantity_actual'), stock.get('quantity_reserved'), stock.get('quantity_min'))
+    if 'warehouse_zone' in product or 'actual_quantity' in product:
+        parts = (product.get('warehouse_location') or '').split('-') + ['', '', '']
+        return _stock(product.get('warehouse_zone'), parts[0], parts[1], parts[2],
+                      product.get('actual_quantity'), product.get('reserved_quantity'),
+                      product.get('min_quantity'))
+    return None
+
+def card_context(product, local_images=False):
+    """Данные карточки из модели Product или словаря товара (база, to_dict(), парсер сайта).
+
+    local_images=True — фото из локального зеркала (/images/...), для страниц сервера;
+    в файлах карточек остаются исходные адреса.
+    """
+    if isinstance(product, dict):
+        get = product.get
+        images = [img if isinstance(img, str) else img.get('image_url') for img in get('images') or []]
+        stock = _stock_from_dict(product)
+    else:
+        get = lambda name, default=None: getattr(product, name, default)
+        images = [img.local_url(CARD_IMAGE_SIZE) if local_images else img.image_url
+                  for img in product.images]
+        s = product.stock
+        stock = _stock(s.zone, s.rack, s.shelf, s.cell, s.quantity_actual, s.quantity_reserved,
+                       s.quantity_min) if s else None
+    
+    if stock and any([stock['zone'], stock['rack'], stock['shelf'], stock['cell']]):
+        location = '-'.join(stock[k] or '-' for k in ('zone', 'rack', 'shelf', 'cell'))
+    else:
+        location = ''
+    
+    return {
+        'article': get('article') or '',
+        'title': get('title') or '',
+        'manufacturer': get('manufacturer') or '',
+        'category': get('category') or '',
+        'price': get('price') or '',
+        'price_old': get('price_old') or '',
+        'weight': get('weight') or '',
+        'dimensions': _dimensions(get('dimensions')),
+        'specifications': _specifications(get('specifications')),
+        'description': (get('description') or '')[:DESCRIPTION_MAX_CHARS],
+        'description_truncated': len(get('description') or '') > DESCRIPTION_MAX_CHARS,
+        'url': get('url') or '',
+        'images': [img for img in images if img][:GALLERY_SIZE],
+        'stock': stock,
+        'location': location,
+        # Наличие на сайте — для карточек товаров, которых еще нет на складе
+        'in_stock': get('in_stock'),
+        'updated_at': _format_time(get('updated_at')),
+    }
+
+def stamp_query(chunk_size=None):
+    """Запрос (id, артикул, отметка изменений) по товарам.
+
+    Отметка — время изменения товара и склада и сводка фото: пока она та же,
+    карточка не изменилась. Собирается в SQL — форматировать даты в Python дороже.
+    """
+    from warehouse_system import db, Product, WarehouseStock, ProductImage
+    
+    images = db.session.query(
+        ProductImage.product_id.label('product_id'),
+        db.func.count().label('count'),
+        db.func.max(ProductImage.id).label('last_id'),
+        db.func.total(db.func.length(ProductImage.image_url)).label('size'),
+        db.func.count(ProductImage.filename).label('local')
+    ).group_by(ProductImage.product_id).subquery()
+    
+    def text(column):
+        return db.func.ifnull(db.cast(column, db.String), '')
+    
+    stamp = text(Product.updated_at) + '|' + text(WarehouseStock.updated_at) + '|' + \
+        text(images.c.count) + '|' + text(images.c.last_id) + '|' + text(images.c.size) + '|' + \
+        text(images.c.local)
+    query = db.session.query(Product.id, Product.article, stamp) \
+        .outerjoin(WarehouseStock, WarehouseStock.product_id == Product.id) \
+        .outerjoin(images, images.c.product_id == Product.id)
+    if chunk_size:
+        query = query.execution_options(yield_per=chunk_size)
+    return query
+
+def render_context(context, static=False, editable=False):
+    """HTML карточки по готовым данным card_context()"""
+    return get_template().render(product=context, static=static, editable=editable)
+
+def render_card(product, static=False, editable=False):
+    """HTML карточки. static=True — для файла: без кнопки возврата к списку.
+
+    editable=True — место и количество вводятся вручную и сохраняются в localStorage
+    (карточки товаров, которых нет в базе).
+    """
+    return render_context(card_context(product), static=static, editable=editable)
+
+def template_fingerprint():
+    """Хэш исходника шаблона: при правке шаблона карточки нужно пересобрать"""
+    with open(os.path.join(TEMPLATES_DIR, CARD_TEMPLATE), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def card_filename(product):
+    """Имя файла карточки: warehouse_card_<артикул>_<начало названия>.html"""
+    article = product['article'] if isinstance(product, dict) else product.article
+    title = product['title'] if isinstance(product, dict) else product.title
+    safe_title = "".join([c if c.isalnum() or c in (' ', '-', '_') else '_' for c in (title or '')[:30]])
+    return f"warehouse_card_{article}_{safe_title}.html"
+
+def write_card(product, directory='.', editable=False):
+    """Сохраняет карточку в файл; возвращает путь"""
+    filename = card_filename(product)
+    if directory != '.':
+        filename = os.path.join(directory, filename)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(render_card(product, static=True, editable=editable))
+    return filename
+
+def write_contexts(items, directory='.'):
+    """Пишет карточки по парам (данные card_context, имя файла); возвращает число файлов.
+
+    Функция уровня модуля — ее вызывают процессы пула сборки карточек.
+    """
+    for context, filename in items:
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(render_context(context, static=True))
+    return len(items)
+
+def benchmark(count=10000):
+    """Время рендера count карточек по товарам из базы (по кругу)"""
+    from warehouse_system import app, db, Product
+    
+    with app.app_context():
+        products = Product.query.options(db.joinedload(Product.stock), db.selectinload(Product.images)) \
+            .limit(500).all()
+        if not products:
+            print("❌ База пуста — нечего рендерить")
+            return
+        contexts = [card_context(p) for p in products]
+    
+    start = time.perf_counter()
+    get_template()
+    compile_ms = (time.perf_counter() - start) * 1000
+    
+    start = time.perf_counter()
+    size = 0
+    for i in range(count):
+        size += len(get_template().render(product=contexts[i % len(contexts)], static=True))
+    elapsed = time.perf_counter() - start
+    
+    print(f"⏱️ Рендер {count} карточек ({len(contexts)} разных товаров):")
+    print(f"   компиляция шаблона: {compile_ms:.1f} мс (один раз)")
+    print(f"   всего:              {elapsed:.2f} с")
+    print(f"   на карточку:        {elapsed / count * 1000:.3f} мс")
+    print(f"   средний размер:     {size / count / 1024:.1f} КБ")
+
+def main():
+    """python card_render.py --benchmark [N] | python card_render.py <артикул>"""
+    if len(sys.argv) < 2:
+        print("❌ Использование: python card_render.py <артикул> | --benchmark [N]")
+        sys.exit(1)
+    
+    if sys.argv[1] == '--benchmark':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 10000)
+        return
+    
+    from warehouse_system import app, Product
+    with app.app_context():
+        product = Product.query.filter_by(article=sys.argv[1]).first()
+        if not product:
+            print(f"❌ Товар {sys.argv[1]} не найден")
+            sys.exit(1)
+        print(f"✅ Карточка: {write_card(product)}")
+
+if __name__ == "__main__":
+    main()
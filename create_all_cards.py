@@ -1,71 +1,195 @@
 #!/usr/bin/env python3
 """
 Создание HTML карточек для всех товаров в базе
+Инкрементальная сборка: товары читаются порциями, карточка перерисовывается,
+только если изменились ее данные или шаблон; карточки удаленных товаров удаляются
 """
 
-from warehouse_system import app, db, Product, WarehouseStock
-from warehouse_card import create_warehouse_card
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-with app.app_context():
-    products = Product.query.all()
+from card_render import card_context, card_filename, stamp_query, template_fingerprint, write_contexts
+
+MANIFEST_NAME = 'cards_manifest.json'
+CHUNK_SIZE = 500
+# Меньше стольких измененных карточек в порции — рисуем в своем процессе:
+# запуск пула дороже, чем несколько рендеров
+INLINE_LIMIT = 64
+
+def load_manifest(path):
+    """Манифест прошлой сборки: {'template': хэш, 'cards': {артикул: {'hash', 'file'}}}"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('cards'), dict):
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'template': None, 'cards': {}}
+
+def save_manifest(path, manifest):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False))
+    os.replace(tmp, path)
+
+def context_hash(context):
+    """Хэш данных карточки (все, что попадает в HTML)"""
+    data = json.dumps(context, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+def iter_stamps(chunk_size=CHUNK_SIZE):
+    """Отметки изменений всех товаров одним легким запросом: (id, артикул, отметка).
+
+    Если отметка совпала с прошлой сборкой, товар даже не загружается.
+    """
+    for row in stamp_query(chunk_size):
+        yield tuple(row)
+
+def load_contexts(ids):
+    """Данные карточек товаров по id: склад и фото — одним запросом на порцию"""
+    from warehouse_system import db, Product
+    
+    products = Product.query.options(db.joinedload(Product.stock), db.selectinload(Product.images)) \
+        .filter(Product.id.in_(ids)).all()
+    contexts = [card_context(p) for p in products]
+    db.session.expunge_all()
+    return contexts
+
+class CardBuilder:
+    """Рендер измененных карточек: мелкие порции — в своем процессе, крупные — в пуле"""
+    
+    def __init__(self, directory, workers):
+        self.directory = directory
+        self.workers = workers
+        self._pool = None
+        self._pending = set()
+    
+    def render(self, items):
+        if len(items) < INLINE_LIMIT or self.workers == 1:
+            write_contexts(items, self.directory)
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        # Делим порцию между процессами; в очереди не больше двух задач на процесс
+        step = -(-len(items) // self.workers)
+        for i in range(0, len(items), step):
+            while len(self._pending) >= self.workers * 2:
+                done, self._pending = wait(self._pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            self._pending.add(self._pool.submit(write_contexts, items[i:i + step], self.directory))
+    
+    def close(self):
+        try:
+            for future in self._pending:
+                future.result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+def build_cards(directory='.', workers=None, chunk_size=CHUNK_SIZE, force=False, verbose=True):
+    """Собирает карточки в directory; возвращает счетчики сборки"""
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    previous = load_manifest(manifest_path)
+    template = template_fingerprint()
+    # Шаблон изменился — перерисовываем все
+    force = force or previous.get('template') != template
+    old_cards = previous['cards']
+    existing = set(os.listdir(directory))
+    
+    cards = {}
+    stats = {'total': 0, 'rendered': 0, 'skipped': 0, 'deleted': 0}
+    builder = CardBuilder(directory, workers or os.cpu_count() or 1)
+    start = time.perf_counter()
+    
+    def flush(batch):
+        """Загружает порцию товаров с новыми отметками и рисует те, чьи данные изменились"""
+        stamps = dict(batch.values())
+        changed = []
+        for context in load_contexts(list(batch)):
+            article = context['article']
+            entry = {'hash': context_hash(context), 'file': card_filename(context), 'stamp': stamps[article]}
+            cards[article] = entry
+            old = old_cards.get(article) or {}
+            if not force and old.get('hash') == entry['hash'] and old.get('file') == entry['file'] \
+                    and entry['file'] in existing:
+                stats['skipped'] += 1
+                continue
+            changed.append((context, entry['file']))
+            if verbose:
+                print(f"✅ {article}: {entry['file']}")
+        if changed:
+            stats['rendered'] += len(changed)
+            builder.render(changed)
+    
+    try:
+        batch = {}
+        for product_id, article, stamp in iter_stamps(chunk_size):
+            stats['total'] += 1
+            old = old_cards.get(article)
+            if not force and old and old.get('stamp') == stamp and old['file'] in existing:
+                cards[article] = old
+                stats['skipped'] += 1
+                continue
+            batch[product_id] = (article, stamp)
+            if len(batch) >= chunk_size:
+                flush(batch)
+                batch = {}
+        if batch:
+            flush(batch)
+    finally:
+        builder.close()
+    
+    # Карточки удаленных товаров и старые файлы переименованных
+    for article, old in old_cards.items():
+        current = cards.get(article)
+        if current is None or current['file'] != old['file']:
+            if old['file'] in existing:
+                os.remove(os.path.join(directory, old['file']))
+            if current is None:
+                stats['deleted'] += 1
+                if verbose:
+                    print(f"🗑️ {article}: {old['file']}")
+    
+    if stats['rendered'] or stats['deleted'] or cards.keys() != old_cards.keys() or force:
+        save_manifest(manifest_path, {'template': template, 'cards': cards})
+    stats['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="HTML карточки для всех товаров (инкрементально)")
+    parser.add_argument("--out", default=".", help="папка карточек (по умолчанию текущая)")
+    parser.add_argument("--workers", type=int, default=None, help="процессов рендера (по умолчанию — по числу ядер)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="товаров в порции чтения")
+    parser.add_argument("--force", action="store_true", help="перерисовать все карточки")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не печатать каждую карточку")
+    args = parser.parse_args()
+    
+    from warehouse_system import app
     
     print("=" * 70)
     print("📄 СОЗДАНИЕ HTML КАРТОЧЕК ДЛЯ ВСЕХ ТОВАРОВ")
     print("=" * 70)
     print()
     
-    for product in products:
-        # Подготавливаем данные для карточки
-        product_data = {
-            'url': product.url,
-            'title': product.title,
-            'price': product.price or '',
-            'price_old': '',
-            'sku': product.article,
-            'article': product.article,
-            'description': product.description or '',
-            'images': [img.image_url for img in product.images],
-            'specifications': {},
-            'manufacturer': product.manufacturer or '',
-            'category': product.category or '',
-            'weight': product.weight or '',
-            'dimensions': {},
-            'in_stock': False
-        }
-        
-        # Добавляем характеристики из JSON
-        if hasattr(product, 'specifications') and product.specifications:
-            try:
-                import json
-                product_data['specifications'] = json.loads(product.specifications)
-            except:
-                pass
-        
-        # Добавляем складские данные
-        if product.stock:
-            stock = product.stock
-            product_data['warehouse_zone'] = stock.zone
-            product_data['warehouse_location'] = f"{stock.rack}-{stock.shelf}-{stock.cell}"
-            product_data['actual_quantity'] = stock.quantity_actual
-            product_data['reserved_quantity'] = stock.quantity_reserved
-            product_data['in_stock'] = (stock.quantity_actual - stock.quantity_reserved) > 0
-            product_data['stock_quantity'] = stock.quantity_actual
-        else:
-            product_data['stock_quantity'] = ''
-        
-        # Добавляем delivery_info (пустой список)
-        product_data['delivery_info'] = []
-        
-        # Создаем карточку
-        filename = create_warehouse_card(product_data)
-        print(f"✅ {product.article}: {filename}")
+    with app.app_context():
+        stats = build_cards(args.out, workers=args.workers, chunk_size=args.chunk,
+                            force=args.force, verbose=not args.quiet)
     
     print()
     print("=" * 70)
-    print(f"📦 Создано карточек: {len(products)}")
+    print(f"📦 Товаров: {stats['total']}, создано/обновлено карточек: {stats['rendered']}, "
+          f"без изменений: {stats['skipped']}, удалено: {stats['deleted']}")
+    print(f"⏱️ {stats['elapsed_ms']} мс")
     print("=" * 70)
-    print()
-    print("Открыть карточки:")
-    for p in products:
-        safe_title = "".join([c if c.isalnum() or c in (' ', '-', '_') else '_' for c in p.title[:30]])
-        print(f"open warehouse_card_{p.article}_{safe_title}.html")
+    print(f"\nКарточки: {os.path.abspath(args.out)}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Дедупликация фото товаров
+При импорте — по адресу: варианты размеров одной картинки (resize_cache 1С-Битрикс,
+параметры запроса) сводятся к одному; после скачивания (image_mirror.py) — только точные копии по
+содержимому (тот же SHA-256). Похожие картинки (перцептивный хэш dHash) сводятся
+лишь по явному запросу из командной строки (--perceptual) после просмотра отчета.
+Остается одна каноническая запись — самый крупный вариант на месте первого.
+"""
+
+import argparse
+import os
+import re
+import sys
+from urllib.parse import urlsplit, urlunsplit
+
+from image_mirror import mirror_dir, thumbnail_name, THUMB_SIZES
+
+# Перцептивный хэш — необязательный (нужен Pillow); без него сравнивается только содержимое
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# /upload/resize_cache/iblock/abc/200_200_1/photo.jpg -> /upload/iblock/abc/photo.jpg
+RESIZE_CACHE = re.compile(r'/upload/resize_cache/(.+?)/\d+_\d+_\d+/([^/]+)$')
+# Отличие dHash в битах, при котором картинки считаются одинаковыми
+PHASH_DISTANCE = 4
+
+def canonical_url(url):
+    """Ключ картинки по адресу: без варианта размера, параметров и регистра хоста"""
+    parts = urlsplit(url.strip())
+    path = RESIZE_CACHE.sub(r'/upload/\1/\2', parts.path)
+    return urlunsplit((parts.scheme.lower() or 'https', parts.netloc.lower(), path, '', ''))
+
+def unique_images(urls, limit=None):
+    """Адреса без повторов одной картинки, в исходном порядке.
+
+    Из вариантов одной картинки берется оригинал, если он есть в списке.
+    """
+    chosen = {}
+    for url in urls:
+        if not url:
+            continue
+        key = canonical_url(url)
+        if key not in chosen or url.split('?')[0] == key:
+            chosen[key] = url
+    result = list(chosen.values())
+    return result[:limit] if limit else result
+
+def dhash(path, size=8):
+    """Перцептивный хэш (64 бита) или None без Pillow / для битого файла"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as image:
+            pixels = list(image.convert('L').resize((size + 1, size)).getdata())
+    except OSError:
+        return None
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            value = (value << 1) | (left > pixels[row * (size + 1) + col + 1])
+    return value
+
+def _file_size(directory, filename):
+    try:
+        return os.path.getsize(os.path.join(directory, filename))
+    except OSError:
+        return 0
+
+def _groups(images, directory, by_url, perceptual):
+    """Разбивает фото товара на группы одной картинки (объединение по любому признаку).
+
+    Всегда — тот же файл (SHA-256); by_url — тот же адрес без варианта размера;
+    perceptual — близкий dHash.
+    """
+    parent = list(range(len(images)))
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    keys = {}
+    hashes = []
+    for i, image in enumerate(images):
+        for key in (('url', canonical_url(image.image_url or '')) if by_url else None,
+                    ('file', image.filename) if image.filename else None):
+            if key is None:
+                continue
+            if key in keys:
+                parent[find(i)] = find(keys[key])
+            else:
+                keys[key] = i
+        if perceptual and image.filename:
+            # Хватает самой мелкой миниатюры, если она есть
+            path = os.path.join(directory, thumbnail_name(image.filename, THUMB_SIZES[0]))
+            value = dhash(path if os.path.exists(path) else os.path.join(directory, image.filename))
+            if value is not None:
+                for j, other in hashes:
+                    if bin(value ^ other).count('1') <= PHASH_DISTANCE:
+                        parent[find(i)] = find(j)
+                        break
+                hashes.append((i, value))
+    
+    groups = {}
+    for i in range(len(images)):
+        groups.setdefault(find(i), []).append(images[i])
+    return [group for group in groups.values() if len(group) > 1]
+
+def dedupe_images(product_ids=None, by_url=True, perceptual=False, dry_run=False, verbose=True):
+    """Удаляет повторы фото у товаров (все или product_ids); возвращает счетчики.
+
+    Внутри app_context. Первая запись группы остается на своем месте, но получает
+    адрес и файл самого крупного варианта; главное фото сохраняется.
+    by_url=False — только точные копии (тот же SHA-256); perceptual=True — еще и
+    похожие по dHash (может свести разные фото, поэтому только явно).
+    """
+    from warehouse_system import db, ProductImage
+    
+    directory = mirror_dir()
+    stats = {'products': 0, 'groups': 0, 'removed': 0}
+    query = db.session.query(ProductImage.product_id).group_by(ProductImage.product_id) \
+        .having(db.func.count() > 1)
+    if product_ids is not None:
+        query = query.filter(ProductImage.product_id.in_(list(product_ids)))
+    ids = [row[0] for row in query.all()]
+    
+    for start in range(0, len(ids), 200):
+        images = ProductImage.query.filter(ProductImage.product_id.in_(ids[start:start + 200])) \
+            .order_by(ProductImage.product_id, ProductImage.id).all()
+        by_product = {}
+        for image in images:
+            by_product.setdefault(image.product_id, []).append(image)
+        
+        for product_id, product_images in by_product.items():
+            groups = _groups(product_images, directory, by_url, perceptual)
+            if not groups:
+                continue
+            stats['products'] += 1
+            for group in groups:
+                stats['groups'] += 1
+                keep = group[0]
+                best = max(group, key=lambda img: (_file_size(directory, img.filename) if img.filename else 0,
+                                                   img.image_url == canonical_url(img.image_url or '')))
+                if verbose:
+                    print(f"🖼️ товар {product_id}: оставлено {best.image_url}, повторов: {len(group) - 1}")
+                    for image in group:
+                        if image is not best:
+                            print(f"   − {image.image_url}")
+                stats['removed'] += len(group) - 1
+                if dry_run:
+                    continue
+                keep.image_url, keep.filename = best.image_url, best.filename
+                keep.is_main = any(img.is_main for img in group)
+                for image in group[1:]:
+                    db.session.delete(image)
+        if not dry_run:
+            db.session.commit()
+        db.session.expunge_all()
+    return stats
+
+def storage_report(prune=False):
+    """Сводка по хранилищу фото; prune=True — удалить файлы, на которые нет ссылок.
+
+    saved_bytes — сколько занимали бы копии, если бы каждая запись хранила свой файл.
+    """
+    from warehouse_system import db, ProductImage
+    
+    directory = mirror_dir()
+    rows = db.session.query(ProductImage.filename, db.func.count()) \
+        .filter(ProductImage.filename.isnot(None)).group_by(ProductImage.filename).all()
+    referenced = {filename: count for filename, count in rows}
+    total_rows = ProductImage.query.count()
+    
+    report = {'rows': total_rows, 'mirrored_rows': sum(referenced.values()), 'files': len(referenced),
+              'file_bytes': 0, 'logical_bytes': 0, 'thumbnail_bytes': 0,
+              'orphan_files': 0, 'orphan_bytes': 0, 'pruned': 0}
+    for filename, count in referenced.items():
+        size = _file_size(directory, filename)
+        report['file_bytes'] += size
+        report['logical_bytes'] += size * count
+    
+    thumbnails = {thumbnail_name(f, size) for f in referenced for size in THUMB_SIZES}
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, directory).replace(os.sep, '/')
+            if filename in referenced:
+                continue
+            size = os.path.getsize(path)
+            if filename in thumbnails:
+                report['thumbnail_bytes'] += size
+                continue
+            report['orphan_files'] += 1
+            report['orphan_bytes'] += size
+            if prune and not name.endswith('.tmp'):
+                os.remove(path)
+                report['pruned'] += 1
+    report['saved_bytes'] = report['logical_bytes'] - report['file_bytes']
+    return report
+
+def _mb(value):
+    return f"{value / 1024 / 1024:.1f} МБ"
+
+def main():
+    parser = argparse.ArgumentParser(description="Убрать повторы фото товаров и показать экономию места")
+    parser.add_argument("--dry-run", action="store_true", help="только показать, что будет удалено")
+    parser.add_argument("--perceptual", action="store_true",
+                        help="сводить и похожие картинки (dHash); без --yes только показать совпадения")
+    parser.add_argument("--yes", action="store_true", help="с --perceptual: удалить показанные повторы")
+    parser.add_argument("--prune", action="store_true", help="удалить файлы зеркала без ссылок из базы")
+    parser.add_argument("--report", action="store_true", help="только отчет, без дедупликации")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не печатать каждую группу")
+    args = parser.parse_args()
+    
+    from warehouse_system import app
+    
+    # Похожие, но не одинаковые фото — сначала отчет, удаление только с --yes
+    dry_run = args.dry_run or (args.perceptual and not args.yes)
+    
+    with app.app_context():
+        if not args.report:
+            if Image is None and args.perceptual:
+                print("⚠️ Pillow не установлен — сравнение только по адресу и содержимому")
+            stats = dedupe_images(perceptual=args.perceptual, dry_run=dry_run,
+                                  verbose=not args.quiet or dry_run)
+            action = "будет удалено" if dry_run else "удалено"
+            print(f"✅ Товаров с повторами: {stats['products']}, групп: {stats['groups']}, "
+                  f"{action} записей: {stats['removed']}")
+            if dry_run and not args.dry_run and stats['removed']:
+                print("💡 Проверьте совпадения выше; удалить: python image_dedupe.py --perceptual --yes")
+        report = storage_report(prune=args.prune and not dry_run)
+    
+    print("=" * 70)
+    print(f"🖼️ Записей фото: {report['rows']}, скачано: {report['mirrored_rows']}, "
+          f"уникальных файлов: {report['files']}")
+    print(f"💾 Оригиналы: {_mb(report['file_bytes'])} вместо {_mb(report['logical_bytes'])} — "
+          f"сэкономлено {_mb(report['saved_bytes'])}; миниатюры: {_mb(report['thumbnail_bytes'])}")
+    if report['orphan_files']:
+        verb = "удалено" if report['pruned'] else "можно удалить (--prune)"
+        print(f"🗑️ Файлов без ссылок: {report['orphan_files']} ({_mb(report['orphan_bytes'])}), {verb}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Локальное зеркало фото товаров
+Скачивает ProductImage.image_url с ограничением параллельности, хранит файлы по
+хэшу содержимого (одинаковые фото — один файл) и делает WebP-миниатюры;
+ProductImage.filename — путь копии внутри instance/images
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Миниатюры: список товаров, карточка, просмотр крупно
+THUMB_SIZES = (160, 480, 1024)
+MAX_CONCURRENCY = int(os.environ.get('IMAGE_FETCH_CONCURRENCY', 4))
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+FETCH_TIMEOUT = 20
+COMMIT_EVERY = 50
+
+# Миниатюры — необязательная зависимость (pip install Pillow); без нее хранятся только оригиналы
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Форматы по первым байтам файла
+SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+
+def mirror_dir():
+    """Папка копий: instance/images рядом с базой"""
+    from warehouse_system import app
+    return os.path.join(app.instance_path, 'images')
+
+def thumbnail_name(filename, size):
+    """Имя миниатюры рядом с оригиналом: ab/<sha>.jpg -> ab/<sha>_480.webp"""
+    return f"{os.path.splitext(filename)[0]}_{size}.webp"
+
+def image_extension(data):
+    """Расширение по содержимому; None — не картинка"""
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+def make_session(workers=MAX_CONCURRENCY):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=2)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'Mozilla/5.0 (warehouse image mirror)'
+    return session
+
+def fetch(session, url):
+    """Скачивает картинку не больше MAX_IMAGE_BYTES; бросает ValueError для не-картинок"""
+    with session.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise ValueError(f"файл больше {MAX_IMAGE_BYTES // (1024 * 1024)} МБ")
+            chunks.append(chunk)
+    return b''.join(chunks)
+
+def _tmp_path(path):
+    """Временное имя для атомарной записи: одинаковые фото могут прийти в двух потоках сразу"""
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+def make_thumbnails(path, directory, filename):
+    """WebP-миниатюры всех размеров (уже готовые пропускаются); число созданных"""
+    if Image is None:
+        return 0
+    created = 0
+    with Image.open(path) as original:
+        image = original.convert('RGBA' if original.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        for size in THUMB_SIZES:
+            target = os.path.join(directory, thumbnail_name(filename, size))
+            if os.path.exists(target):
+                continue
+            thumb = image.copy()
+            thumb.thumbnail((size, size))
+            tmp = _tmp_path(target)
+            thumb.save(tmp, 'WEBP', quality=80, method=4)
+            os.replace(tmp, target)
+            created += 1
+    return created
+
+def store(data, directory):
+    """Сохраняет картинку по хэшу содержимого: (имя файла, новый ли файл, создано миниатюр)"""
+    extension = image_extension(data)
+    if extension is None:
+        raise ValueError("не картинка")
+    digest = hashlib.sha256(data).hexdigest()
+    filename = f"{digest[:2]}/{digest}{extension}"
+    path = os.path.join(directory, filename)
+    
+    is_new = not os.path.exists(path)
+    if is_new:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = _tmp_path(path)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return filename, is_new, make_thumbnails(path, directory, filename)
+
+def mirror_images(limit=None, workers=MAX_CONCURRENCY, verbose=True):
+    """Скачивает фото без локальной копии (внутри app_context); возвращает счетчики.
+
+    Скачивание и миниатюры — в пуле потоков; запись в базу — в вызывающем потоке.
+    """
+    from warehouse_system import db, ProductImage
+    
+    directory = mirror_dir()
+    os.makedirs(directory, exist_ok=True)
+    query = db.session.query(ProductImage.image_url) \
+        .filter(ProductImage.filename.is_(None), ProductImage.image_url.isnot(None), ProductImage.image_url != '') \
+        .distinct()
+    urls = [row[0] for row in (query.limit(limit) if limit else query).all()]
+    
+    stats = {'urls': len(urls), 'downloaded': 0, 'stored': 0, 'duplicates': 0,
+             'thumbnails': 0, 'failed': 0, 'bytes': 0}
+    start = time.perf_counter()
+    session = make_session(workers)
+    
+    def work(url):
+        data = fetch(session, url)
+        return (len(data),) + store(data, directory)
+    
+    pending = 0
+    product_ids = set()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-mirror') as pool:
+        futures = {pool.submit(work, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                size, filename, is_new, thumbnails = future.result()
+            except Exception as e:
+                stats['failed'] += 1
+                if verbose:
+                    print(f"⚠️ {url}: {e}")
+                continue
+            
+            stats['downloaded'] += 1
+            stats['bytes'] += size
+            stats['stored' if is_new else 'duplicates'] += 1
+            stats['thumbnails'] += thumbnails
+            # Все строки с этим URL — через ORM, чтобы сработали хуки изменений каталога
+            for image in ProductImage.query.filter_by(image_url=url, filename=None).all():
+                image.filename = filename
+                product_ids.add(image.product_id)
+            pending += 1
+            if pending >= COMMIT_EVERY:
+                db.session.commit()
+                pending = 0
+            if verbose:
+                print(f"✅ {filename}{'' if is_new else ' (уже есть)'} ← {url}")
+    db.session.commit()
+    session.close()
+    
+    # Теперь известно содержимое: убираем точные копии (тот же SHA-256) у этих товаров.
+    # Похожие по dHash не трогаем — это только явный проход image_dedupe.py --perceptual
+    from image_dedupe import dedupe_images
+    stats['duplicates_removed'] = dedupe_images(product_ids, by_url=False, verbose=verbose)['removed'] \
+        if product_ids else 0
+    
+    stats['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return stats
+
+def build_missing_thumbnails():
+    """Миниатюры для уже скачанных оригиналов (например, после установки Pillow)"""
+    directory = mirror_dir()
+    created = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            stem, extension = os.path.splitext(name)
+            if extension == '.tmp' or '_' in stem:
+                continue
+            filename = os.path.relpath(os.path.join(root, name), directory)
+            created += make_thumbnails(os.path.join(root, name), directory, filename)
+    return created
+
+# ========== ФОНОВЫЙ ЗАПУСК ==========
+
+_state = {'running': False, 'started_at': None, 'last': None, 'error': None}
+_state_lock = threading.Lock()
+
+def mirror_status():
+    with _state_lock:
+        return dict(_state)
+
+def start_background(limit=None, workers=MAX_CONCURRENCY):
+    """Запускает зеркалирование в фоновом потоке; False, если оно уже идет"""
+    from warehouse_system import app
+    
+    with _state_lock:
+        if _state['running']:
+            return False
+        _state.update(running=True, started_at=time.time(), error=None)
+    
+    def run():
+        try:
+            with app.app_context():
+                stats = mirror_images(limit=limit, workers=workers, verbose=False)
+            with _state_lock:
+                _state['last'] = stats
+        except Exception as e:
+            with _state_lock:
+                _state['error'] = str(e)
+            print(f"⚠️ Ошибка зеркалирования фото: {e}")
+        finally:
+            with _state_lock:
+                _state['running'] = False
+    
+    threading.Thread(target=run, name='image-mirror', daemon=True).start()
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Скачать фото товаров в локальное зеркало")
+    parser.add_argument("--limit", type=int, default=None, help="не больше N адресов за запуск")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENCY, help="параллельных загрузок")
+    parser.add_argument("--thumbnails", action="store_true", help="досоздать миниатюры скачанных фото")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не печатать каждый файл")
+    args = parser.parse_args()
+    
+    from warehouse_system import app
+    
+    if Image is None:
+        print("⚠️ Pillow не установлен (pip install Pillow) — миниатюры не будут созданы")
+    if args.thumbnails:
+        with app.app_context():
+            print(f"✅ Создано миниатюр: {build_missing_thumbnails()}")
+        return 0
+    
+    with app.app_context():
+        stats = mirror_images(limit=args.limit, workers=args.workers, verbose=not args.quiet)
+    
+    print("=" * 70)
+    print(f"🖼️ Адресов: {stats['urls']}, скачано: {stats['downloaded']} "
+          f"({stats['bytes'] / 1024 / 1024:.1f} МБ), новых файлов: {stats['stored']}, "
+          f"дубликатов: {stats['duplicates']}, миниатюр: {stats['thumbnails']}, ошибок: {stats['failed']}")
+    print(f"🧹 Удалено повторов фото у товаров: {stats['duplicates_removed']}")
+    print(f"⏱️ {stats['elapsed_ms']} мс; файлы: {mirror_dir()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,14 +3,15 @@
 Скрипт для импорта товаров из snab-lift.ru в локальную базу данных
 """
 
+import argparse
 import sys
-import json
-from sqlalchemy import or_
-from warehouse_system import app, db, Product, WarehouseStock, ProductImage
+from warehouse_system import app, db, Product
 from warehouse_card import create_driver, parse_product_page, find_product_by_article, is_url
+from ingest import ingest_product, format_changes, parse_fields, MODES
+from bulk_import import import_file, import_queries, journal_path, write_report, DEFAULT_WORKERS
 
-def import_single_product(query):
-    """Импорт одного товара"""
+def import_single_product(query, mode='skip', fields=None):
+    """Импорт одного товара. mode: skip | upsert | refresh_fields (см. ingest.py)"""
     print("=" * 70)
     print(f"📦 ИМПОРТ ТОВАРА: {query}")
     print("=" * 70)
@@ -34,44 +35,25 @@ def import_single_product(query):
         product_data = parse_product_page(driver, product_url)
         
         with app.app_context():
-            # Проверяем, существует ли товар
-            existing = Product.query.filter_by(article=product_data['article']).first()
-            if existing:
+            # Товар, фото и складская запись — одной транзакцией
+            product_id, status, changes = ingest_product(product_data, mode=mode, fields=fields)
+            if status == 'missing':
+                print(f"⚠️ Товара {product_data['article']} нет в базе — refresh_fields только обновляет")
+                return False
+            product = db.session.get(Product, product_id)
+            if status == 'skipped':
                 print(f"⚠️ Товар {product_data['article']} уже существует в базе")
-                print(f"   Название: {existing.title}")
+                print(f"   Название: {product.title}")
+                print(f"   Обновить данные с сайта: --mode upsert")
                 return False
-            
-            # Создаем товар
-            product = Product(
-                article=product_data['article'],
-                title=product_data['title'],
-                manufacturer=product_data.get('manufacturer'),
-                category=product_data.get('category'),
-                price=product_data.get('price'),
-                description=product_data.get('description'),
-                url=product_data['url'],
-                weight=product_data.get('weight'),
-                dimensions=', '.join([f"{k}: {v}" for k, v in product_data.get('dimensions', {}).items()]),
-                specifications=json.dumps(product_data.get('specifications', {}), ensure_ascii=False)
-            )
-            
-            db.session.add(product)
-            db.session.flush()
-            
-            # Добавляем изображения
-            for i, img_url in enumerate(product_data.get('images', [])[:10]):
-                image = ProductImage(
-                    product_id=product.id,
-                    image_url=img_url,
-                    is_main=(i == 0)
-                )
-                db.session.add(image)
-            
-            # Создаем складскую запись
-            stock = WarehouseStock(product_id=product.id)
-            db.session.add(stock)
-            
-            db.session.commit()
+            if status == 'unchanged':
+                print(f"\n✅ Данные товара {product.article} не изменились")
+                return True
+            if status == 'updated':
+                print(f"\n🔄 ТОВАР ОБНОВЛЕН: {product.article} — {product.title}")
+                for name, change in changes.items():
+                    print(f"   {format_changes({name: change})}")
+                return True
             
             print(f"\n✅ ТОВАР УСПЕШНО ИМПОРТИРОВАН")
             print(f"   Артикул: {product.article}")
@@ -82,7 +64,7 @@ def import_single_product(query):
             print(f"   ID в базе: {product.id}")
             
             return True
-            
+    
     except Exception as e:
         print(f"\n❌ Ошибка импорта: {e}")
         try:
@@ -91,133 +73,96 @@ def import_single_product(query):
         except:
             pass
         return False
-        
+    
     finally:
         driver.quit()
 
-def import_from_list(items):
-    """Массовый импорт из списка"""
+def import_from_list(items, mode='skip', fields=None, workers=1, journal=None):
+    """Массовый импорт из списка (журнал и параллельные браузеры — bulk_import.py)"""
     print("=" * 70)
     print(f"📦 МАССОВЫЙ ИМПОРТ: {len(items)} товаров")
     print("=" * 70)
     
-    success = []
-    failed = []
-    skipped = []
-    
-    driver = create_driver()
-    
-    try:
-        for i, item in enumerate(items, 1):
-            query = item.strip()
-            if not query:
-                continue
-            
-            print(f"\n[{i}/{len(items)}] {query}")
-            
-            try:
-                # Проверяем, существует ли товар
-                with app.app_context():
-                    existing = Product.query.filter(
-                        or_(
-                            Product.article == query,
-                            Product.url == query if is_url(query) else False
-                        )
-                    ).first()
-                    
-                    if existing:
-                        print(f"   ⏭️ Уже существует")
-                        skipped.append({'query': query, 'article': existing.article})
-                        continue
-                
-                # Парсим товар
-                if is_url(query):
-                    product_url = query
-                else:
-                    product_url = find_product_by_article(driver, query)
-                    if not product_url:
-                        print(f"   ❌ Не найден на сайте")
-                        failed.append({'query': query, 'reason': 'Не найден'})
-                        continue
-                
-                product_data = parse_product_page(driver, product_url)
-                
-                # Сохраняем в базу
-                with app.app_context():
-                    product = Product(
-                        article=product_data['article'],
-                        title=product_data['title'],
-                        manufacturer=product_data.get('manufacturer'),
-                        category=product_data.get('category'),
-                        price=product_data.get('price'),
-                        description=product_data.get('description'),
-                        url=product_data['url'],
-                        weight=product_data.get('weight'),
-                        dimensions=', '.join([f"{k}: {v}" for k, v in product_data.get('dimensions', {}).items()]),
-                        specifications=json.dumps(product_data.get('specifications', {}), ensure_ascii=False)
-                    )
-                    
-                    db.session.add(product)
-                    db.session.flush()
-                    
-                    # Добавляем изображения
-                    for j, img_url in enumerate(product_data.get('images', [])[:5]):
-                        image = ProductImage(
-                            product_id=product.id,
-                            image_url=img_url,
-                            is_main=(j == 0)
-                        )
-                        db.session.add(image)
-                    
-                    # Создаем складскую запись
-                    stock = WarehouseStock(product_id=product.id)
-                    db.session.add(stock)
-                    
-                    db.session.commit()
-                    
-                    print(f"   ✅ Импортирован: {product_data['title'][:50]}...")
-                    success.append({'query': query, 'article': product_data['article']})
-                    
-            except Exception as e:
-                print(f"   ❌ Ошибка: {e}")
-                failed.append({'query': query, 'reason': str(e)})
-                db.session.rollback()
-                
-    finally:
-        driver.quit()
+    queries = list(dict.fromkeys(item.strip() for item in items if item.strip()))
+    with app.app_context():
+        report = import_queries(queries, mode=mode, fields=fields, workers=workers, journal=journal)
+    print_summary(report)
+    return report
+
+def print_summary(report):
+    """Итоги массового импорта"""
+    summary = report['summary']
+    failed = [item for item in report['items'] if item['status'] == 'failed']
     
-    # Итоги
     print("\n" + "=" * 70)
     print("📊 ИТОГИ ИМПОРТА")
     print("=" * 70)
-    print(f"✅ Успешно: {len(success)}")
-    print(f"⏭️ Пропущено: {len(skipped)}")
+    print(f"✅ Создано: {summary.get('created', 0)}, обновлено: {summary.get('updated', 0)}, "
+          f"без изменений: {summary.get('unchanged', 0)}")
+    print(f"⏭️ Пропущено: {summary.get('skipped', 0) + summary.get('missing', 0)}")
+    print(f"❓ Не найдено на сайте: {summary.get('not_found', 0)}")
     print(f"❌ Ошибок: {len(failed)}")
+    print(f"⏱️ {report['elapsed_s']} с")
     
     if failed:
-        print("\n❌ Список ошибок:")
+        print("\n❌ Список ошибок (повторятся при следующем запуске):")
         for item in failed:
-            print(f"   {item['query']}: {item['reason']}")
+            print(f"   {item['query']}: {item.get('reason')}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Импорт товаров с snab-lift.ru в локальную базу")
+    parser.add_argument("query", nargs="?", help="артикул или URL товара")
+    parser.add_argument("--file", help="файл со списком: articles.txt, urls.txt или CSV (колонка article/url)")
+    parser.add_argument("--mode", choices=MODES, default="skip", help="что делать с существующими товарами")
+    parser.add_argument("--fields", default=None, help="поля для обновления через запятую (по умолчанию все)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="браузеров параллельно (для --file)")
+    parser.add_argument("--restart", action="store_true", help="начать файл заново, не продолжая по журналу")
+    parser.add_argument("--report", default=None, help="JSON-отчет по всем позициям файла")
+    args = parser.parse_args()
+    
+    try:
+        fields = parse_fields(args.fields)
+    except ValueError as e:
+        print(f"❌ Ошибка: {e}")
+        return 1
+    
     # Создаем таблицы базы данных
     print("📦 Инициализация базы данных...")
     with app.app_context():
         db.create_all()
         print("✅ База данных готова\n")
     
+    if args.file:
+        print("=" * 70)
+        print(f"📦 ИМПОРТ ИЗ ФАЙЛА: {args.file} (журнал: {journal_path(args.file)})")
+        print("=" * 70)
+        with app.app_context():
+            try:
+                report = import_file(args.file, mode=args.mode, fields=fields,
+                                     workers=max(1, args.workers), restart=args.restart)
+            except KeyboardInterrupt:
+                print("\n⏸️ Остановлено — запустите ту же команду, чтобы продолжить")
+                return 130
+        print_summary(report)
+        if args.report:
+            write_report(report, args.report)
+            print(f"📄 Отчет: {args.report}")
+        return 0 if not report['summary'].get('failed') else 2
+    
     # Импорт одного товара
-    if len(sys.argv) > 1:
-        query = sys.argv[1]
-        import_single_product(query)
-    else:
-        print("❌ Ошибка: укажите артикул или URL")
-        print("\nПримеры:")
-        print("  python import_product.py 2498")
-        print("  python import_product.py \"https://snab-lift.ru/catalog/.../product.html\"")
-        print("\nДля массового импорта создайте файл items.txt с артикулами/URL")
-        print("и запустите:")
-        print("  python import_product.py --file items.txt")
+    if args.query:
+        return 0 if import_single_product(args.query, mode=args.mode, fields=fields) else 1
+    
+    print("❌ Ошибка: укажите артикул или URL")
+    print("\nПримеры:")
+    print("  python import_product.py 2498")
+    print("  python import_product.py \"https://snab-lift.ru/catalog/.../product.html\"")
+    print("  python import_product.py 2498 --mode upsert              # обновить данные с сайта")
+    print("  python import_product.py 2498 --mode refresh_fields --fields price,specifications")
+    print("\nДля массового импорта создайте файл items.txt с артикулами/URL")
+    print("и запустите:")
+    print("  python import_product.py --file items.txt --workers 3 --report report.json")
+    return 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
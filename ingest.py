@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Единая запись импортированных товаров в базу
+Товар, фото и складская запись по данным парсера (parse_product_page) — для
+/api/import/snablift, /api/import/batch, import_product.py и MCP import_product.
+Много товаров за одну транзакцию: INSERT ... ON CONFLICT(article) пачкой.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+
+# Фото на товар — одинаково для всех способов импорта
+IMAGE_LIMIT = 10
+# Товаров в одном INSERT/SELECT (лимит переменных SQLite)
+CHUNK_SIZE = 500
+# Поля каталога, которые обновляет повторный импорт; склад не трогается никогда
+CATALOG_FIELDS = ('title', 'manufacturer', 'category', 'price', 'description', 'url',
+                  'weight', 'dimensions', 'specifications')
+REFRESH_FIELDS = CATALOG_FIELDS + ('images',)
+# skip — существующие пропускаются, upsert — создаются и обновляются,
+# refresh_fields — только обновление существующих
+MODES = ('skip', 'upsert', 'refresh_fields')
+SKIP_REASONS = {'skipped': 'Уже существует', 'missing': 'Нет в базе'}
+
+def product_row(product_data):
+    """Колонки Product из данных парсера или API; ValueError без артикула/названия"""
+    article = str(product_data.get('article') or '').strip()
+    title = str(product_data.get('title') or '').strip()
+    if not article or not title:
+        raise ValueError("нужны артикул и название")
+    
+    dimensions = product_data.get('dimensions')
+    if isinstance(dimensions, dict):
+        dimensions = ', '.join(f"{k}: {v}" for k, v in dimensions.items())
+    specifications = product_data.get('specifications') or {}
+    if not isinstance(specifications, str):
+        specifications = json.dumps(specifications, ensure_ascii=False)
+    
+    return {
+        'article': article,
+        'title': title,
+        'manufacturer': product_data.get('manufacturer'),
+        'category': product_data.get('category'),
+        'price': product_data.get('price'),
+        'description': product_data.get('description'),
+        'url': product_data.get('url'),
+        'weight': product_data.get('weight'),
+        'dimensions': dimensions or None,
+        'specifications': specifications,
+    }
+
+def _chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _specifications(value):
+    try:
+        specs = json.loads(value) if value else {}
+    except (TypeError, ValueError):
+        return {}
+    return specs if isinstance(specs, dict) else {}
+
+def changed_fields(old, new, old_images, new_images, fields=REFRESH_FIELDS):
+    """Разница полей каталога: {поле: {'old', 'new'}}.
+
+    Пустое значение с сайта не затирает данные базы; фото сравниваются списком адресов.
+    """
+    diff = {}
+    for name in fields:
+        if name == 'images':
+            if new_images and new_images != old_images:
+                diff['images'] = {'old': old_images, 'new': new_images}
+            continue
+        old_value, new_value = old.get(name), new.get(name)
+        if name == 'specifications':
+            old_value, new_value = _specifications(old_value), _specifications(new_value)
+        if new_value in (None, '', {}):
+            continue
+        if old_value != new_value:
+            diff[name] = {'old': old_value, 'new': new_value}
+    return diff
+
+def parse_fields(value):
+    """Поля для refresh_fields из списка или строки через запятую; ValueError для неизвестных"""
+    if not value:
+        return REFRESH_FIELDS
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    unknown = [name for name in value if name not in REFRESH_FIELDS]
+    if unknown:
+        raise ValueError(f"неизвестные поля: {', '.join(unknown)}; доступны: {', '.join(REFRESH_FIELDS)}")
+    return tuple(dict.fromkeys(value))
+
+def ingest_products(items, mode='skip', fields=None, commit=True):
+    """Записывает товары одной транзакцией; возвращает итоги.
+
+    mode: skip — существующие артикулы пропускаются; upsert — новые создаются,
+    у существующих обновляются поля каталога; refresh_fields — только обновление
+    существующих. fields — какие поля обновлять (по умолчанию все, см. REFRESH_FIELDS).
+    Складские остатки и место существующих товаров не меняются никогда.
+    Внутри app_context.
+
+    Итоги: created / updated / unchanged / skipped (уже есть, mode=skip) /
+    missing (нет в базе, mode=refresh_fields) — артикулы; failed — [{'article', 'reason'}];
+    changes — {артикул: разница полей}; ids — {артикул: id}.
+    """
+    from warehouse_system import db, Product, ProductImage, WarehouseStock, touch_catalog
+    from image_dedupe import unique_images
+    
+    if mode not in MODES:
+        raise ValueError(f"mode: {'|'.join(MODES)}")
+    fields = parse_fields(fields)
+    
+    result = {'created': [], 'updated': [], 'unchanged': [], 'skipped': [], 'missing': [],
+              'failed': [], 'changes': {}, 'ids': {}}
+    rows = {}
+    images = {}
+    for product_data in items:
+        try:
+            row = product_row(product_data)
+        except ValueError as e:
+            result['failed'].append({'article': product_data.get('article'), 'reason': str(e)})
+            continue
+        # Повтор артикула в одной пачке — побеждают последние данные
+        rows[row['article']] = row
+        images[row['article']] = unique_images(product_data.get('images') or [], limit=IMAGE_LIMIT)
+    if not rows:
+        return result
+    
+    now = datetime.now()
+    articles = list(rows)
+    columns = [getattr(Product, name) for name in CATALOG_FIELDS]
+    try:
+        existing = {}
+        for chunk in _chunks(articles):
+            for product_id, article, *values in db.session.query(Product.id, Product.article, *columns) \
+                    .filter(Product.article.in_(chunk)):
+                existing[article] = dict(zip(CATALOG_FIELDS, values), id=product_id)
+        ids = result['ids']
+        ids.update((article, old['id']) for article, old in existing.items())
+        
+        old_images = {}
+        if mode != 'skip' and 'images' in fields:
+            for chunk in _chunks([old['id'] for old in existing.values()]):
+                for product_id, url in db.session.query(ProductImage.product_id, ProductImage.image_url) \
+                        .filter(ProductImage.product_id.in_(chunk)).order_by(ProductImage.id):
+                    old_images.setdefault(product_id, []).append(url)
+        
+        # Раскладываем артикулы: новые, пропуск, обновление с разницей полей
+        created = []
+        updates = []
+        for article in articles:
+            old = existing.get(article)
+            if old is None:
+                if mode == 'refresh_fields':
+                    result['missing'].append(article)
+                else:
+                    created.append(article)
+            elif mode == 'skip':
+                result['skipped'].append(article)
+            else:
+                diff = changed_fields(old, rows[article], old_images.get(old['id'], []), images[article], fields)
+                if diff:
+                    result['changes'][article] = diff
+                    result['updated'].append(article)
+                    # Неизмененные и пустые поля — прежние значения из базы
+                    updates.append(dict(old, **{name: change['new'] if name != 'specifications'
+                                                else rows[article][name]
+                                                for name, change in diff.items() if name != 'images'},
+                                        article=article, updated_at=now))
+                else:
+                    result['unchanged'].append(article)
+        result['created'] = created
+        
+        if created:
+            db.session.execute(insert(Product.__table__).on_conflict_do_nothing(index_elements=['article']),
+                               [dict(rows[a], created_at=now, updated_at=now) for a in created])
+            for chunk in _chunks(created):
+                ids.update(db.session.query(Product.article, Product.id).filter(Product.article.in_(chunk)))
+        if updates:
+            stmt = insert(Product.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['article'],
+                set_={**{name: stmt.excluded[name] for name in CATALOG_FIELDS}, 'updated_at': now})
+            db.session.execute(stmt, [{k: v for k, v in row.items() if k != 'id'} for row in updates])
+        
+        # Фото: у новых — добавляем, у обновленных — заменяем, если список изменился
+        replace = [a for a in result['updated'] if 'images' in result['changes'][a]]
+        for chunk in _chunks([ids[a] for a in replace]):
+            db.session.query(ProductImage).filter(ProductImage.product_id.in_(chunk)) \
+                .delete(synchronize_session=False)
+        image_rows = [{'product_id': ids[a], 'image_url': url, 'is_main': i == 0}
+                      for a in created + replace if a in ids for i, url in enumerate(images[a])]
+        if image_rows:
+            db.session.execute(insert(ProductImage.__table__), image_rows)
+        
+        # Складская запись — только новым товарам; у существующих остатки не трогаем
+        stock_rows = [{'product_id': ids[a], 'updated_at': now} for a in created if a in ids]
+        if stock_rows:
+            db.session.execute(insert(WarehouseStock.__table__)
+                               .on_conflict_do_nothing(index_elements=['product_id']), stock_rows)
+        
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    # Запись мимо ORM — сообщаем кэшам и индексам сами
+    touched = created + result['updated']
+    if commit and touched:
+        touch_catalog(product_ids=[ids[a] for a in touched if a in ids], articles=touched)
+    return result
+
+def _status(result, article):
+    for status in ('created', 'updated', 'unchanged', 'skipped', 'missing'):
+        if article in result[status]:
+            return status
+    return None
+
+def ingest_product(product_data, mode='skip', fields=None):
+    """Один товар: (id или None, статус, разница полей).
+
+    Статус: created | updated | unchanged | skipped (уже есть) | missing (нет в базе).
+    """
+    result = ingest_products([product_data], mode=mode, fields=fields)
+    if result['failed']:
+        raise ValueError(result['failed'][0]['reason'])
+    article = str(product_data.get('article')).strip()
+    return result['ids'].get(article), _status(result, article), result['changes'].get(article, {})
+
+def ingest_parsed(parsed, mode='skip', fields=None):
+    """Пачка разобранных товаров [(запрос, данные)] для массового импорта.
+
+    Возвращает {'success': [...], 'skipped': [...], 'failed': [...]} в формате
+    отчетов /api/import/batch; ошибка записи пачки попадает в failed каждого товара.
+    """
+    report = {'success': [], 'skipped': [], 'failed': []}
+    if not parsed:
+        return report
+    try:
+        result = ingest_products([product_data for _, product_data in parsed], mode=mode, fields=fields)
+    except Exception as e:
+        report['failed'].extend({'query': query, 'reason': str(e)} for query, _ in parsed)
+        return report
+    
+    reasons = {item['article']: item['reason'] for item in result['failed']}
+    for query, product_data in parsed:
+        article = product_data.get('article')
+        status = _status(result, article)
+        if article in reasons:
+            report['failed'].append({'query': query, 'reason': reasons[article]})
+        elif status in SKIP_REASONS:
+            report['skipped'].append({'query': query, 'reason': SKIP_REASONS[status], 'article': article,
+                                      'status': status})
+        else:
+            report['success'].append({'query': query, 'article': article, 'title': product_data.get('title'),
+                                      'status': status, 'changes': result['changes'].get(article, {})})
+    return report
+
+def format_changes(diff):
+    """Разница полей одной строкой для консоли"""
+    parts = []
+    for name, change in diff.items():
+        if name in ('images', 'specifications', 'description'):
+            parts.append(name)
+        else:
+            parts.append(f"{name}: {change['old'] or '—'} → {change['new']}")
+    return "; ".join(parts)
+
+def benchmark(count=10000, chunk=1000):
+    """Скорость записи count синтетических товаров (транзакция откатывается — база не меняется)"""
+    from warehouse_system import app, db
+    
+    items = [{
+        'article': f"BENCH-{i:07d}",
+        'title': f"Тестовый товар {i}",
+        'manufacturer': 'Otis',
+        'category': 'Кнопки',
+        'price': f"{i % 5000} ₽",
+        'description': 'Описание ' * 20,
+        'url': f"https://snab-lift.ru/catalog/bench/{i}.html",
+        'dimensions': {'Ширина': '40 мм', 'Высота': '60 мм'},
+        'specifications': {'Цвет': 'красный', 'Напряжение': '24В'},
+        'images': [f"https://snab-lift.ru/upload/iblock/{i % 97}/{i}_{j}.jpg" for j in range(3)],
+    } for i in range(count)]
+    
+    with app.app_context():
+        try:
+            repriced = [dict(item, price=f"{i % 5000 + 1} ₽") for i, item in enumerate(items)]
+            for label, mode, batch in (("новые товары", 'skip', items), ("повтор, пропуск", 'skip', items),
+                                       ("upsert без изменений", 'upsert', items),
+                                       ("upsert новой цены", 'upsert', repriced)):
+                start = time.perf_counter()
+                for i in range(0, count, chunk):
+                    ingest_products(batch[i:i + chunk], mode=mode, commit=False)
+                elapsed = time.perf_counter() - start
+                print(f"⏱️ {label:20} {count} шт. за {elapsed:.2f} с — {count / elapsed:,.0f} товаров/с")
+        finally:
+            db.session.rollback()
+
+def main():
+    parser = argparse.ArgumentParser(description="Запись товаров из JSON в базу / замер скорости")
+    parser.add_argument("file", nargs="?", help="JSON: список товаров в формате парсера")
+    parser.add_argument("--mode", choices=MODES, default="skip", help="что делать с существующими артикулами")
+    parser.add_argument("--fields", default=None, help="поля для обновления через запятую (по умолчанию все)")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="замер на N синтетических товарах")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return 0
+    if not args.file:
+        parser.print_help()
+        return 1
+    
+    from warehouse_system import app
+    
+    with open(args.file, encoding='utf-8') as f:
+        items = json.load(f)
+    with app.app_context():
+        start = time.perf_counter()
+        result = ingest_products(items, mode=args.mode, fields=args.fields)
+        elapsed = time.perf_counter() - start
+    for article, diff in result['changes'].items():
+        print(f"   🔄 {article}: {format_changes(diff)}")
+    print(f"✅ Новых: {len(result['created'])}, обновлено: {len(result['updated'])}, "
+          f"без изменений: {len(result['unchanged'])}, пропущено: {len(result['skipped'])}, "
+          f"нет в базе: {len(result['missing'])}, ошибок: {len(result['failed'])} — {elapsed:.2f} с")
+    for item in result['failed']:
+        print(f"   ❌ {item['article']}: {item['reason']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
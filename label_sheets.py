@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Листы этикеток и карточек для печати
+Товары по фильтру (зона, стеллаж, артикулы) в одном документе, N штук на страницу;
+документ отдается постранично, штрихкоды Code 128 рисуются локально, QR — через segno
+"""
+
+import argparse
+import sys
+
+from card_render import card_context, get_environment
+
+LABEL_SHEET_TEMPLATE = 'label_sheet.html'
+
+# Раскладки: колонок на странице и штук на странице по умолчанию
+LAYOUTS = {
+    'label': {'columns': 3, 'per_page': 24},
+    'card': {'columns': 2, 'per_page': 4},
+}
+MAX_PER_PAGE = 60
+MAX_ITEMS = 5000
+CHUNK_SIZE = 200
+CODES = ('barcode', 'qr', 'none')
+
+# QR — необязательная зависимость (pip install segno)
+try:
+    import segno
+except ImportError:
+    segno = None
+
+# ========== CODE 128 ==========
+# Ширины штрихов и пробелов символов 0..105 (набор B) и стоп-символа
+
+CODE128_PATTERNS = (
+    "212222 222122 222221 121223 121322 131222 122213 122312 132212 221213 "
+    "221312 231212 112232 122132 122231 113222 123122 123221 223211 221132 "
+    "221231 213212 223112 312131 311222 321122 321221 312212 322112 322211 "
+    "212123 212321 232121 111323 131123 131321 112313 132113 132311 211313 "
+    "231113 231311 112133 112331 132131 113123 113321 133121 313121 211331 "
+    "231131 213113 213311 213131 311123 311321 331121 312113 312311 332111 "
+    "314111 221411 431111 111224 111422 121124 121421 141122 141221 112214 "
+    "112412 122114 122411 142112 142211 241211 221114 413111 241112 134111 "
+    "111242 121142 121241 114212 124112 124211 411212 421112 421211 212141 "
+    "214121 412121 111143 111341 131141 114113 114311 411113 411311 113141 "
+    "114131 311141 411131 211412 211214 211232"
+).split()
+CODE128_START_B = 104
+CODE128_STOP = "2331112"
+
+def code128_svg(text, height=40, module=1.4):
+    """Штрихкод Code 128 (набор B) в SVG; None, если в тексте есть символы вне ASCII"""
+    if not text or any(not 32 <= ord(c) <= 126 for c in text):
+        return None
+    values = [CODE128_START_B] + [ord(c) - 32 for c in text]
+    checksum = (values[0] + sum(i * v for i, v in enumerate(values[1:], 1))) % 103
+    widths = ''.join(CODE128_PATTERNS[v] for v in values + [checksum]) + CODE128_STOP
+    
+    # Тихая зона — 10 модулей с каждой стороны
+    x = 10
+    bars = []
+    for i, width in enumerate(widths):
+        width = int(width)
+        if i % 2 == 0:
+            bars.append(f'<rect x="{x}" width="{width}" height="{height}"/>')
+        x += width
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {x + 10} {height}" '
+            f'width="{(x + 10) * module:.0f}" height="{height}" shape-rendering="crispEdges">'
+            f'{"".join(bars)}</svg>')
+
+def qr_svg(data, scale=2):
+    """QR-код в SVG (нужен segno); None, если библиотеки нет"""
+    if segno is None:
+        return None
+    return segno.make(data, error='m').svg_inline(scale=scale, border=1)
+
+# ========== ВЫБОРКА ==========
+
+def parse_articles(value):
+    """Артикулы из строки через запятую/пробел или из списка"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    return list(dict.fromkeys(str(v).strip() for v in value if str(v).strip()))
+
+def select_products(zone=None, rack=None, articles=None):
+    """Запрос товаров для печати в порядке обхода склада: зона, стеллаж, полка, ячейка"""
+    from warehouse_system import db, Product, WarehouseStock
+    
+    query = Product.query.outerjoin(WarehouseStock, WarehouseStock.product_id == Product.id) \
+        .options(db.contains_eager(Product.stock), db.selectinload(Product.images))
+    if zone:
+        query = query.filter(WarehouseStock.zone == zone)
+    if rack:
+        query = query.filter(WarehouseStock.rack == rack)
+    if articles:
+        query = query.filter(Product.article.in_(articles))
+    return query.order_by(WarehouseStock.zone, WarehouseStock.rack, WarehouseStock.shelf,
+                          WarehouseStock.cell, Product.article)
+
+def _item(product, codes, base_url, local_images=False):
+    """Данные одной этикетки: данные карточки, код места и штрихкод/QR"""
+    item = card_context(product, local_images=local_images)
+    item['location_code'] = item['location'] or '—'
+    if codes == 'barcode':
+        item['code_svg'] = code128_svg(item['article'])
+    elif codes == 'qr':
+        item['code_svg'] = qr_svg(f"{base_url.rstrip('/')}/card/{item['article']}" if base_url
+                                  else item['article'])
+    else:
+        item['code_svg'] = None
+    return item
+
+# ========== ДОКУМЕНТ ==========
+
+def generate_sheet(products, kind='label', per_page=None, codes='barcode', base_url=None, title=None,
+                   local_images=False):
+    """Генератор HTML документа: шапка, затем страница за страницей.
+
+    products — итерируемое товаров (запрос из select_products или список);
+    следующая страница рендерится, только когда предыдущая отдана;
+    local_images=True — фото из локального зеркала сервера (для /api/labels).
+    """
+    layout = LAYOUTS[kind]
+    per_page = max(1, min(per_page or layout['per_page'], MAX_PER_PAGE))
+    sheet = get_environment().get_template(LABEL_SHEET_TEMPLATE).module
+    
+    yield sheet.head(title=title or 'Этикетки', kind=kind, columns=layout['columns'])
+    page = []
+    number = 0
+    for product in products:
+        page.append(_item(product, codes, base_url, local_images))
+        if len(page) == per_page:
+            number += 1
+            yield sheet.page(items=page, kind=kind, number=number)
+            page = []
+    if page or not number:
+        number += 1
+        yield sheet.page(items=page, kind=kind, number=number)
+    yield sheet.tail(pages=number)
+
+def iter_selected(zone=None, rack=None, articles=None, limit=MAX_ITEMS):
+    """Товары по фильтру порциями — крупный стеллаж не загружается в память целиком"""
+    from warehouse_system import db
+    query = select_products(zone, rack, articles)
+    offset = 0
+    while offset < limit:
+        chunk = query.offset(offset).limit(min(CHUNK_SIZE, limit - offset)).all()
+        yield from chunk
+        if len(chunk) < CHUNK_SIZE:
+            return
+        offset += len(chunk)
+        db.session.expunge_all()
+
+def sheet_title(zone=None, rack=None, articles=None):
+    """Заголовок документа по фильтру"""
+    parts = []
+    if zone:
+        parts.append(f"зона {zone}")
+    if rack:
+        parts.append(f"стеллаж {rack}")
+    if articles:
+        parts.append(f"артикулов: {len(articles)}")
+    return "Этикетки: " + ", ".join(parts) if parts else "Этикетки"
+
+def main():
+    parser = argparse.ArgumentParser(description="Лист этикеток/карточек для печати")
+    parser.add_argument("--zone", help="зона склада")
+    parser.add_argument("--rack", help="стеллаж")
+    parser.add_argument("--articles", help="артикулы через запятую")
+    parser.add_argument("--kind", choices=sorted(LAYOUTS), default="label", help="этикетки или карточки")
+    parser.add_argument("--per-page", type=int, default=None, help="штук на страницу")
+    parser.add_argument("--codes", choices=CODES, default="barcode", help="штрихкод, QR или без кодов")
+    parser.add_argument("--base-url", default=None, help="адрес сервера для QR (ссылка на /card/<артикул>)")
+    parser.add_argument("--out", default="labels.html", help="файл документа")
+    args = parser.parse_args()
+    
+    articles = parse_articles(args.articles)
+    if not (args.zone or args.rack or articles):
+        print("❌ Укажите --zone, --rack или --articles")
+        return 1
+    if args.codes == 'qr' and segno is None:
+        print("⚠️ segno не установлен (pip install segno) — QR-коды не будут нарисованы")
+    
+    from warehouse_system import app
+    
+    with app.app_context(), open(args.out, 'w', encoding='utf-8') as f:
+        for part in generate_sheet(iter_selected(args.zone, args.rack, articles), kind=args.kind,
+                                   per_page=args.per_page, codes=args.codes, base_url=args.base_url,
+                                   title=sheet_title(args.zone, args.rack, articles)):
+            f.write(part)
+    print(f"✅ Лист для печати: {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Общий клиент OpenRouter для всех модулей ИИ-поиска
+Пул соединений, ограничение параллельности, повторы с backoff,
+circuit breaker и учет задержки, токенов и стоимости каждого вызова
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# OpenRouter API ключ — только из окружения; не задан или пуст — работа без ИИ
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "").strip()
+# Адрес API можно подменить локальной заглушкой (llm_stub_server.py)
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Дешевые и эффективные модели
+MODELS = {
+    # Очень дешевые
+    "llama-3.1-8b": "meta-llama/llama-3.1-8b-instruct",  # ~$0.18/M токенов
+    "gemma-2-9b": "google/gemma-2-9b-it",  # ~$0.20/M токенов
+    # Средний ценник - лучшее качество
+    "llama-3.1-70b": "meta-llama/llama-3.1-70b-instruct",  # ~$0.88/M токенов
+}
+
+# Используем дешевую но хорошую модель
+DEFAULT_MODEL = MODELS["llama-3.1-8b"]
+
+# Цены (вход, выход) за 1M токенов
+PRICES = {
+    MODELS["llama-3.1-8b"]: (0.18, 0.18),
+    MODELS["gemma-2-9b"]: (0.20, 0.20),
+    MODELS["llama-3.1-70b"]: (0.88, 0.88),
+}
+
+# Ограничения клиента
+MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 4))
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5      # секунд, удваивается с каждой попыткой
+BACKOFF_MAX = 8.0
+FAILURE_THRESHOLD = 3   # ошибок подряд до размыкания
+RESET_TIMEOUT = 30.0    # секунд до пробного запроса (half-open)
+
+# Коды, после которых имеет смысл повторить запрос
+RETRY_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """Ошибка запроса к ИИ"""
+
+class LLMUnavailable(LLMError):
+    """ИИ недоступен: нет ключа или разомкнут circuit breaker"""
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Стоимость запроса в долларах"""
+    input_price, output_price = PRICES.get(model, (0.18, 0.18))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1000000
+
+class CircuitBreaker:
+    """Размыкается после серии ошибок; через паузу пропускает один пробный запрос"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Можно ли сейчас отправить запрос"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            # Half-open: пропускаем только один пробный запрос
+            if self._probe_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"⚠️ ИИ недоступен, переключаюсь на локальный поиск на {self.reset_timeout:.0f} с",
+                          file=sys.stderr)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+class LLMResult:
+    """Результат вызова: текст и метрики"""
+
+    def __init__(self, text, model, prompt_tokens, completion_tokens, latency, first_token_latency=None):
+        self.text = text
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.tokens = prompt_tokens + completion_tokens
+        self.cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        self.latency = latency
+        self.first_token_latency = first_token_latency
+
+class LLMStream:
+    """Потоковый ответ: итерация отдает куски текста, после нее доступен result.
+
+    close() обрывает соединение (например, когда клиент отключился).
+    """
+
+    def __init__(self, client, response, model, prompt, started, release):
+        self._client = client
+        self._response = response
+        self._model = model
+        self._prompt = prompt
+        self._started = started
+        self._release = release
+        self._closed = False
+        self._failed = False
+        self.result = None
+        self.first_token_latency = None
+
+    def __iter__(self):
+        parts = []
+        usage = {}
+        try:
+            for line in self._response.iter_lines():
+                # Пропускаем пустые строки и комментарии (": OPENROUTER PROCESSING")
+                if not line or not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip().decode('utf-8')
+                if data == '[DONE]':
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get('usage') or usage
+                for choice in chunk.get('choices') or []:
+                    text = (choice.get('delta') or {}).get('content')
+                    if text:
+                        if self.first_token_latency is None:
+                            self.first_token_latency = time.perf_counter() - self._started
+                        parts.append(text)
+                        yield text
+
+            text = ''.join(parts)
+            # Провайдер не прислал usage — оцениваем по длине (≈4 символа на токен)
+            prompt_tokens = usage.get('prompt_tokens') or len(self._prompt) // 4
+            completion_tokens = usage.get('completion_tokens') or len(text) // 4
+            self.result = LLMResult(text, self._model, prompt_tokens, completion_tokens,
+                                    time.perf_counter() - self._started, self.first_token_latency)
+            self._client._finish_call(self._model, self.result)
+        except (requests.RequestException, ValueError) as e:
+            self._failed = True
+            self._client._finish_call(self._model, None, error=e, breaker=True)
+            raise LLMError(f"Поток ИИ прерван: {e}") from e
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._response.close()
+        self._release()
+        if self.result is None and not self._failed:
+            self._client._record_cancel()
+
+class LLMClient:
+    """Клиент OpenRouter с пулом соединений, повторами и circuit breaker"""
+
+    def __init__(self, api_key=OPENROUTER_API_KEY, base_url=OPENROUTER_BASE_URL,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        # Keep-alive: одно TLS-соединение переиспользуется между запросами
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://localhost",  # Required by OpenRouter
+            "X-Title": "Warehouse AI"
+        })
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'calls': 0, 'errors': 0, 'retries': 0, 'cancelled': 0, 'rejected': 0,
+            'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0, 'latency_total': 0.0,
+        }
+        self._recent = deque(maxlen=100)
+
+    @property
+    def configured(self):
+        """Есть ли ключ API"""
+        return bool(self.api_key)
+
+    @property
+    def available(self):
+        """Можно ли обращаться к ИИ прямо сейчас"""
+        return self.configured and self.breaker.state != CircuitBreaker.OPEN
+
+    # ----- метрики -----
+
+    def _finish_call(self, model, result, error=None, breaker=False):
+        with self._metrics_lock:
+            if result is not None:
+                self._metrics['calls'] += 1
+                self._metrics['prompt_tokens'] += result.prompt_tokens
+                self._metrics['completion_tokens'] += result.completion_tokens
+                self._metrics['cost'] += result.cost
+                self._metrics['latency_total'] += result.latency
+                self._recent.append({
+                    'model': model,
+                    'latency_ms': round(result.latency * 1000),
+                    'first_token_ms': round(result.first_token_latency * 1000)
+                        if result.first_token_latency is not None else None,
+                    'tokens': result.tokens,
+                    'cost': round(result.cost, 6),
+                    'at': time.time(),
+                })
+            else:
+                self._metrics['errors'] += 1
+                self._recent.append({'model': model, 'error': str(error), 'at': time.time()})
+        if breaker:
+            self.breaker.record_failure()
+
+    def _record_cancel(self):
+        with self._metrics_lock:
+            self._metrics['cancelled'] += 1
+
+    def metrics(self):
+        """Сводные метрики вызовов и последние вызовы"""
+        with self._metrics_lock:
+            data = dict(self._metrics)
+            recent = list(self._recent)
+        data['cost'] = round(data['cost'], 6)
+        data['avg_latency_ms'] = round(data.pop('latency_total') / data['calls'] * 1000) if data['calls'] else 0
+        data['breaker'] = self.breaker.state
+        data['recent'] = recent[-20:]
+        return data
+
+    # ----- запросы -----
+
+    def _post(self, payload, stream, timeout):
+        """POST с повторами: сетевые ошибки, 429 и 5xx повторяются с экспоненциальной паузой"""
+        if not self.configured:
+            raise LLMUnavailable("Ключ OPENROUTER_API_KEY не задан")
+        if not self.breaker.allow():
+            with self._metrics_lock:
+                self._metrics['rejected'] += 1
+            raise LLMUnavailable("ИИ временно недоступен (circuit breaker)")
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._metrics_lock:
+                    self._metrics['retries'] += 1
+            try:
+                response = self.session.post(f"{self.base_url}/chat/completions",
+                                             json=payload, stream=stream, timeout=timeout)
+            except requests.RequestException as e:
+                last_error = LLMError(f"Сеть: {e}")
+                delay = None
+            else:
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return response
+                last_error = LLMError(f"API ошибка: {response.status_code}")
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+                if response.status_code not in RETRY_STATUSES:
+                    # 400/401/403 — повтор не поможет, сервис при этом жив
+                    self.breaker.record_success()
+                    self._finish_call(payload['model'], None, error=last_error)
+                    raise last_error
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+
+            if attempt < self.max_retries:
+                if delay is None:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random() / 2)
+                time.sleep(min(delay, BACKOFF_MAX))
+
+        self._finish_call(payload['model'], None, error=last_error, breaker=True)
+        raise last_error
+
+    def _payload(self, prompt, model, max_tokens, temperature):
+        return {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+    def chat(self, prompt, model=DEFAULT_MODEL, max_tokens=400, temperature=0.3, timeout=30):
+        """Запрос к ИИ, ответ целиком (LLMResult). Бросает LLMError/LLMUnavailable."""
+        payload = self._payload(prompt, model, max_tokens, temperature)
+        with self._slots:
+            started = time.perf_counter()
+            response = self._post(payload, stream=False, timeout=timeout)
+            try:
+                data = response.json()
+                text = data['choices'][0]['message']['content']
+            except (ValueError, KeyError, IndexError) as e:
+                error = LLMError(f"Некорректный ответ API: {e}")
+                self._finish_call(model, None, error=error, breaker=True)
+                raise error from e
+
+        usage = data.get('usage', {})
+        result = LLMResult(text, model, usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0),
+                           time.perf_counter() - started)
+        self._finish_call(model, result)
+        return result
+
+    def stream_chat(self, prompt, model=DEFAULT_MODEL, max_tokens=400, temperature=0.3, timeout=(5, 60)):
+        """Потоковый запрос к ИИ (LLMStream). Слот параллельности занят до закрытия потока."""
+        payload = self._payload(prompt, model, max_tokens, temperature)
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+
+        self._slots.acquire()
+        started = time.perf_counter()
+        try:
+            response = self._post(payload, stream=True, timeout=timeout)
+        except Exception:
+            self._slots.release()
+            raise
+        return LLMStream(self, response, model, prompt, started, self._slots.release)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Общий клиент процесса"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка OpenRouter (OpenAI-совместимый chat/completions)
+Для разработки и проверки ИИ-поиска без сети и без оплаты
+
+Запуск:
+    python llm_stub_server.py --port 8765 --delay 0.05
+    OPENROUTER_BASE_URL=http://localhost:8765/v1 python warehouse_system.py
+"""
+
+import argparse
+import json
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_answer(prompt):
+    """Детерминированный ответ: первые товары из таблицы в промпте"""
+    lines = [line for line in prompt.splitlines()[1:] if '|' in line and not line.startswith('артикул|')]
+    if not lines:
+        return "Подходящих товаров не найдено."
+    answer = ["Подходящие товары:"]
+    for line in lines[:3]:
+        answer.append(f"- {line}")
+    return "\n".join(answer)
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(m.get('content', '') for m in body.get('messages', []))
+        answer = make_answer(prompt)
+        usage = {
+            'prompt_tokens': len(prompt) // 4,
+            'completion_tokens': len(answer) // 4,
+        }
+
+        if not body.get('stream'):
+            payload = json.dumps({
+                'choices': [{'message': {'role': 'assistant', 'content': answer}}],
+                'usage': usage,
+            }, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            self.wfile.write(b": STUB PROCESSING\n\n")
+            for word in re.findall(r'\S+\s*', answer):
+                time.sleep(self.delay)
+                chunk = {'choices': [{'delta': {'content': word}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode('utf-8'))
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            print("🛑 Клиент закрыл поток")
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenRouter для локальной разработки")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.05, help="пауза между токенами, с")
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubHandler)
+    print(f"🤖 Заглушка LLM: http://127.0.0.1:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,161 @@
 """
 MCP (Model Context Protocol) сервер для складской системы
 Позволяет AI ассистентам (Claude, GPT и др.) управлять складом
+
+Flask/SQLAlchemy и Selenium загружаются при первом вызове инструмента:
+initialize и tools/list отвечают сразу после запуска процесса
 """
 
+import argparse
 import json
+import os
+import queue
 import sys
 import asyncio
-from typing import Any, Dict, List, Optional
-from warehouse_system import app, db, Product, WarehouseStock
-from warehouse_card import create_driver, parse_product_page, find_product_by_article, is_url
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from typing import Any, Callable, Dict, List, Optional
 from datetime import datetime
 
+# Модели склада — заполняются _load_warehouse() при первом вызове инструмента
+app = db = Product = WarehouseStock = None
+_load_lock = threading.Lock()
+
+PROTOCOL_VERSION = "2024-11-05"
+# Версии, которые сервер может подтвердить клиенту (2025-03-26 — Streamable HTTP)
+SUPPORTED_PROTOCOL_VERSIONS = ("2024-11-05", "2025-03-26", "2025-06-18")
+# С этой версии инструменты объявляют outputSchema и отвечают structuredContent;
+# более старым клиентам те же данные уходят JSON-текстом в content
+STRUCTURED_OUTPUT_VERSION = "2025-06-18"
+
+# Инструменты выполняются в пуле потоков; медленные (Selenium) — в отдельном,
+# чтобы импорт с сайта не занимал потоки быстрых запросов к базе
+MAX_WORKERS = 8
+SLOW_WORKERS = 2
+SLOW_TOOLS = {"import_product"}
+
+# Максимум строк в пакетных инструментах
+BATCH_LIMIT = 500
+
+# Страница get_low_stock: агенту не нужен весь список сразу
+LOW_STOCK_PAGE = 20
+
+# Поля складской записи, которые можно менять через update_stock*
+STOCK_TEXT_FIELDS = ("zone", "rack", "shelf", "cell", "notes")
+STOCK_INT_FIELDS = ("quantity_actual", "quantity_reserved", "quantity_min", "quantity_max")
+
+# Таймауты инструментов, секунд
+TOOL_TIMEOUT = 30.0
+TOOL_TIMEOUTS = {
+    "import_product": 180.0,
+}
+
+# Схемы structuredContent (outputSchema) — компактные, строка товара общая
+_NULLABLE_STRING = {"type": ["string", "null"]}
+_PRODUCT_ROW = {
+    "type": "object",
+    "properties": {
+        "article": {"type": "string"},
+        "title": {"type": "string"},
+        "manufacturer": _NULLABLE_STRING,
+        "price": _NULLABLE_STRING,
+        "quantity": {"type": "integer"},
+        "reserved": {"type": "integer"},
+        "available": {"type": "integer"},
+        "min": {"type": "integer"},
+        "location": _NULLABLE_STRING
+    },
+    "required": ["article", "quantity"]
+}
+_PRODUCT_LIST = {"type": "array", "items": _PRODUCT_ROW}
+
+def _object(required: List[str], **properties: Any) -> Dict[str, Any]:
+    return {"type": "object", "properties": properties, "required": required}
+
+OUTPUT_SCHEMAS = {
+    "list_products": _object(["total", "items"], total={"type": "integer"}, offset={"type": "integer"},
+                             items=_PRODUCT_LIST),
+    "get_product": _object(["product"], product={
+        "allOf": [_PRODUCT_ROW, _object([], category=_NULLABLE_STRING, url=_NULLABLE_STRING,
+                                        description=_NULLABLE_STRING)]
+    }),
+    "search_products": _object(["items"], query={"type": "string"}, items=_PRODUCT_LIST),
+    "get_stock_stats": _object(["products", "units", "low_stock", "out_of_stock"],
+                               products={"type": "integer"}, units={"type": "integer"},
+                               reserved={"type": "integer"}, low_stock={"type": "integer"},
+                               out_of_stock={"type": "integer"}),
+    "import_product": _object(["article", "status"], article={"type": "string"}, title={"type": "string"},
+                              images={"type": "integer"},
+                              status={"enum": ["created", "updated", "unchanged"]},
+                              changes={"type": "object"}),
+    "update_stock": {"allOf": [_PRODUCT_ROW, _object(["changed"], changed={"type": "array",
+                                                                           "items": {"type": "string"}})]},
+    "get_low_stock": _object(["total", "items", "next_offset"], total={"type": "integer"},
+                             offset={"type": "integer"}, limit={"type": "integer"},
+                             next_offset={"type": ["integer", "null"]}, items=_PRODUCT_LIST),
+    "get_products_batch": _object(["found", "missing"], found=_PRODUCT_LIST,
+                                  missing={"type": "array", "items": {"type": "string"}},
+                                  suggestions={"type": "object"}),
+    "update_stock_batch": _object(["committed", "updated", "errors"], committed={"type": "boolean"},
+                                  updated=_PRODUCT_LIST, errors={"type": "array"}),
+    "create_product_card": _object(["file"], article={"type": "string"}, file={"type": "string"}),
+}
+
+# Поток для JSON-RPC кадров; reserve_stdout() отделяет его от обычного stdout
+_protocol_out = sys.stdout
+
+def log(message: str):
+    """Служебный вывод — в stderr, stdout занят протоколом"""
+    print(message, file=sys.stderr, flush=True)
+
+def reserve_stdout():
+    """Оставляет stdout только для кадров протокола.
+
+    Настоящий stdout (fd 1) дублируется для протокола, а fd 1 и sys.stdout
+    перенаправляются в stderr: print() при импорте warehouse_system, вывод
+    генератора карточек и chromedriver не попадут в поток JSON-RPC.
+    """
+    global _protocol_out
+    _protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8", buffering=1)
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+def _load_warehouse():
+    """Ленивая загрузка Flask-приложения и моделей (один раз на процесс)"""
+    global app, db, Product, WarehouseStock
+    if app is not None:
+        return
+    with _load_lock:
+        if app is None:
+            started = time.perf_counter()
+            import warehouse_system
+            db = warehouse_system.db
+            Product = warehouse_system.Product
+            WarehouseStock = warehouse_system.WarehouseStock
+            app = warehouse_system.app
+            log(f"📦 warehouse_system загружен за {(time.perf_counter() - started) * 1000:.0f} мс")
+
 class MCPServer:
     """MCP сервер для складского управления"""
     
     def __init__(self):
         self.name = "warehouse-management"
         self.version = "1.0.0"
-        
-    def get_tools(self) -> List[Dict[str, Any]]:
-        """Возвращает список доступных инструментов с JSON Schema"""
-        return [
+        self._executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="mcp-tool")
+        self._slow_executor = ThreadPoolExecutor(SLOW_WORKERS, thread_name_prefix="mcp-slow")
+        # (сессия, id запроса) -> задача; у stdio одна сессия None
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        # сессия -> версия протокола, согласованная в initialize
+        self._versions: Dict[Optional[str], str] = {}
+    
+    def get_tools(self, structured: bool = True) -> List[Dict[str, Any]]:
+        """Возвращает список доступных инструментов с JSON Schema входа (и результата, если structured)"""
+        tools = [
             {
                 "name": "list_products",
                 "description": "Получить список всех товаров на складе",
@@ -79,13 +214,26 @@ class MCPServer:
             },
             {
                 "name": "import_product",
-                "description": "Импортировать товар с сайта snab-lift.ru по артикулу или URL",
+                "description": "Импортировать товар с сайта snab-lift.ru по артикулу или URL "
+                               "или обновить данные каталога уже импортированного (остатки не меняются)",
                 "inputSchema": {
                     "type": "object",
                     "properties": {
                         "query": {
                             "type": "string",
                             "description": "Артикул товара или URL (например: 2498 или https://snab-lift.ru/catalog/...)"
+                        },
+                        "mode": {
+                            "type": "string",
+                            "enum": ["skip", "upsert", "refresh_fields"],
+                            "description": "skip — не трогать существующий товар (по умолчанию), upsert — создать "
+                                           "или обновить, refresh_fields — только обновить существующий"
+                        },
+                        "fields": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Какие поля обновлять: title, manufacturer, category, price, description, "
+                                           "url, weight, dimensions, specifications, images (по умолчанию все)"
                         }
                     },
                     "required": ["query"]
@@ -135,10 +283,80 @@ class MCPServer:
             },
             {
                 "name": "get_low_stock",
-                "description": "Получить список товаров с низким остатком (меньше минимума)",
+                "description": "Товары, у которых доступно (факт минус резерв) меньше минимума, "
+                               "постранично, сначала с наибольшей нехваткой",
                 "inputSchema": {
                     "type": "object",
-                    "properties": {}
+                    "properties": {
+                        "limit": {
+                            "type": "integer",
+                            "description": f"Товаров на странице (по умолчанию {LOW_STOCK_PAGE}, максимум 200)",
+                            "default": LOW_STOCK_PAGE
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "description": "Смещение: next_offset из предыдущего ответа",
+                            "default": 0
+                        }
+                    }
+                }
+            },
+            {
+                "name": "get_products_batch",
+                "description": "Получить сразу много товаров по списку артикулов (спецификация, заказ). "
+                               "Один запрос к базе; ответ — структурированный JSON",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "articles": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "maxItems": BATCH_LIMIT,
+                            "description": "Список артикулов"
+                        }
+                    },
+                    "required": ["articles"]
+                }
+            },
+            {
+                "name": "update_stock_batch",
+                "description": "Обновить складские данные многих товаров одной транзакцией. "
+                               "Если хоть один артикул не найден или данные некорректны, ничего не меняется "
+                               "(кроме atomic=false)",
+                "inputSchema": {
+                    "type": "object",
+                    "properties": {
+                        "updates": {
+                            "type": "array",
+                            "maxItems": BATCH_LIMIT,
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "article": {"type": "string"},
+                                    "quantity_actual": {"type": "integer"},
+                                    "quantity_delta": {
+                                        "type": "integer",
+                                        "description": "Изменение количества (+приход / -расход)"
+                                    },
+                                    "quantity_reserved": {"type": "integer"},
+                                    "quantity_min": {"type": "integer"},
+                                    "quantity_max": {"type": "integer"},
+                                    "zone": {"type": "string"},
+                                    "rack": {"type": "string"},
+                                    "shelf": {"type": "string"},
+                                    "cell": {"type": "string"},
+                                    "notes": {"type": "string"}
+                                },
+                                "required": ["article"]
+                            }
+                        },
+                        "atomic": {
+                            "type": "boolean",
+                            "description": "Все или ничего (по умолчанию true)",
+                            "default": True
+                        }
+                    },
+                    "required": ["updates"]
                 }
             },
             {
@@ -156,9 +374,14 @@ class MCPServer:
                 }
             }
         ]
+        if structured:
+            for tool in tools:
+                tool["outputSchema"] = OUTPUT_SCHEMAS[tool["name"]]
+        return tools
     
     def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """Выполняет вызванный инструмент"""
+        _load_warehouse()
         
         with app.app_context():
             if tool_name == "list_products":
@@ -174,40 +397,173 @@ class MCPServer:
             elif tool_name == "update_stock":
                 return self._update_stock(arguments)
             elif tool_name == "get_low_stock":
-                return self._get_low_stock()
+                return self._get_low_stock(arguments)
             elif tool_name == "create_product_card":
                 return self._create_product_card(arguments)
+            elif tool_name == "get_products_batch":
+                return self._get_products_batch(arguments)
+            elif tool_name == "update_stock_batch":
+                return self._update_stock_batch(arguments)
             else:
                 return {
                     "isError": True,
                     "content": [{"type": "text", "text": f"Неизвестный инструмент: {tool_name}"}]
                 }
     
+    # ========== ФОРМАТ РЕЗУЛЬТАТОВ ==========
+    
+    @staticmethod
+    def _structured(text: str, data: Dict[str, Any], is_error: bool = False) -> Dict:
+        """Результат инструмента: короткий текст и те же данные в structuredContent"""
+        result = {
+            "content": [{"type": "text", "text": text}],
+            "structuredContent": data
+        }
+        if is_error:
+            result["isError"] = True
+        return result
+    
+    @staticmethod
+    def _plain(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Результат для клиентов до 2025-06-18: structuredContent им неизвестен,
+        поэтому те же данные идут JSON-текстом вторым блоком content"""
+        data = result.pop("structuredContent", None)
+        if data is not None:
+            result["content"].append({"type": "text", "text": json.dumps(data, ensure_ascii=False)})
+        return result
+    
+    @staticmethod
+    def _product_row(product) -> Dict[str, Any]:
+        """Компактное представление товара со складскими данными"""
+        stock = product.stock
+        location = f"{stock.zone or '-'}-{stock.rack or '-'}-{stock.shelf or '-'}-{stock.cell or '-'}" \
+            if stock and any([stock.zone, stock.rack, stock.shelf, stock.cell]) else None
+        quantity = stock.quantity_actual or 0 if stock else 0
+        reserved = stock.quantity_reserved or 0 if stock else 0
+        return {
+            "article": product.article,
+            "title": product.title,
+            "manufacturer": product.manufacturer,
+            "price": product.price,
+            "quantity": quantity,
+            "reserved": reserved,
+            "available": quantity - reserved,
+            "min": stock.quantity_min or 0 if stock else 0,
+            "location": location
+        }
+    
+    @staticmethod
+    def _articles(values: Any) -> List[str]:
+        """Артикулы без пустых и повторов, в исходном порядке"""
+        if not isinstance(values, list):
+            raise ValueError("ожидается список")
+        articles = list(dict.fromkeys(str(v).strip() for v in values if str(v or "").strip()))
+        if len(articles) > BATCH_LIMIT:
+            raise ValueError(f"не больше {BATCH_LIMIT} артикулов за раз")
+        return articles
+    
+    def _apply_stock_update(self, product, update: Dict[str, Any]) -> List[str]:
+        """Применяет поля update к складской записи товара; возвращает измененные поля.
+        
+        Сначала проверяет все значения: при ValueError запись не меняется.
+        """
+        stock = product.stock
+        values = {}
+        for field in STOCK_TEXT_FIELDS:
+            if field in update:
+                value = update[field]
+                values[field] = value if value is not None or field == "notes" else ""
+        for field in STOCK_INT_FIELDS:
+            if field in update:
+                try:
+                    values[field] = int(update[field])
+                except (TypeError, ValueError):
+                    raise ValueError(f"{field} должно быть целым числом")
+                if values[field] < 0:
+                    raise ValueError(f"{field} не может быть отрицательным")
+        delta = None
+        if "quantity_delta" in update:
+            try:
+                delta = int(update["quantity_delta"])
+            except (TypeError, ValueError):
+                raise ValueError("quantity_delta должно быть целым числом")
+            if "quantity_actual" in values:
+                if values["quantity_actual"] + delta < 0:
+                    raise ValueError(f"остаток станет отрицательным ({values['quantity_actual'] + delta})")
+                values["quantity_actual"] += delta
+                delta = None
+        
+        if delta is not None:
+            self._add_quantity(product, delta)
+        if not stock:
+            stock = product.stock or WarehouseStock(product_id=product.id)
+            product.stock = stock
+        for field, value in values.items():
+            setattr(stock, field, value)
+        stock.last_counted = datetime.now()
+        product.updated_at = datetime.now()
+        return list(values) + (["quantity_actual"] if delta is not None else [])
+    
+    def _add_quantity(self, product, delta: int) -> None:
+        """quantity_actual += delta одним UPDATE: параллельные вызовы не теряют изменений.
+
+        Складская запись создается при необходимости; ValueError — если остаток
+        станет отрицательным (строка не меняется).
+        """
+        from sqlalchemy.dialects.sqlite import insert
+        
+        table = WarehouseStock.__table__
+        if product.stock is None:
+            db.session.execute(insert(table).values(product_id=product.id, quantity_actual=0)
+                               .on_conflict_do_nothing(index_elements=["product_id"]))
+        result = db.session.execute(
+            table.update()
+            .where(table.c.product_id == product.id, table.c.quantity_actual + delta >= 0)
+            .values(quantity_actual=table.c.quantity_actual + delta)
+        )
+        if result.rowcount == 0:
+            current = db.session.query(table.c.quantity_actual).filter(table.c.product_id == product.id).scalar()
+            raise ValueError(f"остаток станет отрицательным ({(current or 0) + delta})")
+        # Значение в сессии устарело — перечитаем из базы при обращении
+        if product.stock is not None:
+            db.session.expire(product.stock, ["quantity_actual"])
+        else:
+            db.session.expire(product, ["stock"])
+    
+    def _not_found(self, article: Any) -> Dict:
+        """Товар не найден: похожие артикулы (опечатки, кириллица) в тексте и данных"""
+        from article_index import suggest
+        suggestions = suggest(str(article or ""), limit=5)
+        text = f"Товар с артикулом {article} не найден"
+        if suggestions:
+            text += ". Возможно: " + ", ".join(f"{s['article']} ({s['title']})" for s in suggestions)
+        return self._structured(text, {
+            "error": "not_found",
+            "article": article,
+            "suggestions": [s["article"] for s in suggestions]
+        }, is_error=True)
+    
+    @staticmethod
+    def _summary(text: str, rows: List[Dict[str, Any]], limit: int = 20) -> str:
+        """Короткий текст для списков: итог и артикулы, сами строки — в данных результата"""
+        if not rows:
+            return text
+        articles = ", ".join(r["article"] for r in rows[:limit])
+        more = f" … (+{len(rows) - limit})" if len(rows) > limit else ""
+        return f"{text}: {articles}{more}"
+    
     def _list_products(self, args: Dict) -> Dict:
         """Получает список товаров"""
-        limit = args.get("limit", 50)
-        offset = args.get("offset", 0)
-        
-        products = Product.query.offset(offset).limit(limit).all()
-        
-        result = []
-        for p in products:
-            stock = p.stock
-            result.append({
-                "article": p.article,
-                "title": p.title,
-                "manufacturer": p.manufacturer,
-                "quantity": stock.quantity_actual if stock else 0,
-                "zone": stock.zone if stock else None
-            })
+        limit = max(1, min(int(args.get("limit", 50)), BATCH_LIMIT))
+        offset = max(0, int(args.get("offset", 0)))
         
-        return {
-            "content": [{
-                "type": "text",
-                "text": f"Найдено {len(result)} товаров:\n" + 
-                        "\n".join([f"- {p['article']}: {p['title']} ({p['quantity']} шт.)" for p in result])
-            }]
-        }
+        total = Product.query.count()
+        products = Product.query.options(db.joinedload(Product.stock)) \
+            .order_by(Product.id).offset(offset).limit(limit).all()
+        items = [self._product_row(p) for p in products]
+        
+        text = f"Товары {offset + 1}–{offset + len(items)} из {total}" if items else f"Нет товаров (всего {total})"
+        return self._structured(self._summary(text, items), {"total": total, "offset": offset, "items": items})
     
     def _get_product(self, args: Dict) -> Dict:
         """Получает товар по артикулу"""
@@ -215,140 +571,97 @@ class MCPServer:
         product = Product.query.filter_by(article=article).first()
         
         if not product:
-            return {
-                "isError": True,
-                "content": [{"type": "text", "text": f"Товар с артикулом {article} не найден"}]
-            }
-        
-        stock = product.stock
-        text = f"""
-Товар: {product.title}
-Артикул: {product.article}
-Производитель: {product.manufacturer or 'не указан'}
-Цена: {product.price or 'не указана'}
-
-Складские данные:
-- Количество: {stock.quantity_actual if stock else 0} шт.
-- Минимальный остаток: {stock.quantity_min if stock else 0} шт.
-- Местоположение: {f"{stock.zone}-{stock.rack}-{stock.shelf}-{stock.cell}" if stock and any([stock.zone, stock.rack, stock.shelf, stock.cell]) else 'не указано'}
-
-{product.description[:200] if product.description else ''}
-"""
+            return self._not_found(article)
         
-        return {
-            "content": [{"type": "text", "text": text.strip()}]
-        }
+        row = self._product_row(product)
+        row.update({
+            "category": product.category,
+            "url": product.url,
+            "description": product.description[:200] if product.description else None
+        })
+        text = (f"{row['article']}: {row['title']} ({row['manufacturer'] or 'производитель не указан'}), "
+                f"{row['quantity']} шт., мин. {row['min']}, место: {row['location'] or 'не указано'}")
+        return self._structured(text, {"product": row})
     
     def _search_products(self, args: Dict) -> Dict:
         """Поиск товаров"""
         query = args.get("query", "").lower()
         
-        products = Product.query.filter(
+        products = Product.query.options(db.joinedload(Product.stock)).filter(
             db.or_(
                 Product.article.ilike(f'%{query}%'),
                 Product.title.ilike(f'%{query}%'),
                 Product.manufacturer.ilike(f'%{query}%')
             )
         ).limit(20).all()
+        items = [self._product_row(p) for p in products]
         
-        if not products:
-            return {
-                "content": [{"type": "text", "text": f"По запросу '{query}' ничего не найдено"}]
-            }
-        
-        text = f"Найдено {len(products)} товаров по запросу '{query}':\n\n"
-        for p in products:
-            stock_qty = p.stock.quantity_actual if p.stock else 0
-            text += f"- {p.article}: {p.title} ({p.manufacturer or '?'}), {stock_qty} шт.\n"
-        
-        return {"content": [{"type": "text", "text": text}]}
+        text = f"Найдено {len(items)} по запросу '{query}'" if items else f"По запросу '{query}' ничего не найдено"
+        return self._structured(self._summary(text, items), {"query": query, "items": items})
     
     def _get_stock_stats(self) -> Dict:
-        """Статистика склада"""
-        total = Product.query.count()
-        total_items = db.session.query(db.func.sum(WarehouseStock.quantity_actual)).scalar() or 0
-        
-        low_stock = Product.query.join(WarehouseStock).filter(
-            WarehouseStock.quantity_actual < WarehouseStock.quantity_min,
-            WarehouseStock.quantity_min > 0
-        ).count()
-        
-        out_of_stock = Product.query.join(WarehouseStock).filter(
-            WarehouseStock.quantity_actual == 0
-        ).count()
-        
-        text = f"""
-📊 Статистика склада:
-
-- Всего товаров: {total}
-- Единиц на складе: {total_items}
-- ⚠️ Заканчивается: {low_stock}
-- ❌ Нет в наличии: {out_of_stock}
-"""
-        
-        return {"content": [{"type": "text", "text": text}]}
+        """Статистика склада (те же запросы, что у /api/stats)"""
+        from stock_queries import stock_stats
+        data = stock_stats()
+        text = (f"📊 Товаров: {data['products']}, единиц: {data['units']} (в резерве {data['reserved']}), "
+                f"ниже минимума: {data['low_stock']}, нет в наличии: {data['out_of_stock']}")
+        return self._structured(text, data)
     
     def _import_product(self, args: Dict) -> Dict:
-        """Импортирует товар с snab-lift.ru"""
+        """Импортирует товар с snab-lift.ru или обновляет данные каталога существующего"""
         query = args.get("query")
+        mode = args.get("mode") or "skip"
         
-        driver = create_driver()
+        from ingest import ingest_product, format_changes, parse_fields, MODES
+        if mode not in MODES:
+            return self._structured(f"Неизвестный mode: {mode}", {"error": "invalid_mode", "mode": mode},
+                                    is_error=True)
         try:
+            fields = parse_fields(args.get("fields"))
+        except ValueError as e:
+            return self._structured(f"Некорректные поля: {e}", {"error": str(e)}, is_error=True)
+        
+        # Selenium нужен только здесь — импортируем при первом импорте товара
+        from warehouse_card import parse_product_page, find_product_by_article, is_url
+        from browser_pool import get_browser_pool
+        
+        # Браузер из общего пула: не запускаем Chrome заново на каждый импорт
+        with get_browser_pool().driver(timeout=TOOL_TIMEOUTS["import_product"]) as driver:
             if is_url(query):
                 product_url = query
             else:
                 product_url = find_product_by_article(driver, query)
                 if not product_url:
-                    return {
-                        "isError": True,
-                        "content": [{"type": "text", "text": f"Товар {query} не найден на сайте"}]
-                    }
+                    return self._structured(f"Товар {query} не найден на сайте",
+                                            {"error": "not_found_on_site", "query": query}, is_error=True)
             
             product_data = parse_product_page(driver, product_url)
-            
-            # Проверяем, не существует ли уже
-            existing = Product.query.filter_by(article=product_data['article']).first()
-            if existing:
-                return {
-                    "isError": True,
-                    "content": [{"type": "text", "text": f"Товар {product_data['article']} уже существует"}]
-                }
-            
-            # Создаем товар
-            from warehouse_system import ProductImage
-            import json as json_lib
-            
-            product = Product(
-                article=product_data['article'],
-                title=product_data['title'],
-                manufacturer=product_data.get('manufacturer'),
-                price=product_data.get('price'),
-                description=product_data.get('description'),
-                url=product_data['url'],
-                specifications=json_lib.dumps(product_data.get('specifications', {}))
-            )
-            db.session.add(product)
-            db.session.flush()
-            
-            # Добавляем изображения
-            for i, img_url in enumerate(product_data.get('images', [])[:5]):
-                image = ProductImage(product_id=product.id, image_url=img_url, is_main=(i==0))
-                db.session.add(image)
-            
-            # Создаем складскую запись
-            stock = WarehouseStock(product_id=product.id)
-            db.session.add(stock)
-            db.session.commit()
-            
-            return {
-                "content": [{
-                    "type": "text",
-                    "text": f"✅ Импортировано: {product.title}\nАртикул: {product.article}\nФото: {len(product_data.get('images', []))}"
-                }]
-            }
-            
-        finally:
-            driver.quit()
+        
+        # Товар, фото и складская запись — одной транзакцией, как во всех импортах
+        try:
+            product_id, status, changes = ingest_product(product_data, mode=mode, fields=fields)
+        except ValueError as e:
+            return self._structured(f"Не удалось разобрать товар: {e}",
+                                    {"error": "invalid", "query": query}, is_error=True)
+        article = product_data['article']
+        if status == 'skipped':
+            return self._structured(f"Товар {article} уже существует (обновить: mode=upsert)",
+                                    {"error": "exists", "article": article}, is_error=True)
+        if status == 'missing':
+            return self._structured(f"Товара {article} нет в базе — refresh_fields только обновляет",
+                                    {"error": "not_found", "article": article}, is_error=True)
+        
+        product = db.session.get(Product, product_id)
+        images = len(product.images)
+        data = {"article": product.article, "title": product.title, "images": images,
+                "status": status, "changes": changes}
+        if status == 'created':
+            text = f"✅ Импортировано: {product.article} — {product.title}, фото: {images}"
+        elif status == 'updated':
+            text = f"🔄 Обновлено: {product.article} — {format_changes(changes)}"
+        else:
+            text = f"✅ Данные {product.article} не изменились"
+        return self._structured(text, data)
     
     def _update_stock(self, args: Dict) -> Dict:
         """Обновляет складские данные"""
@@ -356,59 +669,126 @@ class MCPServer:
         product = Product.query.filter_by(article=article).first()
         
         if not product:
-            return {
-                "isError": True,
-                "content": [{"type": "text", "text": f"Товар {article} не найден"}]
-            }
+            return self._not_found(article)
         
-        if not product.stock:
-            product.stock = WarehouseStock(product_id=product.id)
-        
-        # Обновляем поля
-        if "zone" in args:
-            product.stock.zone = args["zone"]
-        if "rack" in args:
-            product.stock.rack = args["rack"]
-        if "shelf" in args:
-            product.stock.shelf = args["shelf"]
-        if "cell" in args:
-            product.stock.cell = args["cell"]
-        if "quantity_actual" in args:
-            product.stock.quantity_actual = args["quantity_actual"]
-        if "quantity_min" in args:
-            product.stock.quantity_min = args["quantity_min"]
-        if "notes" in args:
-            product.stock.notes = args["notes"]
-        
-        product.stock.last_counted = datetime.now()
+        try:
+            changed = self._apply_stock_update(product, args)
+        except ValueError as e:
+            db.session.rollback()
+            return self._structured(f"Некорректные данные: {e}", {"error": str(e)}, is_error=True)
         db.session.commit()
         
-        location = f"{product.stock.zone or '-'}-{product.stock.rack or '-'}-{product.stock.shelf or '-'}-{product.stock.cell or '-'}"
+        row = dict(self._product_row(product), changed=changed)
+        text = f"✅ Обновлено: {row['article']}, {row['quantity']} шт., место: {row['location'] or 'не указано'}"
+        return self._structured(text, row)
+    
+    # ========== ПАКЕТНЫЕ ИНСТРУМЕНТЫ ==========
+    
+    def _get_products_batch(self, args: Dict) -> Dict:
+        """Много товаров по артикулам одним запросом IN"""
+        try:
+            articles = self._articles(args.get("articles"))
+        except ValueError as e:
+            return self._structured(f"Некорректный список артикулов: {e}", {"error": str(e)}, is_error=True)
+        
+        products = Product.query.options(db.joinedload(Product.stock)) \
+            .filter(Product.article.in_(articles)).all() if articles else []
+        by_article = {p.article: p for p in products}
+        found = [self._product_row(by_article[a]) for a in articles if a in by_article]
+        missing = [a for a in articles if a not in by_article]
         
-        return {
-            "content": [{
-                "type": "text",
-                "text": f"✅ Обновлено: {product.title}\nКоличество: {product.stock.quantity_actual} шт.\nМесто: {location}"
-            }]
-        }
+        data = {"found": found, "missing": missing}
+        if missing:
+            # Похожие артикулы для ненайденных — из индекса в памяти, без запросов к базе
+            from article_index import suggest
+            suggestions = {}
+            for article in missing:
+                similar = [s["article"] for s in suggest(article, limit=3)]
+                if similar:
+                    suggestions[article] = similar
+            if suggestions:
+                data["suggestions"] = suggestions
+        
+        text = f"Найдено {len(found)} из {len(articles)}"
+        if missing:
+            text += f"; не найдены: {', '.join(missing[:20])}" + (" …" if len(missing) > 20 else "")
+        return self._structured(text, data)
     
-    def _get_low_stock(self) -> Dict:
-        """Получает товары с низким остатком"""
-        products = Product.query.join(WarehouseStock).filter(
-            WarehouseStock.quantity_actual < WarehouseStock.quantity_min,
-            WarehouseStock.quantity_min > 0
-        ).all()
+    def _update_stock_batch(self, args: Dict) -> Dict:
+        """Пакетное обновление складских данных одной транзакцией"""
+        updates = args.get("updates")
+        atomic = args.get("atomic", True)
+        if not isinstance(updates, list) or not all(isinstance(u, dict) for u in updates):
+            return self._structured("updates должен быть списком объектов", {"error": "invalid updates"}, is_error=True)
+        if len(updates) > BATCH_LIMIT:
+            return self._structured(f"Не больше {BATCH_LIMIT} обновлений за раз",
+                                    {"error": "too many updates"}, is_error=True)
         
-        if not products:
-            return {
-                "content": [{"type": "text", "text": "✅ Нет товаров с низким остатком"}]
-            }
+        articles = list(dict.fromkeys(str(u.get("article") or "").strip() for u in updates))
+        products = Product.query.options(db.joinedload(Product.stock)) \
+            .filter(Product.article.in_(articles)).all()
+        by_article = {p.article: p for p in products}
         
-        text = f"⚠️ Товары с низким остатком ({len(products)}):\n\n"
-        for p in products:
-            text += f"- {p.article}: {p.title} ({p.stock.quantity_actual} из {p.stock.quantity_min} мин.)\n"
+        updated = {}
+        errors = []
+        try:
+            for index, update in enumerate(updates):
+                article = str(update.get("article") or "").strip()
+                product = by_article.get(article)
+                if product is None:
+                    errors.append({"index": index, "article": article, "error": "не найден"})
+                    continue
+                try:
+                    changed = self._apply_stock_update(product, update)
+                except ValueError as e:
+                    errors.append({"index": index, "article": article, "error": str(e)})
+                    continue
+                entry = updated.setdefault(article, {"product": product, "changed": []})
+                entry["changed"] += [f for f in changed if f not in entry["changed"]]
+            
+            committed = not (errors and atomic)
+            if committed:
+                db.session.commit()
+            else:
+                db.session.rollback()
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        data = {
+            "committed": committed,
+            "updated": [
+                dict(self._product_row(entry["product"]), changed=entry["changed"])
+                for entry in updated.values()
+            ] if committed else [],
+            "errors": errors
+        }
+        if committed:
+            text = f"✅ Обновлено товаров: {len(data['updated'])}"
+            if errors:
+                text += f"; пропущено строк с ошибками: {len(errors)}"
+        else:
+            text = f"❌ Ничего не изменено: ошибок {len(errors)} (первая: {errors[0]['article']} — {errors[0]['error']})"
+        return self._structured(text, data, is_error=not committed)
+    
+    def _get_low_stock(self, args: Dict) -> Dict:
+        """Товары ниже минимума постранично (те же запросы, что у /api/stock/low)"""
+        from stock_queries import low_stock
+        try:
+            products, page = low_stock(limit=args.get("limit", LOW_STOCK_PAGE), offset=args.get("offset", 0))
+        except (TypeError, ValueError):
+            return self._structured("limit и offset должны быть целыми числами",
+                                    {"error": "invalid page"}, is_error=True)
+        items = [self._product_row(p) for p in products]
         
-        return {"content": [{"type": "text", "text": text}]}
+        if not items:
+            text = "✅ Нет товаров с низким остатком" if not page["total"] else f"Страница пуста (всего {page['total']})"
+        else:
+            text = self._summary(f"⚠️ Ниже минимума {page['total']}, показаны "
+                                 f"{page['offset'] + 1}–{page['offset'] + len(items)}", items)
+            if page["next_offset"] is not None:
+                text += f"; дальше: offset={page['next_offset']}"
+        return self._structured(text, dict(page, items=items))
     
     def _create_product_card(self, args: Dict) -> Dict:
         """Создает HTML карточку товара"""
@@ -416,89 +796,445 @@ class MCPServer:
         product = Product.query.filter_by(article=article).first()
         
         if not product:
+            return self._not_found(article)
+        
+        # Карточка из общего шаблона — Selenium не нужен
+        from card_render import write_card
+        filename = write_card(product)
+        
+        return self._structured(f"✅ Карточка создана: {filename}", {"article": article, "file": filename})
+    
+    # ========== ПРОТОКОЛ (JSON-RPC) ==========
+    
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Выполняет инструмент в пуле потоков с таймаутом"""
+        loop = asyncio.get_running_loop()
+        executor = self._slow_executor if tool_name in SLOW_TOOLS else self._executor
+        timeout = TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT)
+        
+        future = loop.run_in_executor(executor, self.execute_tool, tool_name, arguments)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # Поток не прервать — он доработает, но результат уже никому не нужен
+            log(f"⏱️ {tool_name}: нет ответа за {timeout:.0f} с")
             return {
                 "isError": True,
-                "content": [{"type": "text", "text": f"Товар {article} не найден"}]
+                "content": [{"type": "text", "text": f"Инструмент {tool_name} не ответил за {timeout:.0f} с"}]
             }
+    
+    async def handle(self, message: Dict[str, Any], session: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Обрабатывает одно сообщение; возвращает ответ или None для уведомлений"""
+        method = message.get("method")
+        msg_id = message.get("id")
+        params = message.get("params") or {}
         
-        # Генерируем карточку
-        product_dict = product.to_dict()
-        from warehouse_card import create_warehouse_card
-        filename = create_warehouse_card(product_dict)
+        if msg_id is None:
+            # Уведомления: ответ не нужен
+            if method == "notifications/cancelled":
+                self.cancel(params.get("requestId"), params.get("reason"), session)
+            return None
         
-        return {
-            "content": [{
-                "type": "text",
-                "text": f"✅ Карточка создана: {filename}"
-            }]
-        }
-
-def main():
-    """Главная функция MCP сервера (stdio transport)"""
-    server = MCPServer()
+        if method == "initialize":
+            requested = params.get("protocolVersion")
+            version = requested if requested in SUPPORTED_PROTOCOL_VERSIONS else PROTOCOL_VERSION
+            self._versions[session] = version
+            result = {
+                "protocolVersion": version,
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": self.name, "version": self.version}
+            }
+        elif method == "ping":
+            result = {}
+        elif method == "tools/list":
+            result = {"tools": self.get_tools(self._structured_output(session))}
+        elif method == "tools/call":
+            result = await self.call_tool(params.get("name"), params.get("arguments") or {})
+            if not self._structured_output(session):
+                result = self._plain(result)
+        else:
+            return {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "error": {"code": -32601, "message": f"Метод не найден: {method}"}
+            }
+        
+        return {"jsonrpc": "2.0", "id": msg_id, "result": result}
     
-    # Отправляем информацию о сервере
-    server_info = {
-        "jsonrpc": "2.0",
-        "id": 0,
-        "result": {
-            "protocolVersion": "2024-11-05",
-            "capabilities": {
-                "tools": {}
-            },
-            "serverInfo": {
-                "name": server.name,
-                "version": server.version
+    def _structured_output(self, session: Optional[str]) -> bool:
+        """Понимает ли клиент сессии outputSchema и structuredContent"""
+        return self._versions.get(session, PROTOCOL_VERSION) >= STRUCTURED_OUTPUT_VERSION
+    
+    async def dispatch(self, message: Dict[str, Any], send: Callable[[Dict[str, Any]], None],
+                       session: Optional[str] = None):
+        """Обрабатывает запрос и отправляет ответ, как только он готов (порядок не важен)"""
+        msg_id = message.get("id")
+        try:
+            response = await self.handle(message, session)
+        except asyncio.CancelledError:
+            # Отмененный запрос остается без ответа (так требует MCP)
+            log(f"🛑 Запрос {msg_id} отменен")
+            return
+        except Exception as e:
+            response = {
+                "jsonrpc": "2.0",
+                "id": msg_id,
+                "error": {"code": -32603, "message": str(e)}
             }
-        }
-    }
-    print(json.dumps(server_info), flush=True)
+        finally:
+            self._inflight.pop((session, msg_id), None)
+        
+        if response is not None:
+            send(response)
+    
+    def submit(self, message: Dict[str, Any], send: Callable[[Dict[str, Any]], None],
+               session: Optional[str] = None) -> asyncio.Task:
+        """Запускает обработку запроса в фоне; запрос можно отменить по id"""
+        task = asyncio.create_task(self.dispatch(message, send, session))
+        if message.get("id") is not None:
+            self._inflight[(session, message["id"])] = task
+        return task
     
-    # Основной цикл обработки запросов
-    for line in sys.stdin:
+    async def serve_messages(self, messages: List[Dict[str, Any]], send: Callable[[Dict[str, Any]], None],
+                             session: Optional[str] = None):
+        """Обрабатывает пачку сообщений параллельно (HTTP POST); ждет все ответы"""
+        tasks = [self.submit(m, send, session) for m in messages]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            # HTTP-клиент отключился — отменяем его запросы
+            for task in tasks:
+                task.cancel()
+            raise
+    
+    def cancel(self, request_id: Any, reason: Optional[str] = None, session: Optional[str] = None):
+        """notifications/cancelled: снимает ожидание ответа на запрос"""
+        task = self._inflight.get((session, request_id))
+        if task is not None:
+            log(f"🛑 Отмена запроса {request_id}" + (f": {reason}" if reason else ""))
+            task.cancel()
+    
+    def cancel_session(self, session: str):
+        """Отменяет все незавершенные запросы сессии и забывает ее версию протокола"""
+        self._versions.pop(session, None)
+        for (owner, _), task in list(self._inflight.items()):
+            if owner == session:
+                task.cancel()
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._slow_executor.shutdown(wait=False, cancel_futures=True)
+        if "browser_pool" in sys.modules:
+            sys.modules["browser_pool"].get_browser_pool().close()
+
+def _write_frame(message: Dict[str, Any]):
+    """Один JSON-RPC кадр в stdout"""
+    _protocol_out.write(json.dumps(message, ensure_ascii=False) + "\n")
+    _protocol_out.flush()
+
+async def serve_stdio(server: MCPServer):
+    """stdio transport: читает запросы построчно, отвечает по мере готовности"""
+    loop = asyncio.get_running_loop()
+    pending = set()
+    
+    while True:
+        # Чтение stdin блокирующее — в отдельном потоке, чтобы цикл событий не стоял
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        
         try:
             message = json.loads(line)
-            method = message.get("method")
-            msg_id = message.get("id")
-            params = message.get("params", {})
-            
-            if method == "tools/list":
-                # Возвращаем список инструментов
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": msg_id,
-                    "result": {
-                        "tools": server.get_tools()
-                    }
-                }
-                print(json.dumps(response), flush=True)
-                
-            elif method == "tools/call":
-                # Вызываем инструмент
-                tool_name = params.get("name")
-                arguments = params.get("arguments", {})
-                
-                result = server.execute_tool(tool_name, arguments)
-                
-                response = {
-                    "jsonrpc": "2.0",
-                    "id": msg_id,
-                    "result": result
-                }
-                print(json.dumps(response), flush=True)
-                
         except json.JSONDecodeError:
+            _write_frame({
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"code": -32700, "message": "Parse error"}
+            })
             continue
-        except Exception as e:
-            error_response = {
+        if not isinstance(message, dict):
+            _write_frame({
                 "jsonrpc": "2.0",
-                "id": msg_id if 'msg_id' in locals() else None,
-                "error": {
-                    "code": -32603,
-                    "message": str(e)
-                }
-            }
-            print(json.dumps(error_response), flush=True)
+                "id": None,
+                "error": {"code": -32600, "message": "Invalid Request"}
+            })
+            continue
+        
+        if message.get("id") is None:
+            await server.dispatch(message, _write_frame)
+        else:
+            task = server.submit(message, _write_frame)
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    
+    # stdin закрыт — дожидаемся уже принятых запросов
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+
+# ========== HTTP TRANSPORT (Streamable HTTP) ==========
+
+MCP_PATH = "/mcp"
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 8766
+SESSION_TTL = 3600  # секунд без запросов до удаления сессии
+LOCAL_ORIGINS = {"localhost", "127.0.0.1", "::1"}
+
+class SessionStore:
+    """Сессии клиентов HTTP-транспорта (заголовок Mcp-Session-Id)"""
+    
+    def __init__(self, ttl: float = SESSION_TTL, on_expire: Optional[Callable[[str], None]] = None):
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+    
+    def _expired(self, session_ids: List[str]):
+        if self.on_expire:
+            for session_id in session_ids:
+                self.on_expire(session_id)
+    
+    def create(self, client_info: Optional[Dict[str, Any]] = None) -> str:
+        now = time.monotonic()
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if now - s["last_seen"] > self.ttl]
+            for sid in expired:
+                del self._sessions[sid]
+            self._sessions[session_id] = {"last_seen": now, "client": client_info or {}}
+        self._expired(expired)
+        return session_id
+    
+    def touch(self, session_id: str) -> bool:
+        """Отмечает активность; False — сессии нет или она истекла"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session["last_seen"] <= self.ttl:
+                session["last_seen"] = now
+                return True
+            expired = self._sessions.pop(session_id, None) is not None
+        if expired:
+            self._expired([session_id])
+        return False
+    
+    def close(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+class MCPHttpHandler(BaseHTTPRequestHandler):
+    """POST /mcp — JSON-RPC сообщения, DELETE /mcp — завершить сессию.
+
+    Ответ — application/json или, если клиент принимает только
+    text/event-stream, поток SSE с ответами по мере готовности.
+    """
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _error(self, status: int, code: int, message: str):
+        self._send_json(status, {"jsonrpc": "2.0", "id": None, "error": {"code": code, "message": message}})
+    
+    def _check_request(self) -> bool:
+        if urlparse(self.path).path != MCP_PATH:
+            self._send_json(404, {"error": "Not found"})
+            return False
+        # Защита от DNS rebinding: браузерные запросы только с локальных страниц
+        origin = self.headers.get("Origin")
+        if origin and urlparse(origin).hostname not in LOCAL_ORIGINS:
+            self._send_json(403, {"error": "Origin not allowed"})
+            return False
+        return True
+    
+    def do_GET(self):
+        # Сервер не шлет сообщений по своей инициативе — отдельный SSE-поток не нужен
+        if self._check_request():
+            self._send_json(405, {"error": "Method not allowed"}, {"Allow": "POST, DELETE"})
+    
+    def do_DELETE(self):
+        if not self._check_request():
+            return
+        session_id = self.headers.get("Mcp-Session-Id")
+        if not session_id or not self.server.sessions.close(session_id):
+            self._send_json(404, {"error": "Session not found"})
+            return
+        self.server.loop.call_soon_threadsafe(self.server.mcp.cancel_session, session_id)
+        log(f"👋 Сессия {session_id[:8]} завершена")
+        self._send_json(204)
+    
+    def do_POST(self):
+        if not self._check_request():
+            return
+        
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"null")
+        except (ValueError, json.JSONDecodeError):
+            self._error(400, -32700, "Parse error")
+            return
+        batch = isinstance(payload, list)
+        messages = payload if batch else [payload]
+        if not messages or not all(isinstance(m, dict) for m in messages):
+            self._error(400, -32600, "Invalid Request")
+            return
+        
+        # Сессия: новая на initialize, иначе обязателен заголовок Mcp-Session-Id
+        headers = {}
+        initialize = next((m for m in messages if m.get("method") == "initialize"), None)
+        if initialize is not None:
+            session_id = self.server.sessions.create((initialize.get("params") or {}).get("clientInfo"))
+            headers["Mcp-Session-Id"] = session_id
+            log(f"🔌 Новая сессия {session_id[:8]} (всего: {len(self.server.sessions)})")
+        else:
+            session_id = self.headers.get("Mcp-Session-Id")
+            if not session_id:
+                self._error(400, -32600, "Missing Mcp-Session-Id header")
+                return
+            if not self.server.sessions.touch(session_id):
+                self._error(404, -32001, "Session not found")
+                return
+        
+        # Только уведомления и ответы — подтверждаем без тела
+        expected = sum(1 for m in messages if m.get("id") is not None and "method" in m)
+        responses = queue.Queue()
+        done = object()
+        future = asyncio.run_coroutine_threadsafe(
+            self.server.mcp.serve_messages(messages, responses.put, session_id), self.server.loop)
+        future.add_done_callback(lambda _: responses.put(done))
+        if not expected:
+            self._send_json(202, headers=headers)
+            return
+        
+        accept = self.headers.get("Accept", "")
+        try:
+            if "text/event-stream" in accept and "application/json" not in accept:
+                self._stream_responses(responses, done, headers)
+            else:
+                results = []
+                for item in iter(responses.get, done):
+                    results.append(item)
+                if not results:
+                    # Все запросы отменены
+                    self._send_json(202, headers=headers)
+                else:
+                    self._send_json(200, results if batch else results[0], headers)
+        except (BrokenPipeError, ConnectionResetError):
+            future.cancel()
+    
+    def _stream_responses(self, responses: "queue.Queue", done: object, headers: Dict[str, str]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+        for item in iter(responses.get, done):
+            self.wfile.write(f"event: message\ndata: {json.dumps(item, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+def serve_http(server: MCPServer, host: str = HTTP_HOST, port: int = HTTP_PORT):
+    """Долгоживущий HTTP-сервер: все клиенты делят один процесс, пул соединений
+    с базой, пул браузеров и кэши"""
+    loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=loop.run_forever, name="mcp-loop", daemon=True)
+    loop_thread.start()
+    
+    httpd = ThreadingHTTPServer((host, port), MCPHttpHandler)
+    httpd.daemon_threads = True
+    httpd.mcp = server
+    httpd.loop = loop
+    # Истекшая сессия: отменить ее запросы и забыть версию протокола
+    httpd.sessions = SessionStore(
+        on_expire=lambda session_id: loop.call_soon_threadsafe(server.cancel_session, session_id))
+    log(f"🌐 MCP (Streamable HTTP): http://{host}:{port}{MCP_PATH}")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join(timeout=5)
+
+def benchmark_startup(runs: int = 5):
+    """Замер запуска: время до ответа на initialize, tools/list и первый tools/call"""
+    import subprocess
+    import statistics
+    
+    # В этом процессе протокол не должен тянуть тяжелые модули
+    server = MCPServer()
+    asyncio.run(server.handle({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}}))
+    asyncio.run(server.handle({"jsonrpc": "2.0", "id": 2, "method": "tools/list"}))
+    server.shutdown()
+    heavy = [m for m in ("flask", "sqlalchemy", "selenium", "warehouse_system", "warehouse_card") if m in sys.modules]
+    print(f"📦 Модули после initialize/tools/list: {', '.join(heavy) if heavy else 'без Flask/SQLAlchemy/Selenium'}")
+    
+    requests_ = [
+        {"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {}},
+        {"jsonrpc": "2.0", "id": 2, "method": "tools/list"},
+        {"jsonrpc": "2.0", "id": 3, "method": "tools/call", "params": {"name": "get_stock_stats", "arguments": {}}},
+    ]
+    timings = {1: [], 2: [], 3: []}
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        for message in requests_:
+            proc.stdin.write(json.dumps(message) + "\n")
+            proc.stdin.flush()
+            response = json.loads(proc.stdout.readline())
+            timings[response["id"]].append((time.perf_counter() - started) * 1000)
+        proc.stdin.close()
+        proc.wait()
+    
+    print(f"⏱️ Запуск MCP сервера, медиана из {runs}:")
+    print(f"   initialize:                {statistics.median(timings[1]):.0f} мс")
+    print(f"   tools/list:                {statistics.median(timings[2]):.0f} мс")
+    print(f"   первый tools/call (+Flask): {statistics.median(timings[3]):.0f} мс")
+
+def main():
+    """Главная функция MCP сервера: stdio (по умолчанию) или HTTP"""
+    parser = argparse.ArgumentParser(description="MCP сервер складской системы")
+    parser.add_argument("--http", action="store_true", help="HTTP-транспорт вместо stdio")
+    parser.add_argument("--host", default=HTTP_HOST)
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    parser.add_argument("--benchmark", type=int, nargs="?", const=5, metavar="N",
+                        help="замер времени запуска (N запусков)")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark_startup(args.benchmark)
+        return
+    
+    server = MCPServer()
+    try:
+        if args.http:
+            serve_http(server, args.host, args.port)
+        else:
+            reserve_stdout()
+            asyncio.run(serve_stdio(server))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
 
 if __name__ == "__main__":
     main()
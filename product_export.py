@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Выгрузка каталога в CSV, XLSX и Parquet
+Те же фильтры, что у /api/products, и выбор колонок. Строки читаются из базы
+порциями (yield_per) и сразу пишутся в файл — память не зависит от размера
+каталога: CSV отдается потоком, XLSX (write_only) и Parquet (группа строк на
+порцию) собираются во временном файле.
+"""
+
+import argparse
+import csv
+import io
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'xlsx', 'parquet')
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+DEFAULT_COLUMNS = ('article', 'title', 'manufacturer', 'category', 'price', 'location',
+                   'quantity_actual', 'quantity_reserved', 'quantity_available',
+                   'quantity_min', 'quantity_max', 'stock_status')
+
+# Необязательные зависимости: XLSX — openpyxl, Parquet — pyarrow; CSV доступен всегда
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+def export_columns():
+    """Доступные колонки: имя -> (SQL-выражение, тип: str / int / datetime)"""
+    from warehouse_system import db, Product, WarehouseStock, ProductImage, stock_status_expr
+    
+    stock = WarehouseStock
+    images = db.select(ProductImage.image_url).where(ProductImage.product_id == Product.id)
+    return {
+        'id': (Product.id, 'int'),
+        'article': (Product.article, 'str'),
+        'title': (Product.title, 'str'),
+        'manufacturer': (Product.manufacturer, 'str'),
+        'category': (Product.category, 'str'),
+        'price': (Product.price, 'str'),
+        'description': (Product.description, 'str'),
+        'url': (Product.url, 'str'),
+        'weight': (Product.weight, 'str'),
+        'dimensions': (Product.dimensions, 'str'),
+        'specifications': (Product.specifications, 'str'),
+        'created_at': (Product.created_at, 'datetime'),
+        'updated_at': (Product.updated_at, 'datetime'),
+        'zone': (stock.zone, 'str'),
+        'rack': (stock.rack, 'str'),
+        'shelf': (stock.shelf, 'str'),
+        'cell': (stock.cell, 'str'),
+        'location': (db.func.trim(stock.zone + '-' + stock.rack + '-' + stock.shelf + '-' + stock.cell, '-'), 'str'),
+        'quantity_actual': (stock.quantity_actual, 'int'),
+        'quantity_reserved': (stock.quantity_reserved, 'int'),
+        'quantity_available': (stock.quantity_actual - stock.quantity_reserved, 'int'),
+        'quantity_min': (stock.quantity_min, 'int'),
+        'quantity_max': (stock.quantity_max, 'int'),
+        'stock_status': (db.case((stock.id.is_(None), 'none'), else_=stock_status_expr()), 'str'),
+        'notes': (stock.notes, 'str'),
+        'last_counted': (stock.last_counted, 'datetime'),
+        'main_image': (images.order_by(ProductImage.is_main.desc(), ProductImage.id).limit(1)
+                       .scalar_subquery(), 'str'),
+        'image_count': (db.select(db.func.count()).where(ProductImage.product_id == Product.id)
+                        .scalar_subquery(), 'int'),
+    }
+
+def parse_columns(value):
+    """Список колонок из "article,title,..." (None — колонки по умолчанию); ValueError для неизвестных"""
+    if not value:
+        return list(DEFAULT_COLUMNS)
+    names = value if isinstance(value, (list, tuple)) else value.split(',')
+    names = [name.strip() for name in names if name.strip()]
+    available = export_columns()
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"неизвестные колонки: {', '.join(unknown)}; доступны: {', '.join(available)}")
+    return list(dict.fromkeys(names))
+
+def check_format(fmt):
+    """ValueError, если формат неизвестен или для него не установлена библиотека"""
+    if fmt not in FORMATS:
+        raise ValueError(f"формат {fmt} не поддерживается; доступны: {', '.join(FORMATS)}")
+    if fmt == 'xlsx' and openpyxl is None:
+        raise ValueError("для XLSX нужен openpyxl (pip install openpyxl)")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError("для Parquet нужен pyarrow (pip install pyarrow)")
+
+def iter_chunks(args, columns, chunk_size=CHUNK_SIZE):
+    """Порции строк (кортежи в порядке columns) по фильтрам /api/products, по артикулу.
+
+    Внутри app_context; курсор читается порциями, а не целиком.
+    """
+    from warehouse_system import db, Product, WarehouseStock, filter_products
+    
+    available = export_columns()
+    filtered = filter_products(db.session.query(Product.id), args).subquery()
+    statement = db.select(*[available[name][0].label(name) for name in columns]) \
+        .select_from(Product) \
+        .outerjoin(WarehouseStock, WarehouseStock.product_id == Product.id) \
+        .where(Product.id.in_(db.select(filtered.c.id))) \
+        .order_by(Product.article) \
+        .execution_options(yield_per=chunk_size)
+    result = db.session.execute(statement)
+    try:
+        for rows in result.partitions():
+            yield rows
+    finally:
+        result.close()
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    return '' if value is None else value
+
+def csv_stream(chunks, columns, delimiter=','):
+    """Байты CSV по порции за раз; BOM — чтобы Excel узнал UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows([_cell(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def write_xlsx(chunks, columns, target):
+    """XLSX в режиме write_only: строки сразу уходят во временный XML, а не в память"""
+    book = openpyxl.Workbook(write_only=True)
+    sheet = book.create_sheet('Товары')
+    sheet.append(columns)
+    count = 0
+    for rows in chunks:
+        for row in rows:
+            sheet.append(list(row))
+        count += len(rows)
+    book.save(target)
+    return count
+
+def write_parquet(chunks, columns, target):
+    """Parquet с типизированными колонками; каждая порция — отдельная группа строк"""
+    available = export_columns()
+    types = {'str': pyarrow.string(), 'int': pyarrow.int64(), 'datetime': pyarrow.timestamp('us')}
+    schema = pyarrow.schema([(name, types[available[name][1]]) for name in columns])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(target, schema, compression='zstd') as writer:
+        for rows in chunks:
+            arrays = [pyarrow.array([row[i] for row in rows], type=field.type)
+                      for i, field in enumerate(schema)]
+            writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+def export_file(fmt, args, columns, target, delimiter=','):
+    """Пишет выгрузку в путь или файловый объект; возвращает число строк"""
+    chunks = iter_chunks(args, columns)
+    if fmt == 'xlsx':
+        return write_xlsx(chunks, columns, target)
+    if fmt == 'parquet':
+        return write_parquet(chunks, columns, target)
+    
+    count = 0
+    
+    def counted():
+        nonlocal count
+        for rows in chunks:
+            count += len(rows)
+            yield rows
+    
+    close = isinstance(target, str)
+    f = open(target, 'wb') if close else target
+    try:
+        for data in csv_stream(counted(), columns, delimiter):
+            f.write(data)
+    finally:
+        if close:
+            f.close()
+    return count
+
+def export_response(fmt, args):
+    """Flask-ответ с выгрузкой: CSV — потоком, XLSX/Parquet — из временного файла"""
+    from flask import stream_with_context
+    from warehouse_system import app
+    
+    check_format(fmt)
+    columns = parse_columns(args.get('columns'))
+    delimiter = args.get('delimiter') or ','
+    if len(delimiter) != 1:
+        raise ValueError("delimiter — один символ")
+    filename = f"warehouse_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    
+    if fmt == 'csv':
+        body = csv_stream(iter_chunks(args, columns), columns, delimiter)
+        return app.response_class(stream_with_context(body), mimetype=MIMETYPES[fmt], headers=headers)
+    
+    # Файл без имени на диске: удаляется сам, когда ответ закроет его
+    tmp = tempfile.TemporaryFile()
+    try:
+        export_file(fmt, args, columns, tmp)
+        size = tmp.tell()
+        tmp.seek(0)
+    except Exception:
+        tmp.close()
+        raise
+    headers['Content-Length'] = str(size)
+    return app.response_class(_read_file(tmp), mimetype=MIMETYPES[fmt], headers=headers, direct_passthrough=True)
+
+def _read_file(f, block=256 * 1024):
+    try:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            yield data
+    finally:
+        f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка каталога в CSV / XLSX / Parquet")
+    parser.add_argument("output", help="файл; формат по расширению (.csv, .xlsx, .parquet)")
+    parser.add_argument("--columns", default=None,
+                        help=f"колонки через запятую (по умолчанию {','.join(DEFAULT_COLUMNS)})")
+    parser.add_argument("--delimiter", default=",", help="разделитель CSV (для Excel в русской локали — ;)")
+    for name in ('zone', 'manufacturer', 'category', 'stock_status', 'search'):
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, default=None, help="фильтр как в /api/products")
+    parser.add_argument("--list-columns", action="store_true", help="показать доступные колонки")
+    args = parser.parse_args()
+    
+    from warehouse_system import app
+    
+    with app.app_context():
+        if args.list_columns:
+            for name, (_, kind) in export_columns().items():
+                print(f"  {name:20} {kind}")
+            return 0
+        fmt = args.output.rsplit('.', 1)[-1].lower()
+        try:
+            check_format(fmt)
+            columns = parse_columns(args.columns)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        filters = {k: v for k, v in vars(args).items()
+                   if k in ('zone', 'manufacturer', 'category', 'stock_status', 'search') and v}
+        start = time.perf_counter()
+        count = export_file(fmt, filters, columns, args.output, args.delimiter)
+        elapsed = time.perf_counter() - start
+    
+    print(f"✅ {args.output}: {count} товаров, {len(columns)} колонок за {elapsed:.1f} с")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
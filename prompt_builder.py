@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Сборка промпта для ИИ-поиска с бюджетом токенов
+Товары ранжируются, сжимаются в компактные строки таблицы и добавляются,
+пока не исчерпан бюджет; размер и стоимость промпта известны до отправки
+"""
+
+import math
+import os
+import re
+import sys
+
+from llm_client import estimate_cost, DEFAULT_MODEL
+from semantic_search import product_location, tokenize
+
+# Бюджет контекста (строки товаров) в токенах и размер пула кандидатов
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('AI_CONTEXT_TOKENS', 1500))
+# Общий контекст пакетного запроса покрывает несколько вопросов — бюджет больше
+BATCH_CONTEXT_TOKEN_BUDGET = int(os.environ.get('AI_BATCH_CONTEXT_TOKENS', 3000))
+CANDIDATE_POOL = 40
+
+# Ограничения длины полей в строке таблицы
+TITLE_MAX_CHARS = 70
+MANUFACTURER_MAX_CHARS = 20
+NOTES_MAX_CHARS = 40
+
+COLUMNS = "артикул|название|производитель|шт|резерв|место|примечание"
+
+INSTRUCTIONS = """Найди подходящие товары. Ответь кратко:
+- Артикул и название
+- Почему подходит
+- Количество на складе
+- **Местоположение** (зона-стеллаж-полка-ячейка)
+
+Если местоположение не задано - укажи это.
+Если ничего не подходит - скажи прямо."""
+
+_WHITESPACE = re.compile(r'\s+')
+
+def _load_tokenizer():
+    """Точный счетчик токенов, если установлен tiktoken"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return None
+
+_tokenizer = _load_tokenizer()
+
+def count_tokens(text):
+    """Число токенов в тексте.
+
+    Без tiktoken — оценка по байтам UTF-8 (≈4 байта на токен): для кириллицы
+    это ≈2 символа на токен, что близко к токенизаторам Llama.
+    """
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text))
+    return math.ceil(len(text.encode('utf-8')) / 4)
+
+def _cell(value, max_chars=None):
+    """Значение ячейки: одна строка без разделителей, обрезанная до max_chars"""
+    text = _WHITESPACE.sub(' ', str(value or '')).replace('|', '/').strip()
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 1].rstrip() + '…'
+    return text
+
+def product_row(product):
+    """Компактная строка таблицы для одного товара"""
+    stock = product.stock
+    location = product_location(product)
+    return '|'.join([
+        _cell(product.article),
+        _cell(product.title, TITLE_MAX_CHARS),
+        _cell(product.manufacturer, MANUFACTURER_MAX_CHARS) or '-',
+        str(stock.quantity_actual or 0) if stock else '0',
+        str(stock.quantity_reserved or 0) if stock else '0',
+        location if location != "не указано" else '-',
+        _cell(stock.notes, NOTES_MAX_CHARS) if stock and stock.notes else '',
+    ]).rstrip('|')
+
+def rank_products(query, products):
+    """Ранжирует кандидатов: товары, чей артикул назван в запросе, — первыми,
+    затем по числу слов запроса в названии; при равенстве сохраняется порядок поиска"""
+    words = set(tokenize(query))
+    query_text = query.lower()
+
+    def score(item):
+        position, product = item
+        article_hit = bool(product.article) and product.article.lower() in query_text
+        title_hits = len(words & set(tokenize(product.title or '')))
+        return (not article_hit, -title_hits, position)
+
+    return [p for _, p in sorted(enumerate(products), key=score)]
+
+class Prompt:
+    """Готовый промпт: текст, вошедшие товары и оценка размера и стоимости"""
+
+    def __init__(self, text, products, dropped, context_tokens, model, max_tokens):
+        self.text = text
+        self.products = products
+        self.dropped = dropped
+        self.context_tokens = context_tokens
+        self.tokens = count_tokens(text)
+        self.model = model
+        self.max_tokens = max_tokens
+        # False — локальный поиск ничего не нашел и в таблице образец каталога
+        self.matched = True
+        # Верхняя оценка: ответ занимает весь max_tokens
+        self.estimated_cost = estimate_cost(model, self.tokens, max_tokens)
+
+    @property
+    def articles(self):
+        return [p.article for p in self.products]
+
+    def summary(self):
+        return {
+            'tokens': self.tokens,
+            'context_tokens': self.context_tokens,
+            'rows': len(self.products),
+            'dropped': self.dropped,
+            'max_tokens': self.max_tokens,
+            'estimated_cost': round(self.estimated_cost, 6),
+        }
+
+    def report(self):
+        """Строка для лога перед отправкой"""
+        line = (f"📏 Промпт: {self.tokens} токенов, товаров {len(self.products)}, "
+                f"до ${self.estimated_cost:.6f}")
+        if self.dropped:
+            line += f" (не вошло по бюджету: {self.dropped})"
+        return line
+
+def _fill_table(products, budget):
+    """Строки таблицы в заданном порядке, пока хватает бюджета: (текст, товары, токены)"""
+    rows = [COLUMNS]
+    used = count_tokens(COLUMNS) + 1
+    selected = []
+    for product in products:
+        row = product_row(product)
+        cost = count_tokens(row) + 1  # +1 за перевод строки
+        if used + cost > budget:
+            # Строки разной длины: более короткая следующая может еще поместиться
+            continue
+        rows.append(row)
+        selected.append(product)
+        used += cost
+    return '\n'.join(rows), selected, used
+
+def _prompt_text(context, query, instructions):
+    # Контекст идет первым: у пакетных промптов общий префикс
+    return f"""Ты - помощник склада лифтовых запчастей.
+
+Товары:
+{context}
+
+Запрос: "{_cell(query)}"
+
+{instructions}"""
+
+def build_context(query, products, budget=CONTEXT_TOKEN_BUDGET):
+    """Таблица товаров в пределах бюджета: (текст, вошедшие товары, токены)"""
+    return _fill_table(rank_products(query, products), budget)
+
+def build_prompt(query, products, instructions=INSTRUCTIONS, budget=CONTEXT_TOKEN_BUDGET,
+                 model=DEFAULT_MODEL, max_tokens=400):
+    """Промпт для ИИ-поиска по отобранным товарам (внутри app_context)"""
+    context, selected, context_tokens = build_context(query, products, budget)
+    text = _prompt_text(context, query, instructions)
+    return Prompt(text, selected, len(products) - len(selected), context_tokens, model, max_tokens)
+
+def build_batch_prompts(queries, candidate_lists, instructions=INSTRUCTIONS,
+                        budget=BATCH_CONTEXT_TOKEN_BUDGET, model=DEFAULT_MODEL, max_tokens=400):
+    """Промпты для пакета запросов с одной общей таблицей товаров.
+
+    Таблица собирается один раз: кандидаты запросов берутся по очереди
+    (первый каждого, второй каждого, ...), чтобы бюджет делился поровну.
+    В Prompt.products каждого запроса — только его собственные кандидаты из таблицы.
+    """
+    ranked = [rank_products(q, c) for q, c in zip(queries, candidate_lists)]
+    order = []
+    seen = set()
+    for position in range(max((len(r) for r in ranked), default=0)):
+        for candidates in ranked:
+            if position < len(candidates) and candidates[position].id not in seen:
+                seen.add(candidates[position].id)
+                order.append(candidates[position])
+
+    context, selected, context_tokens = _fill_table(order, budget)
+    in_table = {p.id for p in selected}
+    prompts = []
+    for query, candidates in zip(queries, ranked):
+        own = [p for p in candidates if p.id in in_table]
+        prompts.append(Prompt(_prompt_text(context, query, instructions), own,
+                              len(candidates) - len(own), context_tokens, model, max_tokens))
+    return prompts
+
+def main():
+    """Показывает промпт и его оценку: python prompt_builder.py "запрос" [бюджет]"""
+    if len(sys.argv) < 2:
+        print('❌ Использование: python prompt_builder.py "запрос" [бюджет_токенов]')
+        sys.exit(1)
+
+    from warehouse_system import app
+    from semantic_search import find_candidates
+
+    query = sys.argv[1]
+    budget = int(sys.argv[2]) if len(sys.argv) > 2 else CONTEXT_TOKEN_BUDGET
+    with app.app_context():
+        prompt = build_prompt(query, find_candidates(query, limit=CANDIDATE_POOL), budget=budget)
+        print(prompt.text)
+        print()
+        print(prompt.report())
+        counter = "tiktoken" if _tokenizer is not None else "оценка по байтам"
+        print(f"🔢 Подсчет токенов: {counter}; бюджет контекста: {budget}")
+
+if __name__ == "__main__":
+    main()
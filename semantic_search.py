@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Локальный поиск по смыслу для ИИ-поиска
+BM25 по названию, описанию и характеристикам; эмбеддинги — если установлена модель
+"""
+
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+
+from article_index import title_trigrams
+
+# Модель sentence-transformers для эмбеддингов (необязательно).
+# Например: WAREHOUSE_EMBEDDING_MODEL=paraphrase-multilingual-MiniLM-L12-v2
+EMBEDDING_MODEL = os.environ.get('WAREHOUSE_EMBEDDING_MODEL', '')
+
+# Сколько товаров отдавать в контекст ИИ
+DEFAULT_TOP_K = 15
+
+# Параметры BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Терм запроса, которого нет в индексе, ищется по триграммам среди термов каталога:
+# «кнопка» (кнопк) находит «кнопочный» (кнопочн). Сходство — доля общих триграмм.
+FUZZY_MIN_SIMILARITY = 0.35
+FUZZY_MAX_TERMS = 5
+
+# Лексический поиск ничего не нашел — ИИ получает начало каталога, как до локального отбора
+FALLBACK_POOL = 50
+
+# Окончания для упрощенного стемминга русских слов (длинные первыми)
+RU_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ов', 'ев',
+    'ах', 'ях', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю', 'ия', 'ья',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь',
+], key=len, reverse=True)
+
+def tokenize(text):
+    """Разбивает текст на нормализованные термы"""
+    tokens = []
+    for word in re.findall(r'\w+', str(text or '').lower().replace('ё', 'е')):
+        if len(word) > 4 and not word.isdigit():
+            for ending in RU_ENDINGS:
+                if word.endswith(ending) and len(word) - len(ending) >= 4:
+                    word = word[:-len(ending)]
+                    break
+        tokens.append(word)
+    return tokens
+
+def product_text(product):
+    """Текст товара для индексации: артикул, название, производитель, описание, характеристики"""
+    parts = [product.article, product.title, product.manufacturer, product.category]
+    if product.description:
+        parts.append(product.description[:1000])
+    if product.specifications:
+        try:
+            specs = json.loads(product.specifications)
+            parts.extend(f"{k} {v}" for k, v in specs.items())
+        except (ValueError, AttributeError):
+            pass
+    return ' '.join(str(p) for p in parts if p)
+
+class BM25Index:
+    """Инвертированный индекс BM25 с пошаговым обновлением"""
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # терм -> {product_id: tf}
+        self._lengths = {}                  # product_id -> длина документа
+        self._terms = {}                    # product_id -> термы документа
+        self._term_trigrams = defaultdict(set)  # триграмма -> термы (для нечеткого поиска)
+        self._total_length = 0
+
+    def upsert(self, product_id, text):
+        self.remove(product_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            if term not in self._postings:
+                for trigram in title_trigrams(term):
+                    self._term_trigrams[trigram].add(term)
+            self._postings[term][product_id] = tf
+        self._terms[product_id] = list(counts)
+        self._lengths[product_id] = sum(counts.values())
+        self._total_length += self._lengths[product_id]
+
+    def remove(self, product_id):
+        for term in self._terms.pop(product_id, ()):
+            self._postings[term].pop(product_id, None)
+            if not self._postings[term]:
+                del self._postings[term]
+                for trigram in title_trigrams(term):
+                    self._term_trigrams[trigram].discard(term)
+                    if not self._term_trigrams[trigram]:
+                        del self._term_trigrams[trigram]
+        self._total_length -= self._lengths.pop(product_id, 0)
+
+    def similar_terms(self, term):
+        """Термы каталога, похожие на term по триграммам: [(терм, сходство)], лучшие первыми"""
+        trigrams = title_trigrams(term)
+        counts = Counter()
+        for trigram in trigrams:
+            counts.update(self._term_trigrams.get(trigram, ()))
+        similar = []
+        for other, shared in counts.items():
+            score = shared / (len(trigrams) + len(title_trigrams(other)) - shared)
+            if score >= FUZZY_MIN_SIMILARITY:
+                similar.append((other, score))
+        similar.sort(key=lambda item: -item[1])
+        return similar[:FUZZY_MAX_TERMS]
+
+    def search(self, query, limit):
+        """Список (product_id, score), лучшие первыми"""
+        n = len(self._lengths)
+        if not n:
+            return []
+        avg_length = self._total_length / n
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            if term in self._postings:
+                matches = [(term, 1.0)]
+            elif len(term) >= 4 and not term.isdigit():
+                # Другая форма слова: вклад похожего терма — с весом сходства
+                matches = self.similar_terms(term)
+            else:
+                continue
+            for matched, weight in matches:
+                postings = self._postings[matched]
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[product_id] / avg_length)
+                    scores[product_id] += weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+    def __len__(self):
+        return len(self._lengths)
+
+class EmbeddingIndex:
+    """Векторный индекс на sentence-transformers (если модель доступна)"""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        import numpy
+
+        self._np = numpy
+        self._model = SentenceTransformer(model_name)
+        self._vectors = {}
+
+    def _encode(self, texts):
+        return self._model.encode(texts, normalize_embeddings=True)
+
+    def upsert_many(self, items):
+        if not items:
+            return
+        ids, texts = zip(*items)
+        for product_id, vector in zip(ids, self._encode(list(texts))):
+            self._vectors[product_id] = vector
+
+    def remove(self, product_id):
+        self._vectors.pop(product_id, None)
+
+    def search(self, query, limit):
+        if not self._vectors:
+            return []
+        ids = list(self._vectors)
+        matrix = self._np.stack([self._vectors[i] for i in ids])
+        scores = matrix @ self._encode([query])[0]
+        best = self._np.argsort(-scores)[:limit]
+        return [(ids[i], float(scores[i])) for i in best]
+
+def _load_embeddings():
+    if not EMBEDDING_MODEL:
+        return None
+    try:
+        return EmbeddingIndex(EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"⚠️ Эмбеддинги недоступны ({e}), используется BM25", file=sys.stderr)
+        return None
+
+class SemanticSearch:
+    """Поиск кандидатов для ИИ: BM25 и (опционально) эмбеддинги с объединением рангов"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._bm25 = BM25Index()
+        self._embeddings = None
+        self._pending = set()
+        self._built = False
+
+    @property
+    def built(self):
+        return self._built
+
+    def build(self, products):
+        with self._lock:
+            self._bm25 = BM25Index()
+            self._embeddings = _load_embeddings()
+            self._pending.clear()
+            self._index(products)
+            self._built = True
+
+    def _index(self, products):
+        items = [(p.id, product_text(p)) for p in products]
+        for product_id, text in items:
+            self._bm25.upsert(product_id, text)
+        if self._embeddings:
+            self._embeddings.upsert_many(items)
+
+    def _remove(self, product_id):
+        self._bm25.remove(product_id)
+        if self._embeddings:
+            self._embeddings.remove(product_id)
+
+    def invalidate(self, product_ids):
+        with self._lock:
+            self._pending.update(pid for pid in product_ids if pid is not None)
+
+    def refresh(self, load_products):
+        """Переиндексирует отложенные товары; load_products(ids) -> список Product"""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return
+        products = load_products(pending)
+        with self._lock:
+            for product_id in pending:
+                self._remove(product_id)
+            self._index(products)
+
+    def search(self, query, limit=DEFAULT_TOP_K):
+        """Список id товаров, лучшие первыми"""
+        with self._lock:
+            rankings = [self._bm25.search(query, limit * 2)]
+            if self._embeddings:
+                rankings.append(self._embeddings.search(query, limit * 2))
+
+        # Reciprocal rank fusion: устойчиво к разным шкалам оценок
+        fused = defaultdict(float)
+        for ranking in rankings:
+            for rank, (product_id, _) in enumerate(ranking):
+                fused[product_id] += 1 / (60 + rank)
+        return [pid for pid, _ in sorted(fused.items(), key=lambda item: -item[1])][:limit]
+
+# Общий индекс приложения; _build_lock — чтобы одновременные первые запросы
+# не строили его дважды и не подписывались на изменения дважды
+semantic_index = SemanticSearch()
+_build_lock = threading.Lock()
+
+def _on_catalog_change(changes):
+    semantic_index.invalidate(changes['product_ids'])
+
+def _load_products(product_ids):
+    from warehouse_system import Product
+    return Product.query.filter(Product.id.in_(product_ids)).all()
+
+def ensure_index():
+    """Строит индекс при первом обращении и применяет изменения (внутри app_context)"""
+    from warehouse_system import Product, on_catalog_change
+
+    if not semantic_index.built:
+        with _build_lock:
+            if not semantic_index.built:
+                on_catalog_change(_on_catalog_change)
+                semantic_index.build(Product.query.all())
+                return semantic_index
+    semantic_index.refresh(_load_products)
+    return semantic_index
+
+def find_candidates(query, limit=DEFAULT_TOP_K):
+    """Товары, наиболее подходящие под запрос (внутри app_context), лучшие первыми"""
+    from warehouse_system import db, Product
+
+    ids = ensure_index().search(query, limit)
+    if not ids:
+        return []
+    products = Product.query.options(db.joinedload(Product.stock)) \
+        .filter(Product.id.in_(ids)).all()
+    by_id = {p.id: p for p in products}
+    return [by_id[i] for i in ids if i in by_id]
+
+def find_candidates_many(queries, limit=DEFAULT_TOP_K):
+    """Кандидаты для нескольких запросов сразу: один запрос к базе на всех.
+
+    Возвращает списки товаров в порядке queries, лучшие первыми.
+    """
+    from warehouse_system import db, Product
+
+    index = ensure_index()
+    id_lists = [index.search(query, limit) for query in queries]
+    all_ids = {i for ids in id_lists for i in ids}
+    if not all_ids:
+        return [[] for _ in queries]
+    products = Product.query.options(db.joinedload(Product.stock)) \
+        .filter(Product.id.in_(all_ids)).all()
+    by_id = {p.id: p for p in products}
+    return [[by_id[i] for i in ids if i in by_id] for ids in id_lists]
+
+def catalog_sample(limit=FALLBACK_POOL):
+    """Начало каталога для ИИ, когда локальный поиск ничего не нашел (внутри app_context)"""
+    from warehouse_system import db, Product
+
+    return Product.query.options(db.joinedload(Product.stock)).order_by(Product.id).limit(limit).all()
+
+def product_location(product):
+    """Местоположение товара зона-стеллаж-полка-ячейка или 'не указано'"""
+    stock = product.stock
+    if stock and any([stock.zone, stock.rack, stock.shelf, stock.cell]):
+        return f"{stock.zone or '-'}-{stock.rack or '-'}-{stock.shelf or '-'}-{stock.cell or '-'}"
+    return "не указано"
+
+def format_local_answer(query, products):
+    """Ответ без ИИ: список найденных товаров с количеством и местом"""
+    if not products:
+        return f"❌ По запросу '{query}' ничего не найдено"
+
+    lines = [f"📋 Найдено по запросу '{query}':", ""]
+    for p in products:
+        stock = p.stock.quantity_actual if p.stock else 0
+        lines.append(f"🏷️  {p.article}: {p.title}")
+        lines.append(f"   Производитель: {p.manufacturer or 'не указан'}, количество: {stock} шт.")
+        lines.append(f"   📍 Местоположение: {product_location(p)}")
+    return "\n".join(lines)
+
+def main():
+    if len(sys.argv) < 2:
+        print("❌ Использование: python semantic_search.py 'запрос'")
+        sys.exit(1)
+
+    from warehouse_system import app
+
+    query = " ".join(sys.argv[1:])
+    with app.app_context():
+        print(format_local_answer(query, find_candidates(query)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Загрузка остатков, мест хранения и мин/макс из CSV/XLSX (выгрузка ERP)
+Файл читается построчно (память не растет с размером), колонки сопоставляются
+по названиям или явной карте, строки проверяются и применяются порциями —
+одна транзакция на порцию. --dry-run показывает разницу без записи.
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, func
+
+CHUNK_SIZE = 5000
+LOOKUP_CHUNK = 500
+# Сколько строк разницы и ошибок возвращать в ответе (счетчики — по всем строкам)
+DIFF_LIMIT = 1000
+ERROR_LIMIT = 100
+
+TEXT_FIELDS = ('zone', 'rack', 'shelf', 'cell', 'notes')
+INT_FIELDS = ('quantity_actual', 'quantity_reserved', 'quantity_min', 'quantity_max')
+STOCK_FIELDS = TEXT_FIELDS + INT_FIELDS
+
+# Названия колонок в выгрузках -> поле (сравнение без регистра и пробелов по краям)
+COLUMN_ALIASES = {
+    'article': 'article', 'артикул': 'article', 'sku': 'article', 'код': 'article',
+    'zone': 'zone', 'зона': 'zone',
+    'rack': 'rack', 'стеллаж': 'rack',
+    'shelf': 'shelf', 'полка': 'shelf',
+    'cell': 'cell', 'ячейка': 'cell',
+    'location': 'location', 'место': 'location', 'место хранения': 'location',
+    'quantity_actual': 'quantity_actual', 'quantity': 'quantity_actual', 'qty': 'quantity_actual',
+    'остаток': 'quantity_actual', 'количество': 'quantity_actual', 'факт': 'quantity_actual',
+    'quantity_reserved': 'quantity_reserved', 'reserved': 'quantity_reserved', 'резерв': 'quantity_reserved',
+    'quantity_min': 'quantity_min', 'min': 'quantity_min', 'минимум': 'quantity_min', 'мин': 'quantity_min',
+    'quantity_max': 'quantity_max', 'max': 'quantity_max', 'максимум': 'quantity_max', 'макс': 'quantity_max',
+    'notes': 'notes', 'примечание': 'notes', 'комментарий': 'notes',
+}
+TARGETS = ('article', 'location') + STOCK_FIELDS
+
+# XLSX — необязательная зависимость (pip install openpyxl); CSV читается всегда
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+class StockImportError(ValueError):
+    """Файл нельзя загрузить целиком: нет колонки артикула, неизвестный формат и т.п."""
+
+# ========== ЧТЕНИЕ ФАЙЛА ==========
+
+def parse_mapping(value):
+    """Явная карта колонок: "Код=article, Остаток=quantity_actual" или dict"""
+    if not value:
+        return {}
+    if isinstance(value, str):
+        pairs = [part.split('=', 1) for part in re.split(r'[,;]', value) if '=' in part]
+        value = {column: field for column, field in pairs}
+    mapping = {}
+    for column, field in value.items():
+        field = field.strip()
+        if field not in TARGETS:
+            raise StockImportError(f"неизвестное поле {field}; доступны: {', '.join(TARGETS)}")
+        mapping[column.strip().lower()] = field
+    return mapping
+
+def map_columns(header, mapping=None):
+    """Индексы колонок по полям и список неузнанных колонок"""
+    mapping = mapping or {}
+    columns = {}
+    ignored = []
+    for index, name in enumerate(header):
+        key = str(name or '').strip().lower()
+        field = mapping.get(key) or COLUMN_ALIASES.get(key)
+        if field and field not in columns:
+            columns[field] = index
+        elif key:
+            ignored.append(str(name).strip())
+    if 'article' not in columns:
+        raise StockImportError("нет колонки с артикулом (article / Артикул / Код) — задайте карту колонок")
+    if len(columns) == 1:
+        raise StockImportError("кроме артикула нет ни одной известной колонки склада")
+    return columns, ignored
+
+def _csv_rows(stream, encoding):
+    text = stream if isinstance(stream, io.TextIOBase) else io.TextIOWrapper(stream, encoding=encoding, newline='')
+    # Разделитель (, ; или табуляция) — по строке заголовка
+    first = text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(itertools.chain([first], text), dialect)
+
+def _xlsx_rows(stream, sheet=None):
+    if openpyxl is None:
+        raise StockImportError("для XLSX нужен openpyxl (pip install openpyxl) или сохраните файл как CSV")
+    # read_only — строки читаются из архива по одной, без загрузки листа в память
+    book = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        worksheet = book[sheet] if sheet else book.worksheets[0]
+        for row in worksheet.iter_rows(values_only=True):
+            yield row
+    finally:
+        book.close()
+
+def iter_rows(stream, filename, mapping=None, sheet=None, encoding='utf-8-sig'):
+    """Строки файла как (номер строки, {поле: значение}); первая строка — заголовок.
+
+    Возвращает (columns, ignored, генератор строк).
+    """
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _xlsx_rows(stream, sheet)
+    elif filename.lower().endswith(('.csv', '.txt', '.tsv')):
+        rows = _csv_rows(stream, encoding)
+    else:
+        raise StockImportError("поддерживаются CSV и XLSX")
+    
+    header = next(rows, None)
+    if header is None:
+        raise StockImportError("файл пуст")
+    columns, ignored = map_columns(header, parse_mapping(mapping))
+    
+    def generate():
+        for line, row in enumerate(rows, 2):
+            values = {field: row[index] for field, index in columns.items() if index < len(row)}
+            if any(v not in (None, '') for v in values.values()):
+                yield line, values
+    return columns, ignored, generate()
+
+# ========== ПРОВЕРКА ==========
+
+def _int(value, field):
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"{field}: {value} — не целое число")
+        value = int(value)
+    if isinstance(value, str):
+        cleaned = value.replace('\xa0', '').replace(' ', '').replace(',', '.')
+        try:
+            number = float(cleaned)
+        except ValueError:
+            raise ValueError(f"{field}: «{value}» — не число")
+        if not number.is_integer():
+            raise ValueError(f"{field}: {value} — не целое число")
+        value = int(number)
+    if value < 0:
+        raise ValueError(f"{field} не может быть отрицательным")
+    return value
+
+def validate_row(values):
+    """Артикул и изменения склада из строки файла; ValueError с причиной.
+
+    Пустые ячейки не меняют поле. location «A-12-3-4» раскладывается на зону,
+    стеллаж, полку и ячейку (отдельные колонки важнее).
+    """
+    article = values.get('article')
+    if isinstance(article, float) and article.is_integer():
+        article = int(article)
+    article = str(article if article is not None else '').strip()
+    if not article:
+        raise ValueError("пустой артикул")
+    
+    changes = {}
+    location = values.get('location')
+    if location not in (None, ''):
+        parts = [p.strip() for p in str(location).split('-')]
+        for field, part in zip(('zone', 'rack', 'shelf', 'cell'), parts):
+            changes[field] = part
+    for field in TEXT_FIELDS:
+        value = values.get(field)
+        if value not in (None, ''):
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            changes[field] = str(value).strip()
+    for field in INT_FIELDS:
+        value = values.get(field)
+        if value not in (None, ''):
+            changes[field] = _int(value, field)
+    if not changes:
+        raise ValueError("нет данных склада")
+    low, high = changes.get('quantity_min'), changes.get('quantity_max')
+    if low is not None and high and low > high:
+        raise ValueError(f"минимум {low} больше максимума {high}")
+    return article, changes
+
+# ========== ПРИМЕНЕНИЕ ==========
+
+def _current_stock(articles):
+    """Текущие складские данные: артикул -> (product_id, stock id или None, {поле: значение})"""
+    from warehouse_system import db, Product, WarehouseStock
+    
+    columns = [getattr(WarehouseStock, name) for name in STOCK_FIELDS]
+    current = {}
+    for i in range(0, len(articles), LOOKUP_CHUNK):
+        chunk = articles[i:i + LOOKUP_CHUNK]
+        query = db.session.query(Product.article, Product.id, WarehouseStock.id, *columns) \
+            .outerjoin(WarehouseStock, WarehouseStock.product_id == Product.id) \
+            .filter(Product.article.in_(chunk))
+        for article, product_id, stock_id, *values in query:
+            current[article] = (product_id, stock_id, dict(zip(STOCK_FIELDS, values)))
+    return current
+
+def _defaults():
+    """Значения новой складской записи (как в модели WarehouseStock)"""
+    values = {field: 0 for field in INT_FIELDS}
+    values.update(zone='', rack='', shelf='', cell='', notes=None)
+    return values
+
+class StockImport:
+    """Применение строк порциями; счетчики и выборка разницы — в report()"""
+    
+    def __init__(self, dry_run=False, source=None):
+        self.dry_run = dry_run
+        self.reason = f"Импорт остатков: {source}" if source else "Импорт остатков"
+        self.stats = {'rows': 0, 'valid': 0, 'errors': 0, 'unknown': 0, 'duplicates': 0,
+                      'unchanged': 0, 'updated': 0, 'created_stock': 0, 'movements': 0}
+        self.errors = []
+        self.diff = []
+        self.started = datetime.now()
+        # Артикулы из прошлых порций: артикул -> (значения STOCK_FIELDS после строки,
+        # изменен ли товар, записано ли движение). Повтор в следующей порции
+        # сравнивается с ними — и в dry-run, где база не меняется
+        self._applied = {}
+        self._stock_update = None
+        self._movement_update = None
+    
+    def error(self, line, article, reason):
+        self.stats['errors'] += 1
+        if len(self.errors) < ERROR_LIMIT:
+            self.errors.append({'line': line, 'article': article, 'reason': reason})
+    
+    def apply_chunk(self, rows):
+        """rows — [(номер строки, артикул, изменения)]; одна транзакция на порцию"""
+        from warehouse_system import db, WarehouseStock, StockMovement, touch_catalog
+        
+        # Повтор артикула в файле — строки сливаются: поля из поздней строки
+        # перекрывают ранние, остальные поля ранних строк сохраняются
+        latest = {}
+        for line, article, changes in rows:
+            if article in latest:
+                self.stats['duplicates'] += 1
+                changes = dict(latest[article][1], **changes)
+            latest[article] = (line, changes)
+        current = _current_stock(list(latest))
+        
+        now = datetime.now()
+        updates, inserts, movements, movement_updates, touched = [], [], [], [], []
+        for article, (line, changes) in latest.items():
+            if article not in current:
+                self.stats['unknown'] += 1
+                self.error(line, article, "товара нет в базе")
+                continue
+            product_id, stock_id, old = current[article]
+            old = old if stock_id else _defaults()
+            previous = self._applied.get(article)
+            if previous is not None:
+                # Артикул уже был в прошлой порции — сравниваем с тем, что она записала
+                self.stats['duplicates'] += 1
+                old = dict(zip(STOCK_FIELDS, previous[0]))
+            was_updated, moved = previous[1:] if previous else (False, False)
+            # Минимум и максимум сверяются вместе с тем, что уже есть в базе
+            if 'quantity_min' in changes or 'quantity_max' in changes:
+                merged = dict(old, **changes)
+                low, high = merged['quantity_min'], merged['quantity_max']
+                if low is not None and high and low > high:
+                    self.stats['valid'] -= 1
+                    self.error(line, article, f"минимум {low} больше максимума {high}")
+                    continue
+            diff = {field: {'old': old[field], 'new': value}
+                    for field, value in changes.items() if old[field] != value}
+            row = dict(old, **changes)
+            if not diff:
+                if previous is None:
+                    self.stats['unchanged'] += 1
+                    self._applied[article] = (tuple(row[f] for f in STOCK_FIELDS), False, False)
+                continue
+            if not was_updated:
+                self.stats['updated'] += 1
+                if previous is not None:
+                    self.stats['unchanged'] -= 1
+            if len(self.diff) < DIFF_LIMIT:
+                self.diff.append({'line': line, 'article': article, 'changes': diff})
+            if 'quantity_actual' in diff:
+                delta = diff['quantity_actual']['new'] - (diff['quantity_actual']['old'] or 0)
+                if moved:
+                    # Одно движение на товар за импорт: добавляем к уже записанному
+                    movement_updates.append({'pid': product_id, 'delta': delta})
+                else:
+                    movements.append({'product_id': product_id, 'movement_type': 'correction',
+                                      'quantity': delta, 'reason': self.reason, 'created_at': self.started})
+                    moved = True
+            self._applied[article] = (tuple(row[f] for f in STOCK_FIELDS), True, moved)
+            # Все поля в каждой строке — один оператор на всю порцию (executemany)
+            counted = now if 'quantity_actual' in changes else None
+            touched.append(product_id)
+            if stock_id:
+                updates.append(dict(row, updated_at=now, pid=product_id, counted_at=counted))
+            elif was_updated:
+                # dry-run: запись создала бы прошлая порция
+                pass
+            else:
+                inserts.append(dict(row, updated_at=now, product_id=product_id, last_counted=counted))
+        
+        self.stats['created_stock'] += len(inserts)
+        self.stats['movements'] += len(movements)
+        if self.dry_run or not touched:
+            return
+        try:
+            if updates:
+                db.session.execute(self._update_statement(WarehouseStock), updates)
+            if inserts:
+                db.session.execute(WarehouseStock.__table__.insert(), inserts)
+            if movements:
+                db.session.execute(StockMovement.__table__.insert(), movements)
+            if movement_updates:
+                db.session.execute(self._movement_statement(StockMovement), movement_updates)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # Запись мимо ORM — сообщаем кэшам и индексам сами
+        touch_catalog(product_ids=touched)
+    
+    def _update_statement(self, WarehouseStock):
+        """UPDATE по product_id для executemany; дата пересчета не затирается пустой"""
+        if self._stock_update is None:
+            table = WarehouseStock.__table__
+            self._stock_update = table.update() \
+                .where(table.c.product_id == bindparam('pid')) \
+                .values(last_counted=func.coalesce(bindparam('counted_at'), table.c.last_counted))
+        return self._stock_update
+    
+    def _movement_statement(self, StockMovement):
+        """UPDATE движения этого импорта по товару: повтор артикула в следующей порции"""
+        if self._movement_update is None:
+            table = StockMovement.__table__
+            self._movement_update = table.update() \
+                .where(table.c.product_id == bindparam('pid'),
+                       table.c.movement_type == 'correction',
+                       table.c.reason == self.reason,
+                       table.c.created_at == self.started) \
+                .values(quantity=table.c.quantity + bindparam('delta'))
+        return self._movement_update
+    
+    def report(self, elapsed):
+        stats = dict(self.stats, dry_run=self.dry_run, elapsed_s=round(elapsed, 2))
+        stats['rows_per_s'] = round(stats['rows'] / elapsed) if elapsed else None
+        return {'stats': stats, 'errors': self.errors, 'diff': self.diff}
+
+def import_stock(stream, filename, mapping=None, sheet=None, dry_run=False, encoding='utf-8-sig',
+                 chunk_size=CHUNK_SIZE, progress=None):
+    """Загружает остатки из потока файла; возвращает отчет (stats, errors, diff, columns).
+
+    Внутри app_context. StockImportError — если файл нельзя загрузить целиком;
+    ошибки отдельных строк — в отчете, остальные строки применяются.
+    """
+    start = time.perf_counter()
+    columns, ignored, rows = iter_rows(stream, filename, mapping, sheet, encoding)
+    job = StockImport(dry_run=dry_run, source=os.path.basename(filename))
+    
+    chunk = []
+    for line, values in rows:
+        job.stats['rows'] += 1
+        try:
+            article, changes = validate_row(values)
+        except ValueError as e:
+            job.error(line, values.get('article'), str(e))
+            continue
+        job.stats['valid'] += 1
+        chunk.append((line, article, changes))
+        if len(chunk) >= chunk_size:
+            job.apply_chunk(chunk)
+            chunk = []
+            if progress:
+                progress(job.stats)
+    if chunk:
+        job.apply_chunk(chunk)
+    
+    report = job.report(time.perf_counter() - start)
+    report['columns'] = sorted(columns, key=columns.get)
+    report['ignored_columns'] = ignored
+    return report
+
+# ========== КОМАНДНАЯ СТРОКА ==========
+
+def benchmark(rows=100000):
+    """Замер на синтетическом CSV (товары BENCH-*, создаются и удаляются)"""
+    from warehouse_system import app, db, Product, WarehouseStock, StockMovement
+    
+    with app.app_context():
+        start = time.perf_counter()
+        db.session.execute(Product.__table__.insert(), [
+            {'article': f"BENCH-{i:07d}", 'title': f"Тестовый товар {i}"} for i in range(rows)])
+        db.session.commit()
+        print(f"⏱️ Подготовка {rows} товаров: {time.perf_counter() - start:.1f} с")
+        
+        data = io.StringIO()
+        data.write("Артикул;Остаток;Мин;Макс;Место\n")
+        for i in range(rows):
+            data.write(f"BENCH-{i:07d};{i % 50};5;{60 + i % 7};A-{i % 20}-{i % 5}-{i % 9}\n")
+        data.seek(0)
+        try:
+            for dry_run in (True, False):
+                data.seek(0)
+                report = import_stock(data, 'bench.csv', dry_run=dry_run)
+                stats = report['stats']
+                print(f"⏱️ {'dry-run' if dry_run else 'запись  '}: {stats['rows']} строк за "
+                      f"{stats['elapsed_s']} с — {stats['rows_per_s']:,} строк/с")
+        finally:
+            ids = db.session.query(Product.id).filter(Product.article.like('BENCH-%')).subquery()
+            db.session.query(StockMovement).filter(StockMovement.product_id.in_(db.select(ids))) \
+                .delete(synchronize_session=False)
+            db.session.query(WarehouseStock).filter(WarehouseStock.product_id.in_(db.select(ids))) \
+                .delete(synchronize_session=False)
+            db.session.query(Product).filter(Product.article.like('BENCH-%')).delete(synchronize_session=False)
+            db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка остатков, мест и мин/макс из CSV/XLSX")
+    parser.add_argument("file", nargs="?", help="CSV или XLSX, первая строка — заголовок")
+    parser.add_argument("--map", default=None, help='карта колонок: "Код=article,Остаток=quantity_actual"')
+    parser.add_argument("--sheet", default=None, help="лист XLSX (по умолчанию первый)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="кодировка CSV (выгрузки 1С: cp1251)")
+    parser.add_argument("--dry-run", action="store_true", help="только показать разницу, без записи")
+    parser.add_argument("--diff-out", default=None, help="сохранить отчет с разницей в JSON")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="замер на N синтетических строках")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return 0
+    if not args.file:
+        parser.print_help()
+        return 1
+    
+    from warehouse_system import app
+    
+    def progress(stats):
+        print(f"   … {stats['rows']} строк, изменено {stats['updated']}, ошибок {stats['errors']}")
+    
+    with app.app_context(), open(args.file, 'rb') as f:
+        try:
+            report = import_stock(f, args.file, mapping=args.map, sheet=args.sheet,
+                                  dry_run=args.dry_run, encoding=args.encoding, progress=progress)
+        except StockImportError as e:
+            print(f"❌ {e}")
+            return 1
+    
+    stats = report['stats']
+    for item in report['diff'][:20]:
+        changes = ", ".join(f"{k}: {v['old']} → {v['new']}" for k, v in item['changes'].items())
+        print(f"   🔄 {item['article']}: {changes}")
+    if len(report['diff']) > 20:
+        print(f"   … и еще {stats['updated'] - 20}")
+    for error in report['errors'][:20]:
+        print(f"   ❌ строка {error['line']} ({error['article']}): {error['reason']}")
+    
+    print("=" * 70)
+    print(f"📦 Колонки: {', '.join(report['columns'])}"
+          + (f"; пропущены: {', '.join(report['ignored_columns'])}" if report['ignored_columns'] else ""))
+    print(f"{'🔍 Проверка (без записи)' if args.dry_run else '✅ Загружено'}: строк {stats['rows']}, "
+          f"изменений {stats['updated']}, без изменений {stats['unchanged']}, "
+          f"нет в базе {stats['unknown']}, ошибок {stats['errors']}")
+    print(f"⏱️ {stats['elapsed_s']} с ({stats['rows_per_s'] or 0:,} строк/с)")
+    if args.diff_out:
+        with open(args.diff_out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        print(f"📄 Отчет: {args.diff_out}")
+    return 0 if not stats['errors'] else 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Запросы остатков склада — общие для REST API и MCP сервера
+Доступно = факт − резерв; низкий остаток и «нет в наличии» считаются по доступному
+"""
+
+import sys
+import threading
+
+# Размер страницы списков остатков по умолчанию и максимум
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Индексы под запросы остатков: частичный — для «ниже минимума»,
+# по выражению — для «нет в наличии». Условия совпадают с запросами ниже
+# дословно, иначе SQLite не применит частичный индекс.
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_stock_low ON warehouse_stock (product_id) "
+    "WHERE quantity_min > 0 AND quantity_actual - quantity_reserved < quantity_min",
+    "CREATE INDEX IF NOT EXISTS ix_warehouse_stock_available "
+    "ON warehouse_stock (quantity_actual - quantity_reserved)",
+)
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+def ensure_indexes():
+    """Создает индексы остатков в существующей базе (один раз за процесс)"""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    from warehouse_system import db
+    with _indexes_lock:
+        if _indexes_ready:
+            return
+        with db.engine.begin() as conn:
+            for statement in INDEXES:
+                conn.exec_driver_sql(statement)
+        _indexes_ready = True
+
+def available_expr():
+    """Доступное количество: факт минус резерв"""
+    from warehouse_system import WarehouseStock
+    return WarehouseStock.quantity_actual - WarehouseStock.quantity_reserved
+
+def low_stock_filter():
+    """Условие «ниже минимума» (как в /api/stats); 0 — литерал ради частичного индекса"""
+    from warehouse_system import db, WarehouseStock
+    return db.and_(
+        WarehouseStock.quantity_min > db.literal_column('0'),
+        available_expr() < WarehouseStock.quantity_min
+    )
+
+def out_of_stock_filter():
+    """Условие «нет в наличии»: доступно 0 или меньше"""
+    return available_expr() <= 0
+
+def clamp_page(limit=None, offset=None):
+    """Границы страницы: limit в 1..MAX_LIMIT, offset не меньше 0"""
+    limit = DEFAULT_LIMIT if limit is None else int(limit)
+    offset = 0 if offset is None else int(offset)
+    return max(1, min(limit, MAX_LIMIT)), max(0, offset)
+
+def stock_stats():
+    """Сводка склада одним проходом по остаткам (внутри app_context)"""
+    ensure_indexes()
+    from warehouse_system import db, Product, WarehouseStock
+    
+    def count_where(condition):
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+    
+    units, reserved, low, out = db.session.query(
+        db.func.coalesce(db.func.sum(WarehouseStock.quantity_actual), 0),
+        db.func.coalesce(db.func.sum(WarehouseStock.quantity_reserved), 0),
+        count_where(low_stock_filter()),
+        count_where(out_of_stock_filter())
+    ).select_from(WarehouseStock).join(Product).one()
+    
+    return {
+        'products': Product.query.count(),
+        'units': int(units),
+        'reserved': int(reserved),
+        'low_stock': int(low),
+        'out_of_stock': int(out),
+    }
+
+def _page(condition, order_by, limit, offset):
+    """Страница товаров по условию на остатки: (всего, товары, limit, offset)"""
+    ensure_indexes()
+    from warehouse_system import db, Product, WarehouseStock
+    limit, offset = clamp_page(limit, offset)
+    
+    query = Product.query.join(WarehouseStock).filter(condition)
+    total = query.count()
+    products = query.options(db.contains_eager(Product.stock)) \
+        .order_by(*order_by, Product.article).offset(offset).limit(limit).all()
+    return total, products, limit, offset
+
+def page_info(total, count, limit, offset):
+    """Поля пагинации ответа; next_offset — None на последней странице"""
+    next_offset = offset + count if offset + count < total else None
+    return {'total': total, 'offset': offset, 'limit': limit, 'next_offset': next_offset}
+
+def low_stock(limit=None, offset=None):
+    """Товары ниже минимума, сначала с наибольшей нехваткой.
+
+    Возвращает (товары, поля пагинации); товары загружены вместе с остатками.
+    """
+    from warehouse_system import WarehouseStock
+    deficit = WarehouseStock.quantity_min - available_expr()
+    total, products, limit, offset = _page(low_stock_filter(), [deficit.desc()], limit, offset)
+    return products, page_info(total, len(products), limit, offset)
+
+def out_of_stock(limit=None, offset=None):
+    """Товары без доступного остатка; возвращает (товары, поля пагинации)"""
+    total, products, limit, offset = _page(out_of_stock_filter(), [], limit, offset)
+    return products, page_info(total, len(products), limit, offset)
+
+def main():
+    """Сводка и первая страница нехватки: python stock_queries.py [limit]"""
+    from warehouse_system import app
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with app.app_context():
+        stats = stock_stats()
+        print(f"📊 Товаров: {stats['products']}, единиц: {stats['units']} (в резерве {stats['reserved']})")
+        print(f"⚠️ Ниже минимума: {stats['low_stock']}, ❌ нет в наличии: {stats['out_of_stock']}")
+        products, page = low_stock(limit=limit)
+        for p in products:
+            available = p.stock.quantity_actual - p.stock.quantity_reserved
+            print(f"  {p.article}: {p.title[:50]} — доступно {available} из мин. {p.stock.quantity_min}")
+        if page['next_offset'] is not None:
+            print(f"  … еще {page['total'] - page['next_offset']}")
+
+if __name__ == "__main__":
+    main()
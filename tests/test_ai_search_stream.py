@@ -0,0 +1,100 @@
+"""
+Потоковый ИИ-поиск против локальной заглушки OpenRouter (llm_stub_server.py)
+База склада не нужна: промпт подставляется вместо локального отбора товаров
+"""
+
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# Сначала приложение: оно само импортирует и регистрирует ai_search_api
+from warehouse_system import app
+import ai_search_api
+from ai_search_cache import AISearchCache
+from llm_client import LLMClient, DEFAULT_MODEL
+from llm_stub_server import StubHandler
+from prompt_builder import Prompt
+
+WORD_DELAY = 0.05
+# Таблица из трех длинных строк: ответ заглушки — около 60 слов, ~3 с потока
+PROMPT_TEXT = "Товары:\nартикул|название|остаток|место\n" + "\n".join(
+    f"{2490 + i}|" + " ".join(f"деталь{i}-{n}" for n in range(20)) + "|5|A-1-1-1" for i in range(3)
+) + '\n\nЗапрос: "кнопка"'
+
+class RecordingHandler(StubHandler):
+    """Заглушка, которая отмечает конец обработки запроса"""
+    delay = WORD_DELAY
+
+    def do_POST(self):
+        try:
+            super().do_POST()
+        finally:
+            self.server.finished.set()
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+    server.finished = threading.Event()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def llm(stub):
+    return LLMClient(api_key='test', base_url=f"http://127.0.0.1:{stub.server_address[1]}/v1")
+
+@pytest.fixture
+def client(llm, monkeypatch):
+    """Тестовый клиент Flask; ИИ — заглушка, кэш ответов — в памяти"""
+    prompt = Prompt(PROMPT_TEXT, [], 0, 0, DEFAULT_MODEL, 400)
+    monkeypatch.setattr(ai_search_api, 'get_client', lambda: llm)
+    monkeypatch.setattr(ai_search_api, 'get_cache', lambda: AISearchCache(':memory:'))
+    monkeypatch.setattr(ai_search_api, '_prepare_search', lambda query: (None, ('test|' + query, prompt)))
+    return app.test_client()
+
+def _events(chunks):
+    for chunk in chunks:
+        for block in chunk.decode('utf-8').split('\n\n'):
+            if block.startswith('data: '):
+                yield json.loads(block[len('data: '):])
+
+def test_stream_sends_tokens_and_done(client, llm):
+    response = client.post('/api/ai-search/stream', json={'query': 'кнопка'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = list(_events([response.data]))
+    assert events[0]['type'] == 'start'
+    tokens = [e['text'] for e in events if e['type'] == 'token']
+    assert len(tokens) > 10
+    assert ''.join(tokens).startswith('Подходящие товары:')
+
+    done = events[-1]
+    assert done['type'] == 'done'
+    assert done['cached'] is False
+    assert done['tokens'] > 0
+    assert done['cost'] > 0
+    assert done['first_token_ms'] is not None
+    assert llm.metrics()['calls'] == 1
+    assert llm.metrics()['cancelled'] == 0
+
+def test_client_disconnect_stops_upstream(client, llm, stub):
+    response = client.post('/api/ai-search/stream', json={'query': 'кнопка'}, buffered=False)
+    chunks = iter(response.response)
+    events = _events(chunks)
+    assert next(events)['type'] == 'start'
+    assert next(events)['type'] == 'token'
+
+    started = time.perf_counter()
+    response.close()
+
+    # Полный ответ шел бы ~3 с; после обрыва заглушка получает ошибку записи
+    # на следующем слове и заканчивает обработку
+    assert stub.finished.wait(timeout=1.5)
+    assert time.perf_counter() - started < 1.5
+    # Поток закрыт явно (LLMStream.close), а не сборщиком мусора
+    assert llm.metrics()['cancelled'] == 1
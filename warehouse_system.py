@@ -7,12 +7,22 @@
 
 from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from datetime import datetime
 import json
 import os
 import re
+import sys
+import threading
+import time
 from urllib.parse import urlparse
 
+# При запуске как скрипт модули проекта импортируют warehouse_system —
+# отдаем им этот же модуль, а не вторую копию приложения и базы
+if __name__ == '__main__':
+    sys.modules.setdefault('warehouse_system', sys.modules[__name__])
+
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///warehouse.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -79,6 +89,8 @@ class Product(db.Model):
         
         if include_images:
             data['images'] = [img.image_url for img in self.images]
+            # Миниатюра для списка: локальная копия, пока фото не скачано — исходный адрес
+            data['thumbnail'] = self.images[0].local_url(160) if self.images else None
         
         return data
 
@@ -126,7 +138,16 @@ class ProductImage(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
     image_url = db.Column(db.String(500))
     is_main = db.Column(db.Boolean, default=False)
-    filename = db.Column(db.String(200))
+    filename = db.Column(db.String(200))  # Копия в instance/images (image_mirror.py)
+    
+    def local_url(self, size=None):
+        """Адрес локальной копии (WebP-миниатюры size px) или исходный URL, пока фото не скачано"""
+        if not self.filename:
+            return self.image_url
+        if size:
+            from image_mirror import thumbnail_name
+            return f"/images/{thumbnail_name(self.filename, size)}"
+        return f"/images/{self.filename}"
 
 class StockMovement(db.Model):
     """Движение товаров (приход/расход)"""
@@ -150,6 +171,95 @@ class Category(db.Model):
     
     children = db.relationship('Category', backref=db.backref('parent', remote_side=[id]))
 
+# ========== ВЕРСИЯ КАТАЛОГА ==========
+# Любая запись товара, склада или фото увеличивает версию каталога.
+# Кэши и индексы сверяют версию и подписываются на изменения через on_catalog_change.
+# Версия видит только записи этого процесса; записи других процессов (импорт из
+# CLI, MCP-сервер) ловит отпечаток из базы — catalog_fingerprint().
+
+CATALOG_REVALIDATE_SECONDS = float(os.environ.get('CATALOG_REVALIDATE', 5))
+
+_catalog_lock = threading.Lock()
+_catalog_state = {'version': 0}
+_catalog_listeners = []
+_fingerprint = {'value': None, 'version': None, 'checked': 0.0}
+
+def catalog_version():
+    """Текущая версия каталога (растет при каждой записи)"""
+    return _catalog_state['version']
+
+def catalog_fingerprint():
+    """Отпечаток каталога из базы: число строк и последнее updated_at товаров и остатков.
+
+    Пересчитывается, если каталог менялся в этом процессе, и не реже раза
+    в CATALOG_REVALIDATE_SECONDS — тогда видны и записи других процессов.
+    Вызывается внутри app_context.
+    """
+    now = time.monotonic()
+    version = catalog_version()
+    with _catalog_lock:
+        if _fingerprint['version'] == version and now - _fingerprint['checked'] < CATALOG_REVALIDATE_SECONDS:
+            return _fingerprint['value']
+    
+    products = db.session.query(db.func.count(Product.id), db.func.max(Product.updated_at)).one()
+    stock = db.session.query(db.func.count(WarehouseStock.id), db.func.max(WarehouseStock.updated_at)).one()
+    value = f"{products[0]}.{products[1]}.{stock[0]}.{stock[1]}"
+    with _catalog_lock:
+        _fingerprint.update(value=value, version=version, checked=now)
+    return value
+
+def on_catalog_change(callback):
+    """Подписка на изменения каталога.
+
+    callback(changes) вызывается после commit, changes — словарь:
+    product_ids (затронутые id), articles (их артикулы, если известны),
+    deleted_articles (артикулы удаленных товаров).
+    """
+    _catalog_listeners.append(callback)
+    return callback
+
+def touch_catalog(product_ids=(), articles=(), deleted_articles=()):
+    """Сообщает об изменении каталога (для массовых записей мимо ORM)"""
+    changes = {
+        'product_ids': set(product_ids),
+        'articles': set(articles),
+        'deleted_articles': set(deleted_articles),
+    }
+    with _catalog_lock:
+        _catalog_state['version'] += 1
+    for callback in list(_catalog_listeners):
+        try:
+            callback(changes)
+        except Exception as e:
+            print(f"⚠️ Ошибка обработчика изменений каталога: {e}")
+
+@event.listens_for(Session, 'after_flush')
+def _collect_catalog_changes(session, flush_context):
+    """Запоминает затронутые товары до commit"""
+    pending = session.info.setdefault('catalog_changes', {
+        'product_ids': set(), 'articles': set(), 'deleted_articles': set()
+    })
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Product):
+            pending['product_ids'].add(obj.id)
+            if obj in session.deleted:
+                pending['deleted_articles'].add(obj.article)
+            else:
+                pending['articles'].add(obj.article)
+        elif isinstance(obj, (WarehouseStock, ProductImage)):
+            if obj.product_id is not None:
+                pending['product_ids'].add(obj.product_id)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_catalog_changes(session):
+    pending = session.info.pop('catalog_changes', None)
+    if pending:
+        touch_catalog(**pending)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_changes(session):
+    session.info.pop('catalog_changes', None)
+
 # ========== API МАРШРУТЫ ==========
 
 @app.route('/')
@@ -157,42 +267,76 @@ def index():
     """Главная страница"""
     return render_template('warehouse_dashboard.html')
 
+def filter_products(query, args):
+    """Применяет к запросу товаров фильтры из параметров запроса.
+
+    Поддерживает zone, manufacturer, category, low_stock=true,
+    stock_status (ok/low/out/none) и search. «Заканчивается» и «нет в
+    наличии» — те же условия, что в /api/stats и /api/stock/low
+    (товар ниже минимума с нулевым остатком попадает в оба).
+    """
+    from stock_queries import low_stock_filter, out_of_stock_filter
+    
+    zone = args.get('zone')
+    manufacturer = args.get('manufacturer')
+    category = args.get('category')
+    stock_status = args.get('stock_status')
+    low_stock = str(args.get('low_stock', '')).lower() == 'true'
+    search = (args.get('search') or '').strip()
+    
+    if stock_status == 'none':
+        # Товары без складской записи; вместе с zone или low_stock — пустой результат
+        query = query.outerjoin(WarehouseStock).filter(WarehouseStock.id.is_(None))
+    elif zone or low_stock or stock_status in ('ok', 'low', 'out'):
+        query = query.join(WarehouseStock)
+    
+    # Фильтр по зоне
+    if zone:
+        query = query.filter(WarehouseStock.zone == zone)
+    
+    # Фильтр по производителю
+    if manufacturer:
+        query = query.filter(Product.manufacturer == manufacturer)
+    
+    # Фильтр по категории
+    if category:
+        query = query.filter(Product.category == category)
+    
+    # Фильтр по остатку
+    if low_stock or stock_status == 'low':
+        query = query.filter(low_stock_filter())
+    if stock_status == 'out':
+        query = query.filter(out_of_stock_filter())
+    elif stock_status == 'ok':
+        query = query.filter(db.not_(db.or_(low_stock_filter(), out_of_stock_filter())))
+    
+    # Поиск
+    if search:
+        query = query.filter(db.or_(
+            Product.article.ilike(f'%{search}%'),
+            Product.title.ilike(f'%{search}%'),
+            Product.manufacturer.ilike(f'%{search}%')
+        ))
+    
+    return query
+
+def stock_status_expr():
+    """SQL-выражение статуса остатка для выгрузок: out / low / ok (одно значение на товар)"""
+    from stock_queries import low_stock_filter, out_of_stock_filter
+    return db.case(
+        (out_of_stock_filter(), 'out'),
+        (low_stock_filter(), 'low'),
+        else_='ok'
+    )
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     """Получить список товаров с пагинацией и фильтрами"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
-        zone = request.args.get('zone')
-        manufacturer = request.args.get('manufacturer')
-        low_stock = request.args.get('low_stock', type=lambda x: x.lower() == 'true')
-        search = request.args.get('search', '').strip()
-        
-        query = Product.query
-        
-        # Фильтр по зоне
-        if zone:
-            query = query.join(WarehouseStock).filter(WarehouseStock.zone == zone)
-        
-        # Фильтр по производителю
-        if manufacturer:
-            query = query.filter(Product.manufacturer == manufacturer)
-        
-        # Фильтр по низким остаткам
-        if low_stock:
-            query = query.join(WarehouseStock).filter(
-                (WarehouseStock.quantity_actual - WarehouseStock.quantity_reserved) < WarehouseStock.quantity_min,
-                WarehouseStock.quantity_min > 0
-            )
         
-        # Поиск
-        if search:
-            search_filter = db.or_(
-                Product.article.ilike(f'%{search}%'),
-                Product.title.ilike(f'%{search}%'),
-                Product.manufacturer.ilike(f'%{search}%')
-            )
-            query = query.filter(search_filter)
+        query = filter_products(Product.query, request.args)
         
         # Сортировка по артикулу
         query = query.order_by(Product.article)
@@ -209,7 +353,106 @@ def get_products():
             'has_next': products.has_next,
             'has_prev': products.has_prev
         })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ========== ФАСЕТЫ ==========
+# Счетчики по значениям фильтров. Результат кэшируется по набору фильтров
+# и отпечатку каталога: сбрасывается при записи в этом процессе и не позже
+# CATALOG_REVALIDATE_SECONDS после записи другого процесса.
+
+FACET_PARAMS = ('zone', 'manufacturer', 'category', 'stock_status', 'low_stock', 'search')
+FACET_CACHE_SIZE = 256
+_facet_cache = {}
+
+@on_catalog_change
+def _clear_facet_cache(changes):
+    _facet_cache.clear()
+
+def _without(args, *names):
+    """Параметры фильтров без фильтров самого фасета"""
+    return {name: args.get(name) for name in FACET_PARAMS if name not in names}
+
+def compute_facets(args, spec_keys_limit=20):
+    """Считает фасеты для набора фильтров сгруппированными запросами.
+
+    Каждый фасет считается без своего фильтра: выбранная зона не прячет
+    остальные зоны из списка.
+    """
+    from stock_queries import low_stock_filter, out_of_stock_filter
+    
+    def ids(*exclude):
+        filtered = filter_products(db.session.query(Product.id), _without(args, *exclude)).subquery()
+        return db.select(filtered.c.id)
+    
+    def grouped(column, exclude, join_stock=False):
+        q = db.session.query(column, db.func.count()).select_from(Product)
+        if join_stock:
+            q = q.join(WarehouseStock)
+        q = q.filter(Product.id.in_(ids(exclude)))
+        rows = q.group_by(column).order_by(db.func.count().desc()).all()
+        return [{'value': value, 'count': count} for value, count in rows if value]
+    
+    # Статус остатка — те же условия, что в /api/stats; low и out пересекаются
+    def count_where(condition):
+        return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+    
+    status_ids = ids('stock_status', 'low_stock')
+    low, out, ok, with_stock = db.session.query(
+        count_where(low_stock_filter()),
+        count_where(out_of_stock_filter()),
+        count_where(db.not_(db.or_(low_stock_filter(), out_of_stock_filter()))),
+        db.func.count()
+    ).select_from(Product).join(WarehouseStock).filter(Product.id.in_(status_ids)).one()
+    status_total = db.session.query(db.func.count(Product.id)).filter(Product.id.in_(status_ids)).scalar() or 0
+    stock_status = {'ok': int(ok), 'low': int(low), 'out': int(out), 'none': status_total - with_stock}
+    
+    filtered = filter_products(db.session.query(Product.id), args).subquery()
+    total = db.session.query(db.func.count()).select_from(filtered).scalar() or 0
+    
+    # Ключи характеристик (JSON) разворачиваем через json_each в SQLite
+    valid_specs = db.case((db.func.json_valid(Product.specifications), Product.specifications), else_='{}')
+    spec = db.func.json_each(valid_specs).table_valued('key')
+    spec_rows = db.session.query(spec.c.key, db.func.count()) \
+        .select_from(Product).join(spec, db.true()) \
+        .filter(Product.id.in_(db.select(filtered.c.id))) \
+        .group_by(spec.c.key) \
+        .order_by(db.func.count().desc(), spec.c.key) \
+        .limit(spec_keys_limit).all()
+    
+    return {
+        'total': total,
+        'manufacturer': grouped(Product.manufacturer, 'manufacturer'),
+        'category': grouped(Product.category, 'category'),
+        'zone': grouped(WarehouseStock.zone, 'zone', join_stock=True),
+        'stock_status': stock_status,
+        'spec_keys': [{'value': key, 'count': count} for key, count in spec_rows],
+    }
+
+@app.route('/api/products/facets', methods=['GET'])
+def get_facets():
+    """Счетчики по производителям, категориям, зонам, статусам и характеристикам"""
+    try:
+        spec_keys_limit = max(1, min(request.args.get('spec_keys', 20, type=int), 100))
+        key = (catalog_fingerprint(), spec_keys_limit) + tuple(
+            (name, request.args.get(name, '').strip()) for name in FACET_PARAMS
+        )
+        
+        facets = _facet_cache.get(key)
+        cached = facets is not None
+        if not cached:
+            facets = compute_facets(request.args, spec_keys_limit)
+            if len(_facet_cache) >= FACET_CACHE_SIZE:
+                _facet_cache.clear()
+            _facet_cache[key] = facets
         
+        return jsonify({
+            'success': True,
+            'facets': facets,
+            'cached': cached
+        })
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -225,7 +468,7 @@ def get_product(article):
             'success': True,
             'product': product.to_dict(include_stock=True, include_images=True)
         })
-        
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -266,7 +509,8 @@ def add_product():
         db.session.flush()  # Получаем ID
         
         # Добавляем изображения
-        for i, img_url in enumerate(data.get('images', [])[:10]):
+        from image_dedupe import unique_images
+        for i, img_url in enumerate(unique_images(data.get('images', []), limit=10)):
             image = ProductImage(
                 product_id=product.id,
                 image_url=img_url,
@@ -297,7 +541,7 @@ def add_product():
             'message': 'Товар успешно добавлен',
             'product': product.to_dict()
         }), 201
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -345,7 +589,7 @@ def update_stock(article):
             'message': 'Складские данные обновлены',
             'product': product.to_dict()
         })
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -370,7 +614,28 @@ def search_products():
             'success': True,
             'items': [p.to_dict() for p in products]
         })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/products/suggest', methods=['GET'])
+def suggest_products():
+    """Подсказки с опечатками: артикулы по расстоянию редактирования, названия по триграммам"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': True, 'items': []})
         
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        max_distance = min(request.args.get('max_distance', 2, type=int), 2)
+        expand = request.args.get('expand', '').lower() in ('1', 'true', 'yes')
+        
+        from article_index import suggest
+        return jsonify({
+            'success': True,
+            'items': suggest(query, limit=limit, max_distance=max_distance, expand=expand)
+        })
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -378,21 +643,9 @@ def search_products():
 def get_stats():
     """Статистика склада"""
     try:
-        total_products = Product.query.count()
-        
-        # Товары с низким остатком
-        low_stock = db.session.query(Product).join(WarehouseStock).filter(
-            (WarehouseStock.quantity_actual - WarehouseStock.quantity_reserved) < WarehouseStock.quantity_min,
-            WarehouseStock.quantity_min > 0
-        ).count()
-        
-        # Отсутствующие товары
-        out_of_stock = db.session.query(Product).join(WarehouseStock).filter(
-            (WarehouseStock.quantity_actual - WarehouseStock.quantity_reserved) <= 0
-        ).count()
-        
-        # Всего единиц
-        total_items = db.session.query(db.func.sum(WarehouseStock.quantity_actual)).scalar() or 0
+        # Остатки — общий с MCP сервером запрос (доступно = факт − резерв)
+        from stock_queries import stock_stats
+        stats = stock_stats()
         
         # Зоны склада
         zones = db.session.query(WarehouseStock.zone).distinct().all()
@@ -404,15 +657,64 @@ def get_stats():
         
         return jsonify({
             'success': True,
-            'total_products': total_products,
-            'low_stock': low_stock,
-            'out_of_stock': out_of_stock,
-            'total_items': int(total_items),
+            'total_products': stats['products'],
+            'low_stock': stats['low_stock'],
+            'out_of_stock': stats['out_of_stock'],
+            'total_items': stats['units'],
+            'reserved_items': stats['reserved'],
             'zones': zones_list,
             'manufacturers': manufacturers_list
         })
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/stock/low', methods=['GET'])
+def get_low_stock():
+    """Товары ниже минимума постранично: limit (до 200), offset; status=out — нет в наличии"""
+    try:
+        from stock_queries import low_stock, out_of_stock
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', type=int)
+        
+        if request.args.get('status') == 'out':
+            products, page = out_of_stock(limit=limit, offset=offset)
+        else:
+            products, page = low_stock(limit=limit, offset=offset)
+        
+        return jsonify(dict(
+            success=True,
+            items=[p.to_dict(include_images=False) for p in products],
+            **page
+        ))
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/stock/import', methods=['POST'])
+def import_stock_file():
+    """Остатки, места и мин/макс из CSV/XLSX (multipart: file; map, sheet, encoding, dry_run)"""
+    try:
+        from stock_import import import_stock, StockImportError
+        
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'success': False, 'error': 'Не передан файл (поле file)'}), 400
+        dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'yes')
         
+        try:
+            report = import_stock(upload.stream, upload.filename,
+                                  mapping=request.form.get('map'),
+                                  sheet=request.form.get('sheet'),
+                                  encoding=request.form.get('encoding') or 'utf-8-sig',
+                                  dry_run=dry_run)
+        except (StockImportError, UnicodeDecodeError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify(dict(success=True, **report))
+    
     except Exception as e:
+        db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/products/<article>', methods=['DELETE'])
@@ -430,7 +732,7 @@ def delete_product(article):
             'success': True,
             'message': f'Товар {article} удален'
         })
-        
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -453,7 +755,19 @@ def export_json():
             json.dump(data, f, ensure_ascii=False, indent=2)
         
         return send_file(filepath, as_attachment=True, download_name=filename)
-        
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/export/<fmt>', methods=['GET'])
+def export_products(fmt):
+    """Выгрузка csv / xlsx / parquet: фильтры как у /api/products, columns=article,title,..."""
+    try:
+        from product_export import export_response
+        return export_response(fmt, request.args)
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -461,13 +775,27 @@ def export_json():
 
 @app.route('/api/import/snablift', methods=['POST'])
 def import_from_snablift():
-    """Импорт товара с snab-lift.ru"""
+    """Импорт товара с snab-lift.ru.
+    
+    mode: skip (по умолчанию, существующий товар — 409), upsert (создать или обновить),
+    refresh_fields (только обновить существующий); fields — какие поля обновлять.
+    Складские остатки существующего товара не меняются.
+    """
     try:
+        from ingest import ingest_product, parse_fields, MODES
+        
         data = request.get_json()
         query = data.get('query', '').strip()
+        mode = data.get('mode', 'skip')
         
         if not query:
             return jsonify({'success': False, 'error': 'Укажите артикул или URL'}), 400
+        if mode not in MODES:
+            return jsonify({'success': False, 'error': f"mode: {'|'.join(MODES)}"}), 400
+        try:
+            fields = parse_fields(data.get('fields'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Импортируем парсер
         from warehouse_card import create_driver, parse_product_page, is_url, find_product_by_article
@@ -486,69 +814,62 @@ def import_from_snablift():
             # Парсим товар
             product_data = parse_product_page(driver, product_url)
             
-            # Проверяем, нет ли уже такого товара
-            existing = Product.query.filter_by(article=product_data['article']).first()
-            if existing:
+            # Записываем товар, фото и складскую запись одной транзакцией
+            product_id, status, changes = ingest_product(product_data, mode=mode, fields=fields)
+            if status == 'missing':
+                return jsonify({
+                    'success': False,
+                    'error': f'Товара {product_data["article"]} нет в базе (refresh_fields только обновляет)'
+                }), 404
+            product = db.session.get(Product, product_id)
+            if status == 'skipped':
                 return jsonify({
                     'success': False,
-                    'error': f'Товар {product_data["article"]} уже существует в базе',
-                    'existing_product': existing.to_dict()
+                    'error': f'Товар {product_data["article"]} уже существует в базе (обновить: mode=upsert)',
+                    'existing_product': product.to_dict()
                 }), 409
             
-            # Создаем товар в базе
-            product = Product(
-                article=product_data['article'],
-                title=product_data['title'],
-                manufacturer=product_data.get('manufacturer'),
-                category=product_data.get('category'),
-                price=product_data.get('price'),
-                description=product_data.get('description'),
-                url=product_data['url'],
-                weight=product_data.get('weight'),
-                dimensions=', '.join([f"{k}: {v}" for k, v in product_data.get('dimensions', {}).items()]),
-                specifications=json.dumps(product_data.get('specifications', {}), ensure_ascii=False)
-            )
-            
-            db.session.add(product)
-            db.session.flush()
-            
-            # Добавляем изображения
-            for i, img_url in enumerate(product_data.get('images', [])[:10]):
-                image = ProductImage(
-                    product_id=product.id,
-                    image_url=img_url,
-                    is_main=(i == 0)
-                )
-                db.session.add(image)
-            
-            # Создаем складскую запись
-            stock = WarehouseStock(product_id=product.id)
-            db.session.add(stock)
-            
-            db.session.commit()
-            
+            messages = {
+                'created': 'Товар успешно импортирован',
+                'updated': 'Данные товара обновлены',
+                'unchanged': 'Данные товара не изменились'
+            }
             return jsonify({
                 'success': True,
-                'message': 'Товар успешно импортирован',
+                'message': messages[status],
+                'status': status,
+                'changes': changes,
                 'product': product.to_dict()
             })
-            
+        
         finally:
             driver.quit()
-            
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Разобранных товаров в одной транзакции записи
+INGEST_BATCH = 20
+
 @app.route('/api/import/batch', methods=['POST'])
 def batch_import():
-    """Массовый импорт товаров"""
+    """Массовый импорт товаров (mode и fields — как у /api/import/snablift)"""
     try:
+        from ingest import ingest_parsed, parse_fields, MODES
+        
         data = request.get_json()
         items = data.get('items', [])
+        mode = data.get('mode', 'skip')
         
         if not items:
             return jsonify({'success': False, 'error': 'Список товаров пуст'}), 400
+        if mode not in MODES:
+            return jsonify({'success': False, 'error': f"mode: {'|'.join(MODES)}"}), 400
+        try:
+            fields = parse_fields(data.get('fields'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         results = {
             'success': [],
@@ -559,6 +880,13 @@ def batch_import():
         from warehouse_card import create_driver, parse_product_page, find_product_by_article
         
         driver = create_driver()
+        parsed = []  # (запрос, данные товара) до записи пачкой
+        
+        def save_parsed():
+            """Пишет разобранные товары одной транзакцией"""
+            for key, records in ingest_parsed(parsed, mode=mode, fields=fields).items():
+                results[key].extend(records)
+            parsed.clear()
         
         try:
             for item in items:
@@ -575,13 +903,17 @@ def batch_import():
                         )
                     ).first()
                     
-                    if existing:
+                    # Не открываем страницу зря: skip — товар уже есть, refresh_fields — его нет
+                    if existing and mode == 'skip':
                         results['skipped'].append({
                             'query': query,
                             'reason': 'Уже существует',
                             'article': existing.article
                         })
                         continue
+                    if not existing and mode == 'refresh_fields':
+                        results['skipped'].append({'query': query, 'reason': 'Нет в базе'})
+                        continue
                     
                     # Парсим товар
                     if query.startswith('http'):
@@ -596,67 +928,34 @@ def batch_import():
                         })
                         continue
                     
-                    product_data = parse_product_page(driver, product_url)
-                    
-                    # Создаем товар
-                    product = Product(
-                        article=product_data['article'],
-                        title=product_data['title'],
-                        manufacturer=product_data.get('manufacturer'),
-                        category=product_data.get('category'),
-                        price=product_data.get('price'),
-                        description=product_data.get('description'),
-                        url=product_data['url'],
-                        weight=product_data.get('weight'),
-                        dimensions=', '.join([f"{k}: {v}" for k, v in product_data.get('dimensions', {}).items()]),
-                        specifications=json.dumps(product_data.get('specifications', {}), ensure_ascii=False)
-                    )
-                    
-                    db.session.add(product)
-                    db.session.flush()
-                    
-                    # Добавляем изображения
-                    for i, img_url in enumerate(product_data.get('images', [])[:5]):
-                        image = ProductImage(
-                            product_id=product.id,
-                            image_url=img_url,
-                            is_main=(i == 0)
-                        )
-                        db.session.add(image)
-                    
-                    # Создаем складскую запись
-                    stock = WarehouseStock(product_id=product.id)
-                    db.session.add(stock)
-                    
-                    db.session.commit()
-                    
-                    results['success'].append({
-                        'query': query,
-                        'article': product_data['article'],
-                        'title': product_data['title']
-                    })
-                    
+                    parsed.append((query, parse_product_page(driver, product_url)))
+                    if len(parsed) >= INGEST_BATCH:
+                        save_parsed()
+                
                 except Exception as e:
-                    db.session.rollback()
                     results['failed'].append({
                         'query': query,
                         'reason': str(e)
                     })
             
+            save_parsed()
+            
             return jsonify({
                 'success': True,
                 'results': results,
                 'summary': {
                     'total': len(items),
                     'imported': len(results['success']),
+                    'created': sum(1 for r in results['success'] if r['status'] == 'created'),
+                    'updated': sum(1 for r in results['success'] if r['status'] == 'updated'),
                     'failed': len(results['failed']),
                     'skipped': len(results['skipped'])
                 }
             })
-            
+        
         finally:
             driver.quit()
-            
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -664,12 +963,94 @@ def batch_import():
 
 @app.route('/card/<article>')
 def product_card(article):
-    """HTML карточка товара для печати"""
-    product = Product.query.filter_by(article=article).first()
-    if not product:
+    """HTML карточка товара для печати (из кэша готовых карточек, с ETag)"""
+    from card_cache import get_card_cache
+    card = get_card_cache().get(article)
+    if card is None:
         return "Товар не найден", 404
     
-    return render_template('product_card.html', product=product)
+    html, etag = card
+    # ETags из If-None-Match хранит значения без кавычек — сравниваем через contains
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(html, mimetype='text/html')
+    response.set_etag(etag)
+    # Браузер каждый раз сверяет ETag: после правки остатка печатается свежая карточка
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/labels', methods=['GET'])
+def print_labels():
+    """Лист этикеток/карточек для печати одним документом.
+    
+    Фильтр: zone, rack, articles (через запятую); kind=label|card, per_page,
+    codes=barcode|qr|none. Документ отдается постранично по мере рендера.
+    """
+    try:
+        from flask import stream_with_context
+        from label_sheets import (generate_sheet, iter_selected, parse_articles, sheet_title,
+                                  LAYOUTS, CODES, MAX_ITEMS)
+        
+        zone = request.args.get('zone', '').strip()
+        rack = request.args.get('rack', '').strip()
+        articles = parse_articles(request.args.get('articles', ''))
+        kind = request.args.get('kind', 'label')
+        codes = request.args.get('codes', 'barcode')
+        per_page = request.args.get('per_page', type=int)
+        limit = min(request.args.get('limit', MAX_ITEMS, type=int), MAX_ITEMS)
+        
+        if not (zone or rack or articles):
+            return jsonify({'success': False, 'error': 'Укажите zone, rack или articles'}), 400
+        if kind not in LAYOUTS or codes not in CODES:
+            return jsonify({'success': False, 'error': 'kind: label|card, codes: barcode|qr|none'}), 400
+        
+        parts = generate_sheet(iter_selected(zone or None, rack or None, articles, limit),
+                               kind=kind, per_page=per_page, codes=codes,
+                               base_url=request.host_url, title=sheet_title(zone, rack, articles),
+                               local_images=True)
+        return app.response_class(stream_with_context(parts), mimetype='text/html')
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ========== ЛОКАЛЬНЫЕ ФОТО ==========
+
+@app.route('/images/<path:filename>')
+def local_image(filename):
+    """Фото из локального зеркала. Имя файла — хэш содержимого, поэтому кэш на год"""
+    from flask import send_from_directory
+    from image_mirror import mirror_dir
+    
+    directory = mirror_dir()
+    if not os.path.exists(os.path.join(directory, filename)):
+        # Миниатюры нет (не установлен Pillow) — отдаем оригинал
+        base = re.sub(r'_\d+\.webp$', '', filename)
+        originals = [f"{base}{ext}" for ext in ('.jpg', '.png', '.gif', '.webp')
+                     if os.path.exists(os.path.join(directory, f"{base}{ext}"))]
+        if base == filename or not originals:
+            return "Фото не найдено", 404
+        filename = originals[0]
+    response = send_from_directory(directory, filename, max_age=31536000)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/images/mirror', methods=['GET', 'POST'])
+def mirror_images_api():
+    """POST — скачать фото без локальной копии в фоне (limit, workers); GET — состояние"""
+    try:
+        from image_mirror import start_background, mirror_status, MAX_CONCURRENCY
+        
+        if request.method == 'GET':
+            return jsonify({'success': True, 'status': mirror_status()})
+        
+        data = request.get_json(silent=True) or {}
+        workers = max(1, min(int(data.get('workers', MAX_CONCURRENCY)), 16))
+        started = start_background(limit=data.get('limit'), workers=workers)
+        return jsonify({'success': True, 'started': started, 'status': mirror_status()}), 202
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 # ========== ИИ-ПОИСК ==========
 
@@ -686,6 +1067,8 @@ except Exception as e:
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        from article_index import ensure_index
+        ensure_index()
         print("=" * 70)
         print("✅ ЛОКАЛЬНАЯ БАЗА ДАННЫХ СКЛАДА")
         print("=" * 70)
@@ -698,6 +1081,12 @@ if __name__ == '__main__':
         print("  PUT  /api/products/<article>/stock - Обновить склад")
         print("  POST /api/import/snablift - Импорт с snab-lift.ru")
         print("  POST /api/import/batch - Массовый импорт")
+        print("  GET  /api/products/suggest?q=... - Подсказки с опечатками")
+        print("  GET  /api/stock/low?limit=50&offset=0 - Товары ниже минимума")
+        print("  POST /api/stock/import - Остатки и места из CSV/XLSX")
+        print("  GET  /api/export/csv?zone=A&columns=article,title - Выгрузка CSV/XLSX/Parquet")
+        print("  GET  /api/labels?zone=A&rack=12 - Лист этикеток для печати")
+        print("  POST /api/images/mirror - Скачать фото в локальное зеркало")
         print("\n💡 Примеры:")
         print("  curl http://localhost:5000/api/products")
         print("  curl -X POST http://localhost:5000/api/import/snablift -d '{\"query\":\"2498\"}'")
@@ -733,6 +1122,6 @@ def speak_text():
             return jsonify({'success': True, 'message': 'Озвучивается'})
         else:
             return jsonify({'success': False, 'error': 'Озвучка доступна только на macOS'})
-            
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})